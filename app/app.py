@@ -14,6 +14,7 @@ from flask_socketio import SocketIO
 from flask_talisman import Talisman
 from redis import Redis
 
+from app.blueprints.autocomplete import autocomplete_blueprint
 from app.blueprints.errors import errors_blueprint
 from app.blueprints.login import login_blueprint
 from app.blueprints.logout import logout_blueprint
@@ -181,6 +182,7 @@ def create_app(config, debug=False):
     app.register_blueprint(recipes_blueprint, url_prefix='/api/recipes')
     app.register_blueprint(users_blueprint, url_prefix='/api/users')
     app.register_blueprint(signup_blueprint, url_prefix='/api')
+    app.register_blueprint(autocomplete_blueprint, url_prefix='/api/autocomplete')
 
     app.register_blueprint(discord_blueprint, url_prefix='/oauth')
 
@@ -0,0 +1,46 @@
+import logging
+
+from flask import Blueprint, jsonify, request
+
+from app.utils.recipe import (AUTOCOMPLETE_KINDS, AUTOCOMPLETE_MAX_LIMIT,
+                              autocomplete)
+
+logger = logging.getLogger(__name__)
+
+autocomplete_blueprint = Blueprint('autocomplete', __name__)
+
+
+@autocomplete_blueprint.route('', methods=['GET'])
+def suggestions():
+    """
+    Recipe names, tag names and usernames starting with q, for search boxes as they are typed in.
+
+    Answered from the worker's in-memory index, e.g. ?q=chi&types=recipes,tags&limit=5
+    """
+    try:
+        kinds = [kind.strip() for kind in request.args.get('types', ','.join(AUTOCOMPLETE_KINDS)).split(',')]
+        unknown = [kind for kind in kinds if kind not in AUTOCOMPLETE_KINDS]
+        if unknown:
+            return jsonify({
+                'success': False,
+                'message': f'Unknown types: {", ".join(unknown)}'
+            }), 400
+
+        limit = request.args.get('limit', type=int, default=10)
+        if not 1 <= limit <= AUTOCOMPLETE_MAX_LIMIT:
+            return jsonify({
+                'success': False,
+                'message': f'limit must be between 1 and {AUTOCOMPLETE_MAX_LIMIT}'
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'suggestions': autocomplete(request.args.get('q', ''), dict.fromkeys(kinds), limit)
+        })
+
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error getting suggestions: %s', str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while getting suggestions'
+        }), 500
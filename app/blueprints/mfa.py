@@ -10,6 +10,7 @@ from flask_jwt_extended import (create_access_token, create_refresh_token,
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.models import User, db
+from app.utils.flask.profile_cache import invalidate_profile
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +36,7 @@ def disable():
         try:
             user.is_mfa_enabled = False
             db.session.commit()
+            invalidate_profile(user.id)
             return jsonify({
                 'success': True,
                 'message': 'MFA disabled successfully'
@@ -74,6 +76,7 @@ def verify(user_id):
                 # Login case
                 user.check_mfa = False
                 db.session.commit()
+                invalidate_profile(user.id)
 
                 # Create tokens
                 access_token = create_access_token(identity=user.id)
@@ -101,6 +104,7 @@ def verify(user_id):
                 user.mfa_qr = False
 
                 db.session.commit()
+                invalidate_profile(user.id)
 
                 return jsonify({
                     'success': True,
@@ -117,6 +121,7 @@ def verify(user_id):
     else:
         user.check_mfa = False
         db.session.commit()
+        invalidate_profile(user.id)
         return jsonify({
             'success': False,
             'error': 'Invalid MFA code. Please try again.'
@@ -153,6 +158,7 @@ def setup():
     user.check_mfa = True
     user.mfa_qr = qr_file
     db.session.commit()
+    invalidate_profile(user.id)
 
     return jsonify({
         'success': True,
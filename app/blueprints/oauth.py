@@ -20,6 +20,7 @@ from app.utils.flask.decorators import (rate_limit_oauth,
                                         require_password_confirmation)
 from app.utils.flask.oauth import discord_account
 from app.utils.flask.password_check import password_check
+from app.utils.flask.profile_cache import invalidate_profile
 
 oauth_blueprint = Blueprint('oauth', __name__)
 
@@ -131,6 +132,7 @@ def unlink_provider(provider):
             user.password = generate_password_hash(password).decode('utf8')
             user.primary_login_method = 'password'
             db.session.commit()
+            invalidate_profile(user.id)
 
         # Prevent unlinking if it's the only authentication method
         if not user.has_alternate_login_methods(exclude_provider=provider):
@@ -164,6 +166,7 @@ def unlink_provider(provider):
             del current_app.blueprints[provider].token
 
             db.session.commit()
+            invalidate_profile(user.id)
 
         return jsonify({'success': True})
 
@@ -233,6 +236,7 @@ def oauth_logged_in(blueprint, token):
                 db.session.add(oauth)
                 setattr(user, db_key, user_info[api_id_key])
                 db.session.commit()
+                invalidate_profile(user.id)
                 logger.info('Successfully linked %s account for user %s', provider, user.id)
         else:
             oauth = OAuth.query.filter_by(
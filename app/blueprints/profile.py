@@ -1,13 +1,16 @@
 import logging
 
-from cryptography.fernet import Fernet
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, jsonify, request
 from flask_bcrypt import generate_password_hash
 from flask_jwt_extended import get_jwt_identity, jwt_required
 
 from app.extensions import db
-from app.models import User, UserSchema
+from app.models import User
+from app.utils.flask.encryption import encrypt_value
 from app.utils.flask.password_check import password_check
+from app.utils.flask.profile_cache import (get_profiles, invalidate_profile,
+                                          owner_view)
+from app.utils.recipe import add_user_to_autocomplete
 
 logger = logging.getLogger(__name__)
 
@@ -20,37 +23,28 @@ def profile(user_id):
     try:
         current_user_id = get_jwt_identity()
 
-        user = db.session.query(User).get(int(user_id))
-        if not user:
+        # Profile and viewer views come from the cache in one round trip
+        if current_user_id and int(current_user_id) != user_id:
+            profiles = get_profiles(user_id, int(current_user_id))
+        else:
+            profiles = get_profiles(user_id)
+
+        views = profiles[user_id]
+        if not views:
             return jsonify({'success': False, 'error': 'User not found'}), 404
 
-        user_schema = UserSchema()
-        logger.info('User data: %s', user_schema.dump(user))
         # If viewing own profile or is admin, show all fields
-        if current_user_id and (int(current_user_id) == user.id or db.session.query(User).get(int(current_user_id)).role == 'admin'):
-            user_data = user_schema.dump(user)
-            if user_data['spoonacular_api_key']:
-                encryption_key = Fernet(current_app.config['ENCRYPTION_KEY'].encode())
-                user_spoonacular_api_key = user_data['spoonacular_api_key']
-                user_data['spoonacular_api_key'] = encryption_key.decrypt(user_spoonacular_api_key.encode()).decode()
+        viewer = profiles.get(int(current_user_id)) if current_user_id else None
+        if viewer and (int(current_user_id) == user_id or viewer['role'] == 'admin'):
             return jsonify({
                 'success': True,
-                'user': user_data
+                'user': owner_view(views)
             })
 
         # Otherwise, only show non-hidden fields
-        filtered_user = user_schema.dump(user)
-        for field in (user.hidden_fields or []):
-            if field in filtered_user:
-                del filtered_user[field]
-
-        if filtered_user['spoonacular_api_key']:
-            encryption_key = Fernet(current_app.config['ENCRYPTION_KEY'].encode())
-            user_spoonacular_api_key = filtered_user['spoonacular_api_key']
-            filtered_user['spoonacular_api_key'] = encryption_key.decrypt(user_spoonacular_api_key.encode()).decode()
         return jsonify({
             'success': True,
-            'user': filtered_user
+            'user': views['public']
         })
 
     except Exception as e:  # pylint: disable=broad-exception-caught
@@ -66,6 +60,7 @@ def update_theme():
     request_data = request.json
     user.theme = request_data['theme']
     db.session.commit()
+    invalidate_profile(user.id)
     return jsonify({'success': True})
 
 
@@ -110,8 +105,7 @@ def edit_profile():
                             continue
                     elif field == 'spoonacular_api_key':
                         if value:
-                            encryption_key = Fernet(current_app.config['ENCRYPTION_KEY'].encode())
-                            value = encryption_key.encrypt(value.encode()).decode()
+                            value = encrypt_value(value)
                     elif field == 'username':
                         if User.query.filter_by(username=value).first() and value != user.username:
                             return jsonify({
@@ -127,19 +121,17 @@ def edit_profile():
                     }), 400
 
         db.session.commit()
+        if 'username' in data:
+            add_user_to_autocomplete(user)
 
-        user_schema = UserSchema()
-
-        user_data = user_schema.dump(user)
-        if user_data['spoonacular_api_key']:
-            encryption_key = Fernet(current_app.config['ENCRYPTION_KEY'].encode())
-            user_spoonacular_api_key = user_data['spoonacular_api_key']
-            user_data['spoonacular_api_key'] = encryption_key.decrypt(user_spoonacular_api_key.encode()).decode()
+        # Render the fresh views once and store them, the next profile view is a cache hit
+        invalidate_profile(user.id)
+        views = get_profiles(user.id)[user.id]
 
         return jsonify({
             'success': True,
             'message': 'Profile updated successfully',
-            'user': user_data
+            'user': owner_view(views)
         })
 
     except Exception as e:  # pylint: disable=broad-exception-caught
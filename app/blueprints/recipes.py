@@ -1,289 +1,725 @@
-import json
 import logging
-import random
-import string
+import math
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-import bleach
-from cryptography.fernet import Fernet
-from flask import Blueprint, current_app, jsonify, request
+from flask import (Blueprint, Response, abort, current_app, jsonify,
+                   request, send_from_directory, stream_with_context)
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from sqlalchemy import func
+from redis.exceptions import LockError
+from sqlalchemy.exc import IntegrityError
 
 from app.extensions import db
-from app.models import Recipe, Tag, User, UserRecipeProgress
+from app.models import Recipe, Tag, User, UserRecipeProgress, user_recipe
 from app.utils.exceptions import (SpoonacularQuotaError,
                                   SpoonacularRateLimitError,
                                   SpoonacularUnauthorizedError)
-from app.utils.recipe import (check_url, get_ingredients,
-                              get_instructions_equipment, get_nutrients,
-                              get_prep_cook_time, get_recipe_data)
+from app.utils.flask.decorators import idempotent
+from app.utils.flask.encryption import decrypt_value
+from app.utils.flask.events import emit_recipe_progress
+from app.utils.flask.message_queue import (after_recipe_saved,
+                                           delete_backup_files_task,
+                                           discard_recipe_progress,
+                                           images_dir,
+                                           pending_recipe_progress,
+                                           queue_recipe_progress,
+                                           recipe_import_lock,
+                                           refresh_similar_recipes_task)
+from app.utils.flask.spoonacular_scheduler import (defer_recipe_import,
+                                                   fetch_recipe_data,
+                                                   get_spoonacular_quota)
+from app.utils.recipe import (EXTRACTED_MANUAL, EXTRACTED_SCHEMA_ORG,
+                              EXTRACTED_SPOONACULAR, IMAGE_DIGEST,
+                              IMAGE_VARIANT, aggregate_meal_plan,
+                              apply_containment_filters, apply_keyset,
+                              apply_range_filters, apply_sort,
+                              build_recipe_fields, build_shopping_list,
+                              canonical_url, check_url, delete_recipes,
+                              encode_cursor, extract_recipe,
+                              find_recipe_by_url, find_recipes_by_pantry,
+                              get_or_create_tags, get_prep_cook_time,
+                              get_recipe_changes, get_scaled_ingredients,
+                              get_similar_recipes, gzip_chunks, image_dir,
+                              invalidate_deleted_recipes,
+                              invalidate_shopping_lists, iter_export,
+                              normalize_tag_name, owns_recipe,
+                              parse_range_filters, save_recipe, share_recipe,
+                              upsert_recipe_progress,
+                              validate_progress_changes)
+from app.utils.sanitize import clean_text
 
 logger = logging.getLogger(__name__)
 
 recipes_blueprint = Blueprint('recipes', __name__)
 
 
-def generate_random_filename(length: int = 24) -> str:
-    """Generate a random filename using uppercase letters and digits."""
-    return ''.join(random.SystemRandom().choices(string.ascii_uppercase + string.digits, k=length))
-
-
 def process_tags(tags: List[str], new_tags_str: str) -> List[str]:
-    """Process and combine existing and new tags."""
+    """Process and combine existing and new tags into normalized tag names."""
     new_tags = [
-        bleach.clean(tag.strip().replace(' ', '.').lower())
-        for tag in new_tags_str.split(',')
+        normalize_tag_name(tag)
+        for tag in [*tags, *new_tags_str.split(',')]
         if tag.strip()
     ]
-    return list(set(tags + new_tags))
+    return list(set(new_tags))
+
+
+def share_existing_recipe(recipe: Recipe, data: Dict):
+    """Add the user and tags of an /add request to the recipe another import of its page stored."""
+    user = db.session.query(User).get(int(get_jwt_identity()))
+    tags = get_or_create_tags(process_tags(data.get('tags', []), data.get('new_tags', '')))
+    recipes_dir = Path(current_app.config['RA_DATA_DIR']) / 'recipes'
+    changed, stale_files = share_recipe(recipe, tags, [user], recipes_dir)
+    after_recipe_saved(recipe, changed, stale_files)
+    return jsonify({
+        'success': True,
+        'message': f'Added recipe for {recipe.name}',
+        'recipe_id': recipe.id,
+        'extraction_source': recipe.extraction_source
+    })
+
+
+def add_recipe(data: Dict):
+    """Import or add the recipe of an /add request, returning its response."""
+    recipe_url = data.get('url', '')
+
+    user_id = get_jwt_identity()
+
+    user = db.session.query(User).get(int(user_id))
+    recipe_query = None
+    extraction_source = EXTRACTED_MANUAL
+
+    # Process tags
+    tags = process_tags(
+        data.get('tags', []),
+        data.get('new_tags', '')
+    )
+
+    # Handle URL-based recipe
+    if recipe_url:
+        # Check for existing recipe before fetching anything
+        recipe_query = find_recipe_by_url(recipe_url)
+
+        if recipe_query and not data.get('overwrite_recipe'):
+            return jsonify({
+                'success': False,
+                'message': f'Recipe with url {recipe_url} already exists in database',
+                'recipe_id': recipe_query.id
+            }), 409
 
+        url_status = check_url(recipe_url)
+        if not url_status['status']:
+            return jsonify({
+                'success': False,
+                'message': url_status['reason']
+            }), 400
 
-def calculate_calories(calories: float, servings: float, per_serving: bool = True) -> tuple[int, int]:
-    """Calculate total and per-serving calories."""
-    if per_serving:
-        total = int(round(calories * servings))
-        per_serving = int(calories)
-    else:
-        total = int(calories)
-        per_serving = int(round(calories / servings))
-    return total, per_serving
+        # Extract from the page check_url() already fetched, Spoonacular is the fallback
+        recipe_data = extract_recipe(url_status.get('html'), recipe_url)
+        extraction_source = EXTRACTED_SCHEMA_ORG
+        if recipe_data is None:
+            extraction_source = EXTRACTED_SPOONACULAR
+            try:
+                if not user.spoonacular_api_key:
+                    raise SpoonacularUnauthorizedError
+                else:
+                    spoonacular_api_key = decrypt_value(user.spoonacular_api_key)
+                recipe_data = fetch_recipe_data(recipe_url, spoonacular_api_key)
+            except SpoonacularUnauthorizedError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid Spoonacular API Key'
+                }), 403
+            except (SpoonacularQuotaError, SpoonacularRateLimitError) as e:
+                # Parked instead of lost, the import runs once the key has quota again
+                retry_at = defer_recipe_import(
+                    user.id, recipe_url, tags, bool(data.get('overwrite_recipe')), e.retry_at
+                )
+                response = jsonify({
+                    'success': True,
+                    'deferred': True,
+                    'message': f'{e}, the recipe will be imported automatically',
+                    'retry_at': datetime.fromtimestamp(retry_at, timezone.utc).isoformat()
+                })
+                response.headers['Retry-After'] = str(max(math.ceil(retry_at - time.time()), 1))
+                return response, 202
+
+    # Create new recipe data
+    source_data = recipe_data if recipe_url else data
+    new_recipe_data = build_recipe_fields(source_data, recipe_url or 'self')
+    new_recipe_data['tags'] = get_or_create_tags(tags)
+    new_recipe_data['users'] = [user]
+    new_recipe_data['extraction_source'] = extraction_source
+
+    # Handle existing recipe with same name
+    if not recipe_url:
+        recipe_query = db.session.query(Recipe).filter(
+            func.lower(Recipe.name) == new_recipe_data['name'].lower()
+        ).first()
 
+        if recipe_query:
+            if not data.get('overwrite_recipe'):
+                return jsonify({
+                    'success': False,
+                    'message': f'Recipe with name {new_recipe_data["name"]} already exists',
+                    'recipe_id': recipe_query.id
+                }), 409
+
+    # Save recipe, an overwrite updates the existing one in place and keeps its id and progress
+    recipes_dir = Path(current_app.config['RA_DATA_DIR']) / 'recipes'
+    try:
+        new_recipe, changed, stale_files = save_recipe(
+            new_recipe_data, source_data, recipes_dir, recipe_query
+        )
+    except IntegrityError:
+        # Another import of the page committed since it was looked up, so it shares that recipe
+        db.session.rollback()
+        if not recipe_url:
+            raise
+        existing = find_recipe_by_url(recipe_url)
+        if existing is None:
+            # That recipe is gone again, e.g. deleted right after it was stored
+            response = jsonify({
+                'success': False,
+                'message': f'Recipe with url {recipe_url} was changed by another import'
+            })
+            response.headers['Retry-After'] = str(IMPORT_RETRY_AFTER)
+            return response, 409
+        return share_existing_recipe(existing, data)
+    after_recipe_saved(new_recipe, changed, stale_files)
+
+    if recipe_query:
+        return jsonify({
+            'success': True,
+            'message': f'Updated recipe for {new_recipe_data["name"]}',
+            'recipe_id': new_recipe.id,
+            'extraction_source': extraction_source,
+            'changed': sorted(changed)
+        })
+    return jsonify({
+        'success': True,
+        'message': f'Added recipe for {new_recipe_data["name"]}',
+        'recipe_id': new_recipe.id,
+        'extraction_source': extraction_source
+    })
 
-def create_recipe_data(data: Dict, recipe_url: str) -> tuple[Dict, str]:
+
+# Seconds a submission that timed out waiting for another import of its page should wait before retrying
+IMPORT_RETRY_AFTER = 10
+
+
+@recipes_blueprint.route('/add', methods=['POST'])
+@jwt_required()
+@idempotent
+def add():
+    """
+    Import a recipe from its url, or add a manual recipe.
+
+    Imports of the same page hold a lock on its canonical URL, so of
+    concurrent submissions only the first extracts it. The others wait a
+    few seconds for it and are added to its recipe with their tags, or get
+    a 409 with Retry-After if it takes longer. Retries sent with the same
+    Idempotency-Key header get the original response.
     """
-    Create standardized recipe data dictionary.
+    try:
+        data = request.json
+        recipe_url = data.get('url', '')
+        if not recipe_url:
+            return add_recipe(data)
+
+        lock = recipe_import_lock(canonical_url(recipe_url))
+        if lock.acquire(blocking=False):
+            existed = True
+        else:
+            # Another import of the page is running, wait for its recipe
+            existed = find_recipe_by_url(recipe_url) is not None
+            if not lock.acquire():
+                response = jsonify({
+                    'success': False,
+                    'message': f'Recipe with url {recipe_url} is still being imported'
+                })
+                response.headers['Retry-After'] = str(IMPORT_RETRY_AFTER)
+                return response, 409
+        try:
+            recipe = None if existed or data.get('overwrite_recipe') else find_recipe_by_url(recipe_url)
+            if recipe:
+                return share_existing_recipe(recipe, data)
+            return add_recipe(data)
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # Held past IMPORT_LOCK_TIMEOUT, what was committed stands
+                logger.warning('Import lock of %s expired before it was released', recipe_url)
 
-    Args:
-        data: Raw recipe data dictionary
-        recipe_url: URL of the recipe or 'self' for manual recipes
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error adding recipe: %s', str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while adding the recipe'
+        }), 500
 
-    Returns:
-        tuple: (recipe_data, recipe_nutrients)
+
+@recipes_blueprint.route('/spoonacular-quota', methods=['GET'])
+@jwt_required()
+def spoonacular_quota():
+    """Daily quota points of the user's Spoonacular key as of its last response"""
+    user = db.session.query(User).get(int(get_jwt_identity()))
+    if not user.spoonacular_api_key:
+        return jsonify({
+            'success': False,
+            'message': 'No Spoonacular API Key'
+        }), 404
+
+    quota = get_spoonacular_quota(decrypt_value(user.spoonacular_api_key))
+    if quota['exhausted_until']:
+        quota['exhausted_until'] = datetime.fromtimestamp(quota['exhausted_until'], timezone.utc).isoformat()
+    return jsonify({'success': True, 'quota': quota})
+
+
+def filter_recipes(query):
     """
-    if recipe_url != 'self':
-        calories, nutrients = get_nutrients(data['nutrition']['nutrients'])
-        instructions, equipment = get_instructions_equipment(data['analyzedInstructions'])
+    Apply the search, containment and range filters of the request to a Recipe query.
 
-        return {
-            'name': data['title'],
-            'source': data['sourceName'],
-            'servings': data['servings'],
-            'prep_time': get_prep_cook_time(data['preparationMinutes']),
-            'cook_time': get_prep_cook_time(data['cookingMinutes']),
-            'calories': calories,
-            'calories_unit': 'serving',
-            'ingredients': get_ingredients(data['extendedIngredients']),
-            'instructions': instructions,
-            'equipment': equipment,
-        }, nutrients
-
-    prep_minutes = (int(data.get('prep_time_hours', 0)) * 60 +
-                    int(data.get('prep_time_minutes', 0)))
-    cook_minutes = (int(data.get('cook_time_hours', 0)) * 60 +
-                    int(data.get('cook_time_minutes', 0)))
+    Raises:
+        ValueError: If a range filter has a value of the wrong type
+    """
+    # Handle search
+    search = request.args.get('search')
+    if search:
+        query = query.filter(Recipe.name.ilike(f'%{search}%'))
+
+    # Handle containment filters, e.g. equipment=slow cooker&exclude_equipment=oven
+    query = apply_containment_filters(query, request.args)
+
+    # Handle range filters, e.g. calories_serving<=500&protein>=30
+    return apply_range_filters(query, parse_range_filters(request.query_string.decode()))
 
+
+def recipe_images(recipe: Recipe) -> Optional[Dict]:
+    """URLs of a recipe's thumbnails by format and width, for a srcset. None until they are rendered."""
+    if not recipe.image_hash:
+        return None
     return {
-        'name': data.get('name', ''),
-        'source': 'self',
-        'servings': data.get('servings', 0),
-        'prep_time': get_prep_cook_time(prep_minutes),
-        'cook_time': get_prep_cook_time(cook_minutes),
-        'calories': data.get('calories', 0),
-        'calories_unit': data.get('calories_unit', 'serving'),
-        'ingredients': get_ingredients(data.get('ingredients', [])),
-        'instructions': data.get('instructions', []),
-        'equipment': data.get('equipment', []),
-    }, ''
+        image_format: {
+            width: f'/api/recipes/images/{recipe.image_hash}/{width}.{suffix}'
+            for width in recipe.image_widths
+        }
+        for image_format, suffix in (('webp', 'webp'), ('jpeg', 'jpg'))
+    }
 
 
-@recipes_blueprint.route('/add', methods=['POST'])
+def table_row(recipe: Recipe) -> Dict:
+    recipe_link = f'/recipes/{recipe.id}'
+    return {
+        'id': recipe.id,
+        'name': f'{recipe.name} ({recipe.source})',
+        'link': recipe_link,
+        'source_url': recipe_link if recipe.url == 'self' else clean_text(recipe.url),
+        'total_time': display_time(recipe.total_minutes),
+        'calories': recipe.calories_serving,
+        'date_added': recipe.created_at.isoformat() if recipe.created_at else None,
+        'images': recipe_images(recipe),
+    }
+
+
+@recipes_blueprint.route('/table', methods=['GET'])
+def table():
+    try:
+        query = filter_recipes(db.session.query(Recipe))
+    except ValueError as e:
+        return {'status': 'error', 'message': str(e)}, 400
+
+    total_records = query.count()
+
+    # Handle sorting, e.g. -date_added,+name
+    try:
+        query = apply_sort(query, request.args.get('sort') or 'name')
+    except ValueError as e:
+        return {'status': 'error', 'message': str(e)}, 400
+
+    # Handle pagination
+    page = request.args.get('page', type=int, default=1)
+    limit = request.args.get('limit', type=int, default=10)
+    offset = (page - 1) * limit
+    query = query.offset(offset).limit(limit)
+
+    return {'status': 'success', 'data': [table_row(recipe) for recipe in query], 'total': total_records}, 200
+
+
+MINE_MAX_LIMIT = 100
+
+
+@recipes_blueprint.route('/mine', methods=['GET'])
 @jwt_required()
-def add():
+def mine():
+    """
+    The current user's library with the table's search, filters and sort.
+
+    Pages are fetched by keyset: pass the returned next_cursor to continue
+    after the last row instead of a page number. The total is only counted
+    for the first page.
+    """
+    user_id = get_jwt_identity()
+    sort = request.args.get('sort') or 'name'
+    cursor = request.args.get('cursor')
+    limit = min(max(request.args.get('limit', type=int, default=20), 1), MINE_MAX_LIMIT)
+
+    query = db.session.query(Recipe).join(user_recipe, user_recipe.c.recipe_id == Recipe.id).filter(
+        user_recipe.c.user_id == user_id
+    )
     try:
-        data = request.json
+        query = filter_recipes(query)
+        total_records = None if cursor else query.count()
+        query = apply_sort(query, sort)
+        if cursor:
+            query = apply_keyset(query, sort, cursor)
+    except ValueError as e:
+        return {'status': 'error', 'message': str(e)}, 400
 
-        recipe_url = data.get('url', '')
+    # Fetch one extra row to know whether another page follows
+    recipes = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(recipes[limit - 1], sort) if len(recipes) > limit else None
 
-        user_id = get_jwt_identity()
+    response = {'status': 'success', 'data': [table_row(recipe) for recipe in recipes[:limit]], 'next_cursor': next_cursor}
+    if total_records is not None:
+        response['total'] = total_records
+    return response, 200
 
-        user = db.session.query(User).get(int(user_id))
 
-        # Process tags
-        tags = process_tags(
-            data.get('tags', []),
-            data.get('new_tags', '')
-        )
+TAGS_MAX_LIMIT = 500
 
-        # Handle URL-based recipe
-        if recipe_url:
-            url_status = check_url(recipe_url)
-            if not url_status['status']:
-                return jsonify({
-                    'success': False,
-                    'message': url_status['reason']
-                }), 400
 
-            # Check for existing recipe
-            normalized_url = recipe_url.replace('http://', '').replace('https://', '')
-            recipe_query = db.session.query(Recipe).filter(
-                Recipe.url.icontains(normalized_url)
-            ).first()
+@recipes_blueprint.route('/tags', methods=['GET'])
+def tags():
+    """Tag facets with their cached recipe counts, most used first."""
+    try:
+        query = db.session.query(Tag.name, Tag.recipe_count).filter(Tag.recipe_count > 0)
 
-            if recipe_query and not data.get('overwrite_recipe'):
-                return jsonify({
-                    'success': False,
-                    'message': f'Recipe with url {recipe_url} already exists in database',
-                    'recipe_id': recipe_query.id
-                }), 409
+        search = request.args.get('search')
+        if search:
+            query = query.filter(Tag.name.startswith(normalize_tag_name(search), autoescape=True))
 
-            if recipe_query:
-                Path(recipe_query.backup_file).unlink(missing_ok=True)
-                db.session.delete(recipe_query)
-                db.session.commit()
+        limit = min(max(request.args.get('limit', type=int, default=100), 1), TAGS_MAX_LIMIT)
+        query = query.order_by(Tag.recipe_count.desc(), Tag.name).limit(limit)
 
-            try:
-                if not user.spoonacular_api_key:
-                    raise SpoonacularUnauthorizedError
-                else:
-                    encryption_key = Fernet(current_app.config['ENCRYPTION_KEY'].encode())
-                    spoonacular_api_key = encryption_key.decrypt(user.spoonacular_api_key.encode()).decode()
-                recipe_data = get_recipe_data(recipe_url, spoonacular_api_key)
-            except SpoonacularUnauthorizedError:
-                return jsonify({
-                    'success': False,
-                    'message': 'Invalid Spoonacular API Key'
-                }), 403
-            except (SpoonacularQuotaError, SpoonacularRateLimitError) as e:
-                return jsonify({
-                    'success': False,
-                    'message': str(e)
-                }), 429
+        return {
+            'status': 'success',
+            'data': [{'name': name, 'count': count} for name, count in query]
+        }, 200
+
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error getting tags: %s', str(e), exc_info=True)
+        return {
+            'status': 'error',
+            'message': 'An error occurred while getting tags'
+        }, 500
+
+
+CHANGES_MAX_LIMIT = 1000
+
+
+@recipes_blueprint.route('/changes', methods=['GET'])
+def changes():
+    """
+    Recipes added, replaced or deleted after a cursor, for incremental sync.
+
+    Start with since=0 and keep passing back next_cursor while has_more
+    is true. Deleted recipes come back as {"id": ..., "deleted": true}.
+    """
+    since = request.args.get('since', type=int, default=0)
+    limit = min(max(request.args.get('limit', type=int, default=500), 1), CHANGES_MAX_LIMIT)
+    if since < 0:
+        return {'status': 'error', 'message': 'since must be a cursor returned by this endpoint'}, 400
+
+    return {'status': 'success', **get_recipe_changes(since, limit)}, 200
+
+
+@recipes_blueprint.route('/export', methods=['GET'])
+@jwt_required()
+def export():
+    """
+    Stream the whole archive as NDJSON, one recipe per line.
+
+    Pass format=gzip for a gzip compressed stream. The response is written
+    batch by batch as rows come off the cursor, nothing is buffered.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'gzip'):
+        return jsonify({
+            'success': False,
+            'message': 'format must be ndjson or gzip'
+        }), 400
+
+    chunks = iter_export()
+    filename = 'recipes.ndjson'
+    mimetype = 'application/x-ndjson'
+    if export_format == 'gzip':
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+
+    logger.info('Recipe export (%s) started by user %s', export_format, get_jwt_identity())
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+MEAL_PLAN_MAX_ITEMS = 5000
+
+
+@recipes_blueprint.route('/meal-plan/nutrition', methods=['POST'])
+@jwt_required()
+def meal_plan_nutrition():
+    try:
+        data = request.get_json()
+        items = data.get('items') if data else None
+
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                'success': False,
+                'message': 'items is required'
+            }), 400
+
+        if len(items) > MEAL_PLAN_MAX_ITEMS:
+            return jsonify({
+                'success': False,
+                'message': f'A meal plan can contain at most {MEAL_PLAN_MAX_ITEMS} items'
+            }), 400
+
+        try:
+            nutrition = aggregate_meal_plan(items)
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'Each item needs a numeric recipe_id and servings'
+            }), 400
+
+        return jsonify({'success': True, **nutrition})
+
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error calculating meal plan nutrition: %s', str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while calculating meal plan nutrition'
+        }), 500
+
+
+SCALE_MAX_RECIPES = 500
 
-        # Create recipe data
-        recipe_data, recipe_nutrients = create_recipe_data(
-            recipe_data if recipe_url else data,
-            recipe_url
-        )
 
-        # Calculate calories
-        calories_total, calories_serving = calculate_calories(
-            float(recipe_data['calories']),
-            float(recipe_data['servings']),
-            recipe_data['calories_unit'] == 'serving'
+def display_time(minutes, stored=None):
+    """Format minutes for display, falling back to the string stored before minutes existed."""
+    return get_prep_cook_time(minutes) if minutes is not None else stored
+
+
+def get_unit_system(units):
+    """Map the units request parameter to a convert_units system, None keeps the original units."""
+    return None if units in (None, '', 'original') else units
+
+
+@recipes_blueprint.route('/<int:recipe_id>/similar', methods=['GET'])
+def similar_recipes(recipe_id):
+    try:
+        if not db.session.query(Recipe.query.filter(Recipe.id == recipe_id).exists()).scalar():
+            return jsonify({
+                'success': False,
+                'message': 'Recipe not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'recipe_id': recipe_id,
+            'similar': get_similar_recipes(recipe_id)
+        })
+
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error getting similar recipes: %s', str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while getting similar recipes'
+        }), 500
+
+
+@recipes_blueprint.route('/<int:recipe_id>/ingredients', methods=['GET'])
+def scaled_ingredients(recipe_id):
+    try:
+        servings = request.args.get('servings', type=float)
+        scaled = get_scaled_ingredients(
+            {recipe_id: servings},
+            get_unit_system(request.args.get('units'))
         )
+        if recipe_id not in scaled:
+            return jsonify({
+                'success': False,
+                'message': 'Recipe not found'
+            }), 404
 
-        # Setup backup file
-        recipes_dir = Path(current_app.config['RA_DATA_DIR']) / 'recipes'
-        recipes_dir.mkdir(parents=True, exist_ok=True)
-        recipe_backup_file = recipes_dir / f'{generate_random_filename()}.json'
-
-        # Create new recipe data
-        new_recipe_data = {
-            'url': bleach.clean(str(recipe_url or 'self')),
-            'backup_file': str(recipe_backup_file),
-            'calories_total': str(calories_total),
-            'calories_serving': str(calories_serving),
-            'nutrients': recipe_nutrients,
-            'tags': [Tag(bleach.clean(str(tag))) for tag in tags],
-            'users': [user],
-        }
+        return jsonify({'success': True, 'recipe_id': recipe_id, **scaled[recipe_id]})
 
-        # Handle special fields separately, then add remaining fields
-        for k, v in recipe_data.items():
-            if k in ['ingredients', 'instructions', 'equipment']:
-                new_recipe_data[k] = v
-            else:
-                new_recipe_data[k] = bleach.clean(str(v))
-
-        # Handle existing recipe with same name
-        if recipe_url == 'self':
-            recipe_query = db.session.query(Recipe).filter(
-                func.lower(Recipe.name) == recipe_data['name'].lower()
-            ).first()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
-            if recipe_query:
-                if not data.get('overwrite_recipe'):
-                    return jsonify({
-                        'success': False,
-                        'message': f'Recipe with name {recipe_data["name"]} already exists',
-                        'recipe_id': recipe_query.id
-                    }), 409
-
-                Path(recipe_query.backup_file).unlink(missing_ok=True)
-                db.session.delete(recipe_query)
-                db.session.commit()
-
-        # Save recipe
-        new_recipe = Recipe(new_recipe_data)
-        db.session.add(new_recipe)
-        db.session.commit()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error scaling ingredients: %s', str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while scaling ingredients'
+        }), 500
 
-        # Backup recipe data
-        backup_data = recipe_data if recipe_url else {
-            **new_recipe_data,
-            'tags': [t.id for t in new_recipe_data['tags']],
-            'users': [user.id]
-        }
-        recipe_backup_file.write_text(json.dumps(backup_data), encoding='utf-8')
+
+@recipes_blueprint.route('/ingredients/scale', methods=['POST'])
+def scale_recipes_ingredients():
+    try:
+        data = request.get_json()
+        recipes = data.get('recipes') if data else None
+
+        if not isinstance(recipes, list) or not recipes:
+            return jsonify({
+                'success': False,
+                'message': 'recipes is required'
+            }), 400
+
+        if len(recipes) > SCALE_MAX_RECIPES:
+            return jsonify({
+                'success': False,
+                'message': f'At most {SCALE_MAX_RECIPES} recipes can be scaled at once'
+            }), 400
+
+        try:
+            servings_by_recipe = {
+                int(recipe['recipe_id']): float(recipe['servings']) if recipe.get('servings') else None
+                for recipe in recipes
+            }
+            scaled = get_scaled_ingredients(servings_by_recipe, get_unit_system(data.get('units')))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'Each recipe needs a numeric recipe_id and servings, and units must be metric, us or original'
+            }), 400
 
         return jsonify({
             'success': True,
-            'message': f'Added recipe for {bleach.clean(recipe_data["name"])}',
-            'recipe_id': new_recipe.id
+            'recipes': [{'recipe_id': recipe_id, **recipe} for recipe_id, recipe in scaled.items()],
+            'missing_recipe_ids': [recipe_id for recipe_id in servings_by_recipe if recipe_id not in scaled]
         })
 
     except Exception as e:  # pylint: disable=broad-exception-caught
-        logger.error('Error adding recipe: %s', str(e), exc_info=True)
+        logger.error('Error scaling ingredients: %s', str(e), exc_info=True)
         return jsonify({
             'success': False,
-            'message': 'An error occurred while adding the recipe'
+            'message': 'An error occurred while scaling ingredients'
         }), 500
 
 
-@recipes_blueprint.route('/table', methods=['GET'])
-def table():
-    query = db.session.query(Recipe)
+PANTRY_MAX_INGREDIENTS = 200
 
-    # Handle search
-    search = request.args.get('search')
-    if search:
-        query = query.filter(Recipe.name.ilike(f'%{search}%'))
 
-    total_records = query.count()
+@recipes_blueprint.route('/pantry', methods=['POST'])
+def pantry():
+    try:
+        data = request.get_json()
+        ingredients = data.get('ingredients') if data else None
 
-    # Handle sorting
-    sort = request.args.get('sort')
-    if sort:
-        order = []
-        for s in sort.split(','):
-            direction = s[0]
-            col = getattr(Recipe, 'name')
-            if direction == '-':
-                col = col.desc()
-            order.append(col)
-        if order:
-            query = query.order_by(*order)
+        if not isinstance(ingredients, list) or not ingredients:
+            return jsonify({
+                'success': False,
+                'message': 'ingredients is required'
+            }), 400
 
-    # Handle pagination
-    page = request.args.get('page', type=int, default=1)
-    limit = request.args.get('limit', type=int, default=10)
-    offset = (page - 1) * limit
-    query = query.offset(offset).limit(limit)
+        if len(ingredients) > PANTRY_MAX_INGREDIENTS:
+            return jsonify({
+                'success': False,
+                'message': f'At most {PANTRY_MAX_INGREDIENTS} ingredients can be searched at once'
+            }), 400
 
-    # Format table data
-    table_data = []
-    for recipe in query:
-        recipe_link = f'/recipes/{recipe.id}'
-        table_data.append({
-            'id': recipe.id,
-            'name': f'{recipe.name} ({recipe.source})',
-            'link': recipe_link,
-            'source_url': recipe_link if recipe.url == 'self' else bleach.clean(recipe.url),
+        try:
+            limit = min(max(int(data.get('limit', 20)), 1), 100)
+            max_missing = data.get('max_missing')
+            max_missing = int(max_missing) if max_missing is not None else None
+            pantry_ingredients = [str(ingredient) for ingredient in ingredients]
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'limit and max_missing must be numbers'
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'recipes': find_recipes_by_pantry(pantry_ingredients, limit, max_missing)
         })
 
-    return {'status': 'success', 'data': table_data, 'total': total_records}, 200
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error searching recipes by pantry: %s', str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while searching recipes'
+        }), 500
+
+
+@recipes_blueprint.route('/shopping-list', methods=['POST'])
+@jwt_required()
+def shopping_list():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        recipes = data.get('recipes') if data else None
+
+        if not isinstance(recipes, list) or not recipes:
+            return jsonify({
+                'success': False,
+                'message': 'recipes is required'
+            }), 400
+
+        if len(recipes) > SCALE_MAX_RECIPES:
+            return jsonify({
+                'success': False,
+                'message': f'At most {SCALE_MAX_RECIPES} recipes can be combined at once'
+            }), 400
+
+        try:
+            # The same recipe planned on several days is bought for the combined servings
+            servings_by_recipe = {}
+            for recipe in recipes:
+                recipe_id = int(recipe['recipe_id'])
+                servings = float(recipe['servings']) if recipe.get('servings') else None
+                if servings and servings_by_recipe.get(recipe_id):
+                    servings += servings_by_recipe[recipe_id]
+                servings_by_recipe[recipe_id] = servings
+            result = build_shopping_list(user_id, servings_by_recipe, data.get('units') or 'us')
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'Each recipe needs a numeric recipe_id and servings, and units must be metric or us'
+            }), 400
+
+        return jsonify({'success': True, **result})
+
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error building shopping list: %s', str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while building the shopping list'
+        }), 500
+
+
+# Seconds browsers and proxies may keep a thumbnail
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+@recipes_blueprint.route('/images/<digest>/<variant>', methods=['GET'])
+def image(digest, variant):
+    """A thumbnail. Paths are content addressed, so they are cached for good."""
+    if not IMAGE_DIGEST.fullmatch(digest) or not IMAGE_VARIANT.fullmatch(variant):
+        abort(404)
+    response = send_from_directory(image_dir(images_dir(), digest), variant, max_age=IMAGE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 @recipes_blueprint.route('/<int:recipe_id>', methods=['GET'])
@@ -304,16 +740,24 @@ def get_recipe(recipe_id):
                 'url': recipe.url,
                 'name': recipe.name,
                 'source': recipe.source,
+                'extraction_source': recipe.extraction_source,
                 'servings': recipe.servings,
-                'prep_time': recipe.prep_time,
-                'cook_time': recipe.cook_time,
+                'prep_time': display_time(recipe.prep_minutes, recipe.prep_time),
+                'cook_time': display_time(recipe.cook_minutes, recipe.cook_time),
+                'total_time': display_time(recipe.total_minutes),
+                'prep_minutes': recipe.prep_minutes,
+                'cook_minutes': recipe.cook_minutes,
+                'total_minutes': recipe.total_minutes,
+                'date_added': recipe.created_at.isoformat() if recipe.created_at else None,
                 'calories_total': recipe.calories_total,
                 'calories_serving': recipe.calories_serving,
                 'nutrients': recipe.nutrients,
                 'ingredients': recipe.ingredients,
                 'instructions': recipe.instructions,
                 'equipment': recipe.equipment,
-                'tags': [tag.name for tag in recipe.tags]
+                'tags': [tag.name for tag in recipe.tags],
+                'image_url': recipe.image_url,
+                'images': recipe_images(recipe)
             }
         })
 
@@ -325,14 +769,11 @@ def get_recipe(recipe_id):
         }), 500
 
 
-@recipes_blueprint.route('/user/recipe-progress/<int:recipe_id>', methods=['GET', 'POST'])
+@recipes_blueprint.route('/user/recipe-progress/<int:recipe_id>', methods=['GET', 'POST', 'PATCH'])
 @jwt_required()
 def update_recipe_progress(recipe_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'success': False, 'message': 'User not found'}), 404
 
         if request.method == 'GET':
             user_progress = UserRecipeProgress.query.filter_by(
@@ -342,35 +783,43 @@ def update_recipe_progress(recipe_id):
 
             return jsonify({
                 'success': True,
-                'checked_ingredients': user_progress.checked_ingredients if user_progress else {}
+                'checked_ingredients': {
+                    **(user_progress.checked_ingredients if user_progress else {}),
+                    **pending_recipe_progress(user_id, recipe_id)
+                }
             })
 
-        # POST method
-        data = request.get_json()
+        data = request.get_json() or {}
+
+        # PATCH method, e.g. {"changes": {"ingredient-3": true}} for a single tick
+        if request.method == 'PATCH':
+            try:
+                changes = validate_progress_changes(data.get('changes'))
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            if not db.session.query(Recipe.id).filter(Recipe.id == recipe_id).scalar():
+                return jsonify({'success': False, 'message': 'Recipe not found'}), 404
+
+            queue_recipe_progress(user_id, recipe_id, changes)
+            emit_recipe_progress(user_id, recipe_id, changes)
+            return jsonify({'success': True})
+
+        # POST method replaces the whole map
         checked_ingredients = data.get('checked_ingredients')
 
-        if checked_ingredients is None:
+        if not isinstance(checked_ingredients, dict):
             return jsonify({
                 'success': False,
                 'message': 'checked_ingredients is required'
             }), 400
 
-        user_progress = UserRecipeProgress.query.filter_by(
-            user_id=user_id,
-            recipe_id=recipe_id
-        ).first()
-
-        if not user_progress:
-            user_progress = UserRecipeProgress(
-                user_id=user_id,
-                recipe_id=recipe_id,
-                checked_ingredients=checked_ingredients
-            )
-            db.session.add(user_progress)
-        else:
-            user_progress.checked_ingredients = checked_ingredients
-
-        db.session.commit()
+        discard_recipe_progress(user_id, recipe_id)
+        try:
+            upsert_recipe_progress(user_id, recipe_id, checked_ingredients, replace=True)
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Recipe not found'}), 404
+        invalidate_shopping_lists(user_id)
 
         logger.info('Updated recipe progress for user %s, recipe %s', user_id, recipe_id)
         return jsonify({'success': True})
@@ -398,18 +847,17 @@ def delete_recipe(recipe_id):
             }), 404
 
         # Check if user is authorized to delete the recipe
-        if not (user.is_admin() or recipe in user.recipes):
+        if not (user.is_admin() or owns_recipe(user.id, recipe_id)):
             return jsonify({
                 'success': False,
                 'message': 'Unauthorized to delete this recipe'
             }), 403
 
-        # Delete the backup file if it exists
-        if recipe.backup_file:
-            Path(recipe.backup_file).unlink(missing_ok=True)
-
-        db.session.delete(recipe)
+        backup_files = delete_recipes([recipe_id])
         db.session.commit()
+        invalidate_deleted_recipes([recipe_id])
+        delete_backup_files_task.delay(backup_files)
+        refresh_similar_recipes_task.delay()
 
         logger.info('Recipe %s deleted by user %s', recipe_id, user_id)
         return jsonify({
@@ -423,3 +871,76 @@ def delete_recipe(recipe_id):
             'success': False,
             'message': 'An error occurred while deleting the recipe'
         }), 500
+
+
+BULK_DELETE_MAX_RECIPES = 1000
+
+
+@recipes_blueprint.route('/bulk-delete', methods=['POST'])
+@jwt_required()
+def bulk_delete_recipes():
+    """
+    Delete many recipes in one transaction.
+
+    Either every requested recipe that exists is deleted or, if the user
+    may not delete some of them, none are. Backup files are removed in the
+    background once the delete has committed.
+    """
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        data = request.get_json(silent=True) or {}
+        recipe_ids = data.get('ids')
+
+        if not isinstance(recipe_ids, list) or not recipe_ids or not all(
+            isinstance(recipe_id, int) and not isinstance(recipe_id, bool) for recipe_id in recipe_ids
+        ):
+            return jsonify({
+                'success': False,
+                'message': 'ids must be a non-empty list of recipe ids'
+            }), 400
+
+        recipe_ids = set(recipe_ids)
+        if len(recipe_ids) > BULK_DELETE_MAX_RECIPES:
+            return jsonify({
+                'success': False,
+                'message': f'At most {BULK_DELETE_MAX_RECIPES} recipes can be deleted at once'
+            }), 400
+
+        found = {recipe_id for recipe_id, in db.session.query(Recipe.id).filter(Recipe.id.in_(recipe_ids))}
+        if not user.is_admin():
+            owned = {
+                recipe_id for recipe_id, in db.session.query(user_recipe.c.recipe_id).filter(
+                    user_recipe.c.user_id == user.id,
+                    user_recipe.c.recipe_id.in_(found)
+                )
+            }
+            if owned != found:
+                return jsonify({
+                    'success': False,
+                    'message': 'Unauthorized to delete some of these recipes',
+                    'unauthorized': sorted(found - owned)
+                }), 403
+
+        backup_files = delete_recipes(found)
+        db.session.commit()
+        invalidate_deleted_recipes(found)
+        if backup_files:
+            delete_backup_files_task.delay(backup_files)
+        if found:
+            refresh_similar_recipes_task.delay()
+
+        logger.info('%s recipes deleted by user %s', len(found), user_id)
+        return jsonify({
+            'success': True,
+            'message': f'Deleted {len(found)} recipes',
+            'deleted': sorted(found),
+            'not_found': sorted(recipe_ids - found)
+        })
+
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error('Error bulk deleting recipes: %s', str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while deleting the recipes'
+        }), 500
@@ -7,6 +7,7 @@ from flask_bcrypt import generate_password_hash
 
 from app.models import User, db
 from app.utils.flask.password_check import password_check
+from app.utils.recipe import add_user_to_autocomplete
 
 logger = logging.getLogger(__name__)
 
@@ -74,6 +75,7 @@ def signup():
 
         db.session.add(new_user)
         db.session.commit()
+        add_user_to_autocomplete(new_user)
 
         return jsonify({
             'success': True,
@@ -1,23 +1,29 @@
 import logging
 
 from flask import Blueprint, request
-from sqlalchemy import func
 
 from app.extensions import db
-from app.models import Recipe, User
+from app.models import User
 
 logger = logging.getLogger(__name__)
 
 users_blueprint = Blueprint('users', __name__)
 
 
+# Sortable fields, each backed by an index on its column
+SORT_COLUMNS = {
+    'id': User.id,
+    'username': User.username,
+    'role': User.role,
+    'recipe_count': User.recipe_count,
+    'joined_date': User.joined_date,
+}
+
+
 @users_blueprint.route('/table', methods=['GET'])
 def users_table():
     try:
-        query = db.session.query(
-            User,
-            func.count(Recipe.id).label('recipe_count')  # pylint: disable=not-callable
-        ).outerjoin(Recipe, User.recipes).group_by(User.id)
+        query = db.session.query(User)
 
         # Handle search
         search = request.args.get('search')
@@ -25,27 +31,30 @@ def users_table():
             query = query.filter(User.username.ilike(f'%{search}%'))
 
         # Get total before pagination
-        total_records = db.session.query(User).count()
+        total_records = query.count()
 
-        # Handle sorting
+        # Handle sorting, recipe_count is a maintained counter so no aggregation is needed
         sort = request.args.get('sort')
         if sort:
             order = []
             for s in sort.split(','):
                 direction = s[0]
                 field = s[1:] if direction in ['+', '-'] else s
+                field = field.strip()
 
-                # Special handling for recipe_count sorting
-                if field == 'recipe_count':
-                    col = func.count(Recipe.id).label('recipe_count')  # pylint: disable=not-callable
-                else:
-                    col = getattr(User, field)
+                if field not in SORT_COLUMNS:
+                    return {
+                        'success': False,
+                        'status': 'error',
+                        'message': f'Cannot sort by {field}'
+                    }, 400
 
+                col = SORT_COLUMNS[field]
                 if direction == '-':
                     col = col.desc()
                 order.append(col)
             if order:
-                query = query.order_by(*order)
+                query = query.order_by(*order, User.id)
 
         # Handle pagination
         page = request.args.get('page', type=int, default=1)
@@ -55,12 +64,12 @@ def users_table():
 
         # Format table data
         table_data = []
-        for user, recipe_count in query:
+        for user in query:
             table_data.append({
                 'id': user.id,
                 'username': user.username,
                 'role': user.role,
-                'recipe_count': recipe_count,
+                'recipe_count': user.recipe_count,
                 'joined_date': user.joined_date.isoformat(),
             })
 
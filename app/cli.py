@@ -1,12 +1,30 @@
 import argparse
 import logging.config
+import time
 from pathlib import Path
 
+import click
 from flask.cli import FlaskGroup
 
 from app import create_app
 from app.config import load_config
 from app.extensions import db, migrate
+from app.utils.recipe.backup_store import migrate_backup_files
+from app.utils.recipe.canonical_url import backfill_canonical_urls
+from app.utils.recipe.changes import seed_recipe_changes
+from app.utils.recipe.export import gzip_chunks, iter_export
+from app.utils.recipe.ingredient_items import backfill_ingredient_items
+from app.utils.recipe.nutrient_values import backfill_nutrient_values
+from app.utils.recipe.ownership import add_user_recipe_keys
+from app.utils.recipe.recipe_images import backfill_recipe_images
+from app.utils.recipe.recipe_times import backfill_recipe_times
+from app.utils.recipe.restore import restore_recipes
+from app.utils.recipe.search_columns import (backfill_search_arrays,
+                                             create_gin_indexes,
+                                             migrate_jsonb_columns)
+from app.utils.recipe.similar_recipes import refresh_similar_recipes
+from app.utils.recipe.tags import merge_duplicate_tags, recount_tags
+from app.utils.recipe.user_counts import recount_user_recipes
 
 config = load_config()
 app, socketio = create_app(config, debug=True)
@@ -19,6 +37,140 @@ def create_cli_app(_):
 
 cli = FlaskGroup(create_app=create_cli_app)
 
+
+@app.cli.command('dedupe-tags')
+def dedupe_tags():
+    """Merge tags with the same normalized name. Run before upgrading to the unique tag index."""
+    removed = merge_duplicate_tags()
+    click.echo(f'Removed {removed} duplicate tags')
+
+
+@app.cli.command('recount-tags')
+def recount_tags_command():
+    """Recompute cached tag recipe counts."""
+    recount_tags()
+    click.echo('Tag recipe counts updated')
+
+
+@app.cli.command('recount-user-recipes')
+def recount_user_recipes_command():
+    """Recompute cached user recipe counts."""
+    recount_user_recipes()
+    click.echo('User recipe counts updated')
+
+
+@app.cli.command('add-user-recipe-keys')
+def add_user_recipe_keys_command():
+    """Drop duplicate user recipe links and add the user_recipe primary key and index."""
+    removed = add_user_recipe_keys()
+    if removed:
+        recount_user_recipes()
+    click.echo(f'Removed {removed} duplicate user recipe links')
+
+
+@app.cli.command('migrate-backups')
+@click.option('--batch-size', default=500, show_default=True, help='Recipes per commit')
+def migrate_backups(batch_size):
+    """Move plain JSON recipe backups into the compressed, content addressed store."""
+    migrated = migrate_backup_files(Path(app.config['RA_DATA_DIR']) / 'recipes', batch_size)
+    click.echo(f'Migrated {migrated} recipe backups')
+
+
+@app.cli.command('restore-recipes')
+@click.option('--workers', type=int, default=None, help='Parser processes, defaults to the CPU count')
+@click.option('--batch-size', default=1000, show_default=True, help='Recipes per commit')
+def restore_recipes_command(workers, batch_size):
+    """Rebuild recipes from the backup directory. Safe to rerun after an interruption."""
+    started = time.monotonic()
+    restored, failed = restore_recipes(Path(app.config['RA_DATA_DIR']) / 'recipes', workers, batch_size)
+    elapsed = time.monotonic() - started
+    click.echo(f'Restored {restored} recipes in {elapsed:.1f}s ({restored / max(elapsed, 1e-9):.0f}/s), {failed} backups failed')
+    if restored:
+        click.echo('Run refresh-similar to rebuild similar recipes')
+
+
+@app.cli.command('seed-recipe-changes')
+def seed_recipe_changes_command():
+    """Add recipes stored before the change feed existed to it, so a sync from 0 sees them."""
+    seeded = seed_recipe_changes()
+    click.echo(f'Added {seeded} recipes to the change feed')
+
+
+@app.cli.command('export-recipes')
+@click.argument('output', type=click.File('wb'), default='-')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip compress the output')
+@click.option('--batch-size', default=1000, show_default=True, help='Recipes fetched per round trip')
+def export_recipes(output, compress, batch_size):
+    """Write every recipe as NDJSON to OUTPUT, or stdout."""
+    chunks = iter_export(batch_size)
+    for chunk in gzip_chunks(chunks) if compress else chunks:
+        output.write(chunk)
+
+
+@app.cli.command('backfill-nutrients')
+@click.option('--batch-size', default=500, show_default=True, help='Recipes per commit')
+def backfill_nutrients(batch_size):
+    """Store numeric nutrient rows for recipes imported before they existed."""
+    backfilled = backfill_nutrient_values(batch_size)
+    click.echo(f'Backfilled nutrients for {backfilled} recipes')
+
+
+@app.cli.command('backfill-ingredients')
+@click.option('--batch-size', default=500, show_default=True, help='Recipes per commit')
+def backfill_ingredients(batch_size):
+    """Parse stored ingredient strings into structured ingredient rows."""
+    backfilled = backfill_ingredient_items(batch_size)
+    click.echo(f'Backfilled ingredients for {backfilled} recipes')
+
+
+@app.cli.command('backfill-times')
+@click.option('--batch-size', default=500, show_default=True, help='Recipes per commit')
+def backfill_times(batch_size):
+    """Fill prep/cook/total minutes and date added for existing recipes."""
+    backfilled = backfill_recipe_times(batch_size)
+    click.echo(f'Backfilled times for {backfilled} recipes')
+
+
+@app.cli.command('backfill-canonical-urls')
+@click.option('--batch-size', default=500, show_default=True, help='Recipes per commit')
+def backfill_canonical_urls_command(batch_size):
+    """Fill the canonical URL imports are deduplicated by for existing recipes."""
+    backfilled, duplicates = backfill_canonical_urls(batch_size)
+    click.echo(f'Backfilled canonical URLs for {backfilled} recipes')
+    if duplicates:
+        click.echo(f'Left {duplicates} duplicate recipes without one, see the log for their ids')
+
+
+@app.cli.command('backfill-images')
+@click.option('--workers', type=int, default=None, help='Render processes, defaults to the CPU count')
+@click.option('--batch-size', default=100, show_default=True, help='Recipes per commit')
+def backfill_images_command(workers, batch_size):
+    """Render thumbnails for recipes whose source image hasn't been processed."""
+    started = time.monotonic()
+    processed, failed = backfill_recipe_images(Path(app.config['RA_DATA_DIR']) / 'images', workers, batch_size)
+    click.echo(f'Rendered images for {processed} recipes in {time.monotonic() - started:.1f}s, {failed} failed')
+
+
+@app.cli.command('migrate-recipe-search')
+@click.option('--batch-size', default=500, show_default=True, help='Recipes per commit')
+def migrate_recipe_search(batch_size):
+    """Move recipe JSON columns to JSONB and build the GIN indexed search arrays."""
+    converted = migrate_jsonb_columns(batch_size)
+    click.echo(f'Converted {converted} recipes to JSONB')
+    backfilled = backfill_search_arrays(batch_size)
+    click.echo(f'Backfilled search arrays for {backfilled} recipes')
+    create_gin_indexes()
+    click.echo('Created GIN indexes')
+
+
+@app.cli.command('refresh-similar')
+@click.option('--full', is_flag=True, help='Recompute every recipe, not only stale ones')
+def refresh_similar(full):
+    """Recompute the stored similar recipes."""
+    refreshed = refresh_similar_recipes(full=full)
+    click.echo(f'Refreshed similar recipes for {refreshed} recipes')
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--host', help='Flask host address. Default 0.0.0.0', dest='host', metavar='0.0.0.0', type=str, nargs='?', const='0.0.0.0', default='0.0.0.0')
@@ -7,7 +7,7 @@ from flask_dance.consumer.storage.sqla import OAuthConsumerMixin
 from flask_login import UserMixin
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from sqlalchemy import BigInteger
-from sqlalchemy.dialects.postgresql import ARRAY, JSON
+from sqlalchemy.dialects.postgresql import ARRAY, JSON, JSONB
 from sqlalchemy.orm import attribute_mapped_collection
 
 from app.config import load_config
@@ -19,34 +19,47 @@ config = load_config()
 
 recipe_tag = db.Table(
     'recipe_tag',
-    db.Column('recipe_id', db.Integer, db.ForeignKey('recipe.id')),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'))
+    db.Column('recipe_id', db.Integer, db.ForeignKey('recipe.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True, index=True)
 )
 
 user_recipe = db.Table(
     'user_recipe',
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('recipe_id', db.Integer, db.ForeignKey('recipe.id'))
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('recipe_id', db.Integer, db.ForeignKey('recipe.id'), primary_key=True),
+    db.Index('ix_user_recipe_recipe_id_user_id', 'recipe_id', 'user_id')
 )
 
 
 class Recipe(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String())
-    name = db.Column(db.String())
+    canonical_url = db.Column(db.String(), unique=True)
+    name = db.Column(db.String(), index=True)
     source = db.Column(db.String())
     backup_file = db.Column(db.String())
+    extraction_source = db.Column(db.String())
+    image_url = db.Column(db.String())
+    image_hash = db.Column(db.String(64))
+    image_widths = db.Column(ARRAY(db.Integer()))
     servings = db.Column(db.Integer())
     prep_time = db.Column(db.String())
     cook_time = db.Column(db.String())
+    prep_minutes = db.Column(db.Integer())
+    cook_minutes = db.Column(db.Integer())
+    total_minutes = db.Column(db.Integer(), index=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     calories = db.Column(db.Integer())
-    calories_total = db.Column(db.Integer())
-    calories_serving = db.Column(db.Integer())
+    calories_total = db.Column(db.Integer(), index=True)
+    calories_serving = db.Column(db.Integer(), index=True)
     calories_unit = db.Column(db.String())
-    nutrients = db.Column(ARRAY(JSON))
+    nutrients = db.Column(JSONB)
     ingredients = db.Column(ARRAY(db.String()))
-    instructions = db.Column(JSON)
+    ingredient_names = db.Column(ARRAY(db.String()))
+    instructions = db.Column(JSONB)
     equipment = db.Column(ARRAY(db.String()))
+    similarity_stale = db.Column(db.Boolean, default=True, server_default='true', nullable=False, index=True)
     tags = db.relationship('Tag', secondary=recipe_tag, backref='recipes')
     users = db.relationship('User', secondary=user_recipe, backref='recipes')
     progress = db.relationship(
@@ -54,21 +67,44 @@ class Recipe(db.Model):
         cascade='all, delete-orphan',
         backref='recipe'
     )
+    nutrient_values = db.relationship(
+        'RecipeNutrient',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+        backref='recipe'
+    )
+    ingredient_items = db.relationship(
+        'RecipeIngredient',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+        order_by='RecipeIngredient.position',
+        backref='recipe'
+    )
+
+    __table_args__ = (
+        db.Index('ix_recipe_equipment', 'equipment', postgresql_using='gin'),
+        db.Index('ix_recipe_ingredient_names', 'ingredient_names', postgresql_using='gin'),
+    )
 
     def __init__(self, new_recipe_data):
         self.url = new_recipe_data['url']
+        self.canonical_url = new_recipe_data.get('canonical_url')
         self.name = new_recipe_data['name']
         self.source = new_recipe_data['source']
         self.backup_file = new_recipe_data['backup_file']
+        self.extraction_source = new_recipe_data.get('extraction_source')
+        self.image_url = new_recipe_data.get('image_url')
         self.servings = new_recipe_data['servings']
-        self.prep_time = new_recipe_data['prep_time']
-        self.cook_time = new_recipe_data['cook_time']
+        self.prep_minutes = new_recipe_data['prep_minutes']
+        self.cook_minutes = new_recipe_data['cook_minutes']
+        self.total_minutes = new_recipe_data['total_minutes']
         self.calories = new_recipe_data['calories']
         self.calories_total = new_recipe_data['calories_total']
         self.calories_serving = new_recipe_data['calories_serving']
         self.calories_unit = new_recipe_data['calories_unit']
         self.nutrients = new_recipe_data['nutrients']
         self.ingredients = new_recipe_data['ingredients']
+        self.ingredient_names = new_recipe_data['ingredient_names']
         self.instructions = new_recipe_data['instructions']
         self.equipment = new_recipe_data['equipment']
         self.tags = new_recipe_data['tags']
@@ -78,6 +114,59 @@ class Recipe(db.Model):
         return str(self.id)
 
 
+class RecipeNutrient(db.Model):
+    """Numeric per-serving nutrient amount, queryable by range."""
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id', ondelete='CASCADE'), primary_key=True)
+    key = db.Column(db.String(), primary_key=True)
+    name = db.Column(db.String(), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    unit = db.Column(db.String())
+    percent_daily = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index('ix_recipe_nutrient_key_amount', 'key', 'amount', 'recipe_id'),
+    )
+
+
+class RecipeIngredient(db.Model):
+    """Structured ingredient line, position matches the index in Recipe.ingredients."""
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    amount = db.Column(db.Float)
+    unit = db.Column(db.String())
+    name = db.Column(db.String(), nullable=False)
+    original = db.Column(db.String(), nullable=False)
+
+    def to_dict(self):
+        return {
+            'position': self.position,
+            'amount': self.amount,
+            'unit': self.unit,
+            'name': self.name,
+            'original': self.original
+        }
+
+
+class RecipeSimilarity(db.Model):
+    """Precomputed nearest neighbours of a recipe, rank 0 is the most similar."""
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id', ondelete='CASCADE'), primary_key=True)
+    similar_recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id', ondelete='CASCADE'), primary_key=True, index=True)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+class RecipeChange(db.Model):
+    """
+    Change feed entry, the id is the sync cursor.
+
+    Not a foreign key so deletes stay in the feed as tombstones.
+    """
+    id = db.Column(BigInteger, primary_key=True)
+    recipe_id = db.Column(db.Integer, nullable=False, index=True)
+    action = db.Column(db.String(), nullable=False)
+    changed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
 class User(UserMixin, db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
@@ -87,11 +176,12 @@ class User(UserMixin, db.Model):
     name = db.Column(db.String(1000), nullable=True)
     username = db.Column(db.String(36), unique=True, nullable=False)
     hidden_fields = db.Column(ARRAY(db.String()), default=[])
-    joined_date = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    joined_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     date_format = db.Column(db.String(), default='MM-DD-YYYY', nullable=False)
     bio = db.Column(db.String(1000), nullable=True)
     quote = db.Column(db.String(200), nullable=True)
-    role = db.Column(db.String(), default='user', nullable=False)
+    role = db.Column(db.String(), default='user', nullable=False, index=True)
+    recipe_count = db.Column(db.Integer, default=0, server_default='0', nullable=False, index=True)
     theme = db.Column(db.String(), default='dark', nullable=False)
     profile_picture = db.Column(db.String(28), default='profile_default.png', nullable=False)
     avatar = db.Column(db.String(100), default='profile_default_avatar.png', nullable=False)
@@ -176,7 +266,9 @@ class OAuth(OAuthConsumerMixin, db.Model):
 
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String())
+    name = db.Column(db.String(), unique=True, nullable=False)
+    # Cached number of recipes linked to the tag, maintained incrementally
+    recipe_count = db.Column(db.Integer, default=0, server_default='0', nullable=False, index=True)
 
     def __init__(self, name):
         self.name = name
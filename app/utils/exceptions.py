@@ -1,9 +1,15 @@
 class SpoonacularQuotaError(Exception):
-    pass
+    def __init__(self, message='Spoonacular daily quota used up', retry_at=None):
+        super().__init__(message)
+        # Unix time the quota resets, when known
+        self.retry_at = retry_at
 
 
 class SpoonacularRateLimitError(Exception):
-    pass
+    def __init__(self, message='Spoonacular rate limit reached', retry_at=None):
+        super().__init__(message)
+        # Unix time a request is expected to go through again, when known
+        self.retry_at = retry_at
 
 
 class SpoonacularUnauthorizedError(Exception):
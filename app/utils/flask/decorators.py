@@ -1,12 +1,24 @@
+import hashlib
+import time
 from functools import wraps
 
 import bcrypt
-from flask import jsonify, request
+from flask import jsonify, make_response, request
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 
 from app.extensions import cache
 from app.models import User
 
+# Seconds a response is replayed to requests repeating its Idempotency-Key
+IDEMPOTENCY_TIMEOUT = 24 * 60 * 60
+
+# Seconds a request holds its key while running
+IDEMPOTENCY_CLAIM_TIMEOUT = 5 * 60
+
+# Seconds a request waits for a concurrent one with the same key before it is told to retry, and between checks
+IDEMPOTENCY_WAIT = 10
+IDEMPOTENCY_POLL_INTERVAL = 0.25
+
 
 def require_password_confirmation(f):
     @wraps(f)
@@ -68,3 +80,72 @@ def rate_limit_oauth(f):
 
         return f(*args, **kwargs)
     return decorated_function
+
+
+def is_final_response(response) -> bool:
+    """Whether retrying a request can't change its response, so it can be replayed."""
+    return (
+        response.status_code < 500
+        and response.status_code != 429
+        and 'Retry-After' not in response.headers
+        and response.is_json
+    )
+
+
+def idempotent(f):
+    """
+    Replay the response of a request to later requests with the same Idempotency-Key header.
+
+    Keys are scoped to the endpoint and user. A request arriving while one
+    with its key is still running waits for that response instead of
+    running again, for up to IDEMPOTENCY_WAIT, and reusing a key for a
+    different body is rejected.
+    Only final outcomes are kept. Server errors, rate limits and responses
+    with a Retry-After header, like lock timeouts and deferrals, aren't, so
+    the request can be retried with the key.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            return f(*args, **kwargs)
+
+        verify_jwt_in_request()
+        key = f'idempotency:{request.endpoint}:{get_jwt_identity()}:{idempotency_key}'
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        # Claim the key, or wait for the request holding it
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        while not cache.add(key, {'fingerprint': fingerprint}, timeout=IDEMPOTENCY_CLAIM_TIMEOUT):
+            stored = cache.get(key)
+            if stored and stored['fingerprint'] != fingerprint:
+                return jsonify({
+                    'success': False,
+                    'message': 'Idempotency-Key was already used for a different request'
+                }), 422
+            if stored and 'body' in stored:
+                return jsonify(stored['body']), stored['status']
+            if time.monotonic() > deadline:
+                response = jsonify({
+                    'success': False,
+                    'message': 'A request with this Idempotency-Key is still running'
+                })
+                response.headers['Retry-After'] = str(IDEMPOTENCY_WAIT)
+                return response, 409
+            time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            cache.delete(key)
+            raise
+        if is_final_response(response):
+            cache.set(key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'body': response.get_json()
+            }, timeout=IDEMPOTENCY_TIMEOUT)
+        else:
+            cache.delete(key)
+        return response
+    return decorated_function
@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+from cryptography.fernet import Fernet
+from flask import current_app
+
+
+@lru_cache(maxsize=4)
+def get_cipher(encryption_key: str) -> Fernet:
+    """One Fernet instance per key and process instead of one per request"""
+    return Fernet(encryption_key.encode())
+
+
+def encrypt_value(value: str) -> str:
+    return get_cipher(current_app.config['ENCRYPTION_KEY']).encrypt(value.encode()).decode()
+
+
+def decrypt_value(value: str) -> str:
+    return get_cipher(current_app.config['ENCRYPTION_KEY']).decrypt(value.encode()).decode()
@@ -3,9 +3,8 @@ from datetime import datetime, timezone
 from functools import wraps
 from typing import List
 
-import bleach
 from dateutil.relativedelta import relativedelta
-from flask import request
+from flask import current_app, request
 from flask_jwt_extended import decode_token, get_jwt_identity
 from flask_jwt_extended.exceptions import JWTDecodeError, NoAuthorizationError
 from flask_socketio import disconnect, emit, join_room
@@ -14,9 +13,13 @@ from sqlalchemy import and_, func, or_
 
 from app.config import load_config
 from app.extensions import db
-from app.models import Message, MessageReaction, Notification, User
+from app.models import Message, MessageReaction, Notification, Recipe, User
 from app.utils.flask.message_queue import (handle_websocket_cluster,
-                                           process_message)
+                                           process_message,
+                                           queue_recipe_progress)
+from app.utils.flask.profile_cache import invalidate_profile
+from app.utils.recipe import validate_progress_changes
+from app.utils.sanitize import clean_text
 
 config = load_config()
 
@@ -191,7 +194,7 @@ def message_input(event_json):
     message_data = {
         'sender_id': current_user.id,
         'recipient_id': recipient_user_id,
-        'body': bleach.clean(message_content),
+        'body': clean_text(message_content),
         'timestamp': datetime.now(timezone.utc)
     }
 
@@ -383,6 +386,38 @@ def theme_update(message_json):
     if new_theme in ['auto', 'dark', 'light']:
         current_user.theme = new_theme
         db.session.commit()
+        invalidate_profile(current_user.id)
+
+
+@authenticated_only
+@rate_limit('recipe_progress', limit=120, period=60)  # 2 ticks per second
+def recipe_progress_patch(event_json):
+    current_user_id = get_jwt_identity()
+    try:
+        recipe_id = int(event_json['recipe_id'])
+    except (KeyError, TypeError, ValueError):
+        emit('error', {'message': 'recipe_id must be an integer'}, room=request.sid)
+        return
+    try:
+        changes = validate_progress_changes(event_json.get('changes'))
+    except ValueError as e:
+        emit('error', {'message': str(e)}, room=request.sid)
+        return
+    # Checked before queueing, the delayed flush would fail on the foreign key
+    if not db.session.query(Recipe.id).filter(Recipe.id == recipe_id).scalar():
+        emit('error', {'message': 'Recipe not found'}, room=request.sid)
+        return
+
+    queue_recipe_progress(current_user_id, recipe_id, changes)
+    emit_recipe_progress(current_user_id, recipe_id, changes, skip_sid=request.sid)
+
+
+def emit_recipe_progress(user_id, recipe_id, changes, skip_sid=None):
+    """Send progress changes to the user's other devices, which all joined its room on connect."""
+    current_app.extensions['socketio'].emit('recipe_progress', {
+        'recipe_id': recipe_id,
+        'changes': changes
+    }, room=f"user_{user_id}", skip_sid=skip_sid)
 
 
 @authenticated_only
@@ -454,3 +489,4 @@ def init_events(socketio):
     socketio.on_event('message_reaction', handle_reaction)
     socketio.on_event('load_more_messages', get_messages)
     socketio.on_event('theme_update', theme_update)
+    socketio.on_event('recipe_progress_patch', recipe_progress_patch)
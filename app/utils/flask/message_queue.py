@@ -1,11 +1,29 @@
+import hashlib
 import json
+import logging
+from pathlib import Path
 
+import requests
 from celery import Celery
+from flask import current_app
 from redis import Redis
+from sqlalchemy.exc import IntegrityError
 
 from app.config import load_config
 from app.extensions import db
 from app.models import Message, Notification
+from app.utils.recipe.autocomplete import add_recipe_to_autocomplete
+from app.utils.recipe.backup_files import (delete_backup_files,
+                                           reconcile_backup_files)
+from app.utils.recipe.import_recipe import SIMILARITY_FIELDS
+from app.utils.recipe.nutrient_vectors import invalidate_nutrient_vectors
+from app.utils.recipe.pantry_index import add_to_pantry_index
+from app.utils.recipe.progress import upsert_recipe_progress
+from app.utils.recipe.recipe_images import process_recipe_image
+from app.utils.recipe.shopping_list import invalidate_shopping_lists
+from app.utils.recipe.similar_recipes import refresh_similar_recipes
+
+logger = logging.getLogger(__name__)
 
 config = load_config()
 
@@ -20,6 +38,17 @@ redis_client = Redis(
     db=config['redis']['message_db']
 )
 
+# Seconds rapid progress ticks are coalesced for before they are written
+PROGRESS_FLUSH_DELAY = 2
+
+# Seconds between sweeps of the backup directory for orphaned files
+BACKUP_RECONCILE_INTERVAL = 6 * 60 * 60
+
+# Seconds an import may hold the lock of its URL, and a concurrent import of the URL waits for it
+# before it is told to retry, short so it doesn't tie up a web worker
+IMPORT_LOCK_TIMEOUT = 5 * 60
+IMPORT_LOCK_WAIT = 10
+
 
 @celery.task
 def process_message(message_data):
@@ -41,6 +70,142 @@ def process_message(message_data):
     return message.id
 
 
+@celery.task
+def refresh_similar_recipes_task():
+    """Recompute similar recipes for stale rows, skipped while another run holds the lock"""
+    lock = redis_client.lock('refresh_similar_recipes', timeout=60 * 60)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        return refresh_similar_recipes()
+    finally:
+        lock.release()
+
+
+def recipes_dir():
+    return Path(current_app.config['RA_DATA_DIR']) / 'recipes'
+
+
+def images_dir():
+    return Path(current_app.config['RA_DATA_DIR']) / 'images'
+
+
+@celery.task
+def delete_backup_files_task(paths):
+    """Remove the backup files of recipes whose delete has committed"""
+    return delete_backup_files(paths, recipes_dir())
+
+
+@celery.task
+def reconcile_backup_files_task():
+    """Sweep the backup directory for files no recipe points at, skipped while another sweep runs"""
+    lock = redis_client.lock('reconcile_backup_files', timeout=60 * 60)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        removed, _ = reconcile_backup_files(recipes_dir())
+        return removed
+    finally:
+        lock.release()
+
+
+def recipe_import_lock(canonical_url):
+    """Lock serializing imports of the same recipe page across workers, acquire it within IMPORT_LOCK_WAIT"""
+    digest = hashlib.sha256(canonical_url.encode()).hexdigest()
+    return redis_client.lock(f'recipe_import:{digest}', timeout=IMPORT_LOCK_TIMEOUT, blocking_timeout=IMPORT_LOCK_WAIT)
+
+
+def after_recipe_saved(recipe, changed, stale_files):
+    """Update caches and indexes for what save_recipe() committed, changed is None for a new recipe"""
+    if changed is not None and not changed:
+        return
+    if stale_files:
+        delete_backup_files_task.delay(stale_files)
+    if changed and 'nutrients' in changed:
+        invalidate_nutrient_vectors([recipe.id])
+    if changed and {'ingredients', 'ingredient_names', 'servings'} & changed:
+        invalidate_shopping_lists()
+    if changed is None or {'ingredients', 'ingredient_names'} & changed:
+        add_to_pantry_index(recipe.id, [item.name for item in recipe.ingredient_items])
+    if changed is None or SIMILARITY_FIELDS & changed:
+        refresh_similar_recipes_task.delay()
+    if changed is None or {'name', 'tags'} & changed:
+        add_recipe_to_autocomplete(recipe)
+    if recipe.image_url and (changed is None or 'image_url' in changed):
+        process_recipe_image_task.delay(recipe.id)
+
+
+@celery.task
+def process_recipe_image_task(recipe_id):
+    """Fetch a recipe's source image and render its thumbnails, the worker pool's processes do the resizing"""
+    try:
+        return process_recipe_image(recipe_id, images_dir())
+    except (requests.RequestException, ValueError) as e:
+        db.session.rollback()
+        logger.warning('No thumbnails for recipe %s: %s', recipe_id, e)
+        return False
+
+
+celery.conf.beat_schedule = {
+    'reconcile-backup-files': {
+        'task': reconcile_backup_files_task.name,
+        'schedule': BACKUP_RECONCILE_INTERVAL,
+    },
+}
+
+
+def progress_key(user_id, recipe_id):
+    return f'recipe_progress:{user_id}:{recipe_id}'
+
+
+def queue_recipe_progress(user_id, recipe_id, changes):
+    """
+    Buffer a progress patch in Redis and schedule one delayed flush.
+
+    Every tick within PROGRESS_FLUSH_DELAY lands in the same hash, so a
+    burst of checkbox clicks becomes a single database write.
+    """
+    key = progress_key(user_id, recipe_id)
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={name: int(checked) for name, checked in changes.items()})
+    pipe.set(f'{key}:scheduled', 1, nx=True, ex=PROGRESS_FLUSH_DELAY * 10)
+    _, scheduled = pipe.execute()
+    if scheduled:
+        flush_recipe_progress.apply_async((user_id, recipe_id), countdown=PROGRESS_FLUSH_DELAY)
+
+
+def pending_recipe_progress(user_id, recipe_id):
+    """Progress changes buffered but not yet written"""
+    pending = redis_client.hgetall(progress_key(user_id, recipe_id))
+    return {name.decode(): value == b'1' for name, value in pending.items()}
+
+
+def discard_recipe_progress(user_id, recipe_id):
+    """Drop buffered changes, e.g. when the whole map is replaced"""
+    redis_client.delete(progress_key(user_id, recipe_id))
+
+
+@celery.task
+def flush_recipe_progress(user_id, recipe_id):
+    """Write the coalesced progress changes of a user and recipe in one upsert"""
+    key = progress_key(user_id, recipe_id)
+    pipe = redis_client.pipeline()
+    pipe.hgetall(key)
+    pipe.delete(key, f'{key}:scheduled')
+    pending, _ = pipe.execute()
+    if not pending:
+        return 0
+
+    try:
+        upsert_recipe_progress(user_id, recipe_id, {name.decode(): value == b'1' for name, value in pending.items()})
+    except IntegrityError:
+        db.session.rollback()
+        logger.warning('Dropped progress for missing recipe %s of user %s', recipe_id, user_id)
+        return 0
+    invalidate_shopping_lists(user_id)
+    return len(pending)
+
+
 def handle_websocket_cluster(event_type, data):
     """Handle WebSocket events across multiple servers"""
     message = {
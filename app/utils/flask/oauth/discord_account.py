@@ -2,6 +2,7 @@ import pyotp
 
 from app.extensions import db
 from app.models import OAuth, User
+from app.utils.recipe import add_user_to_autocomplete
 
 
 def create(user_info, token):
@@ -25,6 +26,7 @@ def create(user_info, token):
 
     db.session.add(user)
     db.session.commit()
+    add_user_to_autocomplete(user)
 
     oauth = OAuth(
         provider='discord',
@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+
+from app.extensions import cache
+from app.models import User, UserSchema
+from app.utils.flask.encryption import decrypt_value
+
+PROFILE_CACHE_TIMEOUT = 60 * 60
+
+# Chat session state and counters that change outside profile edits, not part of the profile
+PROFILE_VOLATILE_FIELDS = ('websocket_id', 'current_chat_id', 'recipe_count')
+
+user_schema = UserSchema(exclude=('password', 'secret_token', *PROFILE_VOLATILE_FIELDS))
+
+
+def profile_cache_key(user_id: int) -> str:
+    # v2 entries hold the Spoonacular key encrypted, older ones expire unread
+    return f'profile:v2:{user_id}'
+
+
+def render_profile(user: User) -> Dict:
+    """
+    Serialize a user once into the owner and public views of their profile.
+
+    The owner view (also shown to admins) keeps the Spoonacular key
+    encrypted, as it is cached, and owner_view() decrypts it for the
+    response. The public view drops the user's hidden fields and never
+    has the key.
+    """
+    owner = user_schema.dump(user)
+    public = {
+        field: value
+        for field, value in owner.items()
+        if field not in (user.hidden_fields or []) and field != 'spoonacular_api_key'
+    }
+    return {'role': user.role, 'owner': owner, 'public': public}
+
+
+def owner_view(views: Dict) -> Dict:
+    """The owner view of cached profile views with the Spoonacular key decrypted, for the response only."""
+    owner = dict(views['owner'])
+    if owner.get('spoonacular_api_key'):
+        owner['spoonacular_api_key'] = decrypt_value(owner['spoonacular_api_key'])
+    return owner
+
+
+def get_profiles(*user_ids: int) -> Dict[int, Optional[Dict]]:
+    """
+    Cached profile views of users, rendering and caching the misses.
+
+    All ids are read with one cache round trip. Users that don't exist map to None.
+    """
+    user_ids = [int(user_id) for user_id in user_ids]
+    cached = cache.get_many(*[profile_cache_key(user_id) for user_id in user_ids])
+    profiles = dict(zip(user_ids, cached))
+
+    missing = [user_id for user_id, views in profiles.items() if views is None]
+    if missing:
+        rendered = {user.id: render_profile(user) for user in User.query.filter(User.id.in_(missing))}
+        if rendered:
+            cache.set_many(
+                {profile_cache_key(user_id): views for user_id, views in rendered.items()},
+                timeout=PROFILE_CACHE_TIMEOUT
+            )
+        profiles.update(rendered)
+    return profiles
+
+
+def invalidate_profile(user_id: int) -> None:
+    """Drop the cached views of a user after anything in their profile changed."""
+    cache.delete(profile_cache_key(int(user_id)))
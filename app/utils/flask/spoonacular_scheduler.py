@@ -0,0 +1,253 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from redis.exceptions import LockError
+
+from app.extensions import db
+from app.models import User
+from app.utils.exceptions import (SpoonacularQuotaError,
+                                  SpoonacularRateLimitError,
+                                  SpoonacularUnauthorizedError)
+from app.utils.flask.encryption import decrypt_value
+from app.utils.flask.message_queue import (after_recipe_saved, celery,
+                                           recipe_import_lock, recipes_dir,
+                                           redis_client)
+from app.utils.recipe import (EXTRACTED_SPOONACULAR, build_recipe_fields,
+                              canonical_url, find_recipe_by_url,
+                              get_or_create_tags, raise_for_code,
+                              request_recipe_data, save_recipe,
+                              share_recipe)
+
+logger = logging.getLogger(__name__)
+
+# Token bucket per key: burst size and sustained requests per second
+SPOONACULAR_BUCKET_CAPACITY = 2
+SPOONACULAR_BUCKET_RATE = 1.0
+
+# Seconds a request waits for a token before the import is deferred instead
+SPOONACULAR_MAX_WAIT = 5
+
+# Seconds a rate limited key is left alone
+SPOONACULAR_RATE_LIMIT_BACKOFF = 60
+
+# Seconds between replays of deferred imports, and imports replayed per run
+DEFERRED_REPLAY_INTERVAL = 60
+DEFERRED_REPLAY_BATCH = 50
+
+DEFERRED_IMPORTS_KEY = 'spoonacular:deferred'
+
+# Takes a token, or reserves the next one when it comes within max_wait.
+# Returns the seconds to wait as a string, as Lua numbers are truncated to integers in replies.
+TAKE_TOKEN_SCRIPT = redis_client.register_script("""
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+end
+if wait <= max_wait then
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + max_wait + 60)
+return tostring(wait)
+""")
+
+
+def spoonacular_key_id(spoonacular_api_key: str) -> str:
+    """Redis name of a key, so users sharing a key share its quota and the key itself is never stored."""
+    return hashlib.sha256(spoonacular_api_key.encode()).hexdigest()[:16]
+
+
+def next_quota_reset(now: float) -> float:
+    """Spoonacular resets daily quotas at midnight UTC."""
+    today = datetime.fromtimestamp(now, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (today + timedelta(days=1)).timestamp()
+
+
+def take_spoonacular_token(key_id: str) -> float:
+    """
+    Take a token from the bucket of a key.
+
+    Returns:
+        float: Seconds to wait before calling, more than SPOONACULAR_MAX_WAIT if no token was taken
+    """
+    return float(TAKE_TOKEN_SCRIPT(
+        keys=[f'spoonacular:bucket:{key_id}'],
+        args=[SPOONACULAR_BUCKET_CAPACITY, SPOONACULAR_BUCKET_RATE, time.time(), SPOONACULAR_MAX_WAIT]
+    ))
+
+
+def record_spoonacular_quota(key_id: str, quota: Dict[str, float], exhausted: bool) -> Optional[float]:
+    """
+    Store the quota a response reported, marking the key exhausted until the reset when none is left.
+
+    Returns:
+        float: Time of the reset if the key is exhausted
+    """
+    reset_at = next_quota_reset(time.time())
+    pipe = redis_client.pipeline()
+    if quota:
+        pipe.hset(f'spoonacular:quota:{key_id}', mapping=quota)
+        pipe.expireat(f'spoonacular:quota:{key_id}', int(reset_at))
+    exhausted = exhausted or quota.get('left', 1) <= 0
+    if exhausted:
+        pipe.set(f'spoonacular:exhausted:{key_id}', reset_at, exat=int(reset_at))
+    pipe.execute()
+    return reset_at if exhausted else None
+
+
+def get_spoonacular_quota(spoonacular_api_key: str) -> Dict:
+    """Quota points of a key as of its last response, and when it resets if it is used up."""
+    key_id = spoonacular_key_id(spoonacular_api_key)
+    pipe = redis_client.pipeline()
+    pipe.hgetall(f'spoonacular:quota:{key_id}')
+    pipe.get(f'spoonacular:exhausted:{key_id}')
+    quota, exhausted_until = pipe.execute()
+    return {
+        **{name.decode(): float(value) for name, value in quota.items()},
+        'exhausted_until': float(exhausted_until) if exhausted_until else None,
+    }
+
+
+def fetch_recipe_data(recipe_url: str, spoonacular_api_key: str) -> Dict:
+    """
+    Extract a recipe with Spoonacular, paced by the token bucket and quota of the key.
+
+    Keys known to be out of quota aren't called until the reset, and a
+    call that would wait more than SPOONACULAR_MAX_WAIT for a token isn't
+    made, so the caller can defer the import to the retry_at of the error.
+
+    Raises:
+        SpoonacularUnauthorizedError: If the key is rejected
+        SpoonacularQuotaError: If the daily quota of the key is used up
+        SpoonacularRateLimitError: If the key has to slow down
+    """
+    key_id = spoonacular_key_id(spoonacular_api_key)
+    exhausted_until, backoff_until = redis_client.mget(
+        f'spoonacular:exhausted:{key_id}',
+        f'spoonacular:backoff:{key_id}'
+    )
+    if exhausted_until:
+        raise SpoonacularQuotaError(retry_at=float(exhausted_until))
+    if backoff_until:
+        raise SpoonacularRateLimitError(retry_at=float(backoff_until))
+
+    wait = take_spoonacular_token(key_id)
+    if wait > SPOONACULAR_MAX_WAIT:
+        raise SpoonacularRateLimitError(retry_at=time.time() + wait)
+    if wait:
+        time.sleep(wait)
+
+    recipe_data, quota = request_recipe_data(recipe_url, spoonacular_api_key)
+    code = recipe_data.get('code') if isinstance(recipe_data, dict) else None
+    reset_at = record_spoonacular_quota(key_id, quota, code == 402)
+    if code == 402:
+        raise SpoonacularQuotaError(retry_at=reset_at)
+    if code == 429:
+        retry_at = time.time() + SPOONACULAR_RATE_LIMIT_BACKOFF
+        redis_client.set(f'spoonacular:backoff:{key_id}', retry_at, ex=SPOONACULAR_RATE_LIMIT_BACKOFF)
+        raise SpoonacularRateLimitError(retry_at=retry_at)
+    raise_for_code(recipe_data)
+    return recipe_data
+
+
+def defer_recipe_import(user_id: int, recipe_url: str, tags: List[str], overwrite: bool, retry_at: Optional[float]) -> float:
+    """
+    Park an import Spoonacular couldn't take until retry_at, when replay_deferred_imports picks it up.
+
+    Returns:
+        float: Time the import will be retried
+    """
+    retry_at = retry_at or time.time() + SPOONACULAR_RATE_LIMIT_BACKOFF
+    job = json.dumps({
+        'user_id': user_id,
+        'url': recipe_url,
+        'tags': sorted(tags),
+        'overwrite': overwrite,
+    }, sort_keys=True)
+    # A repeated request for the same import keeps its place
+    redis_client.zadd(DEFERRED_IMPORTS_KEY, {job: retry_at}, nx=True)
+    return retry_at
+
+
+def replay_import(job: Dict) -> Optional[int]:
+    """
+    Run a deferred import, or share the recipe its page got while it was parked.
+
+    Unless the job overwrites it, a recipe added in the meantime gets the
+    user and their tags, as for a submission that waited on its import.
+
+    Returns:
+        int: Id of the recipe, None if the import was dropped
+    """
+    user = db.session.query(User).get(job['user_id'])
+    if not user:
+        logger.warning('Dropped deferred import of %s, user %s no longer exists', job['url'], job['user_id'])
+        return None
+
+    with recipe_import_lock(canonical_url(job['url'])):
+        existing = find_recipe_by_url(job['url'])
+        if existing and not job['overwrite']:
+            recipe = existing
+            changed, stale_files = share_recipe(recipe, get_or_create_tags(job['tags']), [user], recipes_dir())
+        else:
+            if not user.spoonacular_api_key:
+                logger.warning('Dropped deferred import of %s, user %s has no key', job['url'], job['user_id'])
+                return None
+            recipe_data = fetch_recipe_data(job['url'], decrypt_value(user.spoonacular_api_key))
+            fields = build_recipe_fields(recipe_data, job['url'])
+            fields['tags'] = get_or_create_tags(job['tags'])
+            fields['users'] = [user]
+            fields['extraction_source'] = EXTRACTED_SPOONACULAR
+            recipe, changed, stale_files = save_recipe(fields, recipe_data, recipes_dir(), existing)
+    after_recipe_saved(recipe, changed, stale_files)
+    return recipe.id
+
+
+@celery.task
+def replay_deferred_imports():
+    """Replay the deferred imports that are due, parking them again while their key is still out of quota"""
+    lock = redis_client.lock('replay_deferred_imports', timeout=60 * 60)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        replayed = 0
+        due = redis_client.zrangebyscore(DEFERRED_IMPORTS_KEY, '-inf', time.time(), start=0, num=DEFERRED_REPLAY_BATCH)
+        for raw_job in due:
+            job = json.loads(raw_job)
+            try:
+                if replay_import(job):
+                    replayed += 1
+            except (SpoonacularQuotaError, SpoonacularRateLimitError) as e:
+                redis_client.zadd(DEFERRED_IMPORTS_KEY, {raw_job: e.retry_at or time.time() + SPOONACULAR_RATE_LIMIT_BACKOFF})
+                continue
+            except LockError:
+                # A user import of the page is running, it decides whether this one is still needed
+                redis_client.zadd(DEFERRED_IMPORTS_KEY, {raw_job: time.time() + SPOONACULAR_RATE_LIMIT_BACKOFF})
+                continue
+            except SpoonacularUnauthorizedError:
+                logger.warning('Dropped deferred import of %s, key of user %s was rejected', job['url'], job['user_id'])
+            except Exception:  # pylint: disable=broad-exception-caught
+                db.session.rollback()
+                logger.error('Deferred import of %s failed', job['url'], exc_info=True)
+            redis_client.zrem(DEFERRED_IMPORTS_KEY, raw_job)
+        return replayed
+    finally:
+        lock.release()
+
+
+celery.conf.beat_schedule['replay-deferred-imports'] = {
+    'task': replay_deferred_imports.name,
+    'schedule': DEFERRED_REPLAY_INTERVAL,
+}
@@ -1,7 +1,66 @@
+from app.utils.recipe.autocomplete import (AUTOCOMPLETE_KINDS,
+                                           AUTOCOMPLETE_MAX_LIMIT,
+                                           add_recipe_to_autocomplete,
+                                           add_user_to_autocomplete,
+                                           autocomplete,
+                                           invalidate_autocomplete,
+                                           remove_recipes_from_autocomplete)
+from app.utils.recipe.backup_store import (iter_backup, open_backup,
+                                           read_backup, recipe_backup,
+                                           write_backup)
+from app.utils.recipe.canonical_url import (backfill_canonical_urls,
+                                            canonical_url)
+from app.utils.recipe.changes import (RECIPE_DELETED, RECIPE_UPSERTED,
+                                      get_recipe_changes,
+                                      record_recipe_changes)
 from app.utils.recipe.check_url import check_url
-from app.utils.recipe.get_ingredients import get_ingredients
-from app.utils.recipe.get_instructions_equipment import \
-    get_instructions_equipment
+from app.utils.recipe.delete_recipes import (delete_recipes,
+                                             invalidate_deleted_recipes)
+from app.utils.recipe.export import gzip_chunks, iter_export
+from app.utils.recipe.extract_recipe import (EXTRACTED_MANUAL,
+                                             EXTRACTED_SCHEMA_ORG,
+                                             EXTRACTED_SPOONACULAR,
+                                             extract_recipe)
+from app.utils.recipe.get_ingredients import (get_ingredient_names,
+                                              get_ingredients)
+from app.utils.recipe.get_instructions_equipment import (
+    get_instructions_equipment, normalize_equipment)
 from app.utils.recipe.get_nutrients import get_nutrients
-from app.utils.recipe.get_prep_cook_time import get_prep_cook_time
-from app.utils.recipe.get_recipe_data import get_recipe_data
+from app.utils.recipe.get_prep_cook_time import (get_prep_cook_time,
+                                                 parse_minutes)
+from app.utils.recipe.get_recipe_data import (get_recipe_data, parse_quota,
+                                              raise_for_code,
+                                              request_recipe_data)
+from app.utils.recipe.import_recipe import (find_recipe_by_url, save_recipe,
+                                           share_recipe)
+from app.utils.recipe.ingredient_items import (build_recipe_ingredients,
+                                               get_scaled_ingredients)
+from app.utils.recipe.nutrient_values import build_nutrient_values
+from app.utils.recipe.nutrient_vectors import (aggregate_meal_plan,
+                                               invalidate_nutrient_vectors)
+from app.utils.recipe.ownership import owns_recipe
+from app.utils.recipe.pantry_index import (add_to_pantry_index,
+                                           find_recipes_by_pantry,
+                                           invalidate_pantry_index,
+                                           remove_from_pantry_index)
+from app.utils.recipe.progress import (upsert_recipe_progress,
+                                       validate_progress_changes)
+from app.utils.recipe.recipe_data import (build_recipe_fields,
+                                          calculate_calories,
+                                          create_recipe_data)
+from app.utils.recipe.recipe_images import (IMAGE_DIGEST, IMAGE_VARIANT,
+                                            backfill_recipe_images, image_dir,
+                                            process_recipe_image)
+from app.utils.recipe.recipe_filters import (apply_containment_filters,
+                                             apply_keyset,
+                                             apply_range_filters, apply_sort,
+                                             encode_cursor,
+                                             parse_range_filters)
+from app.utils.recipe.shopping_list import (build_shopping_list,
+                                            invalidate_shopping_lists)
+from app.utils.recipe.similar_recipes import (get_similar_recipes,
+                                              mark_similar_recipes_stale,
+                                              refresh_similar_recipes)
+from app.utils.recipe.tags import (get_or_create_tags, normalize_tag_name,
+                                   update_tag_counts)
+from app.utils.recipe.user_counts import update_user_recipe_counts
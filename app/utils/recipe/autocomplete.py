@@ -0,0 +1,260 @@
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.extensions import cache, db
+from app.models import Recipe, Tag, User
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_GENERATION_KEY = 'autocomplete_generation'
+
+AUTOCOMPLETE_KINDS = ('recipes', 'tags', 'users')
+
+# Suggestions kept per prefix, the most a query can ask for
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+# Prefixes matching more keys than this keep their suggestions precomputed instead of ranked per query
+SCAN_LIMIT = 256
+
+WORD = re.compile(r'\w+')
+
+
+def fold(text: str) -> str:
+    """Case and accent insensitive form of a name or query, 'Crème Brûlée' -> 'creme brulee'."""
+    text = str(text or '')
+    if text.isascii():
+        return ' '.join(text.lower().split())
+    text = unicodedata.normalize('NFKD', text).casefold()
+    return ' '.join(''.join(char for char in text if not unicodedata.combining(char)).split())
+
+
+def word_keys(folded: str) -> List[str]:
+    """Keys a folded name is found by, one from the start of each word so 'chi' finds 'spicy chili'."""
+    return list(dict.fromkeys(folded[match.start():] for match in WORD.finditer(folded)))
+
+
+class PrefixIndex:
+    """
+    Sorted (key, id) pairs of one kind of name, searched by bisect.
+
+    A prefix matching at most SCAN_LIMIT keys is ranked from its range on
+    each query. Broader prefixes, down to the single letters, keep their
+    top suggestions precomputed, so no query scans more than that.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[int, str, int]] = ()):
+        self.labels: Dict[int, str] = {}
+        self.ranks: Dict[int, tuple] = {}
+        self.keys: List[Tuple[str, int]] = []
+        self.ranked: Dict[str, List[int]] = {}
+        for entry_id, label, weight in entries:
+            self.set_label(entry_id, label, weight)
+            self.keys += [(key, entry_id) for key in word_keys(self.ranks[entry_id][2])]
+        self.keys.sort()
+        self.rank_range(0, len(self.keys), '')
+
+    def rank_range(self, low: int, high: int, prefix: str, reuse: bool = False) -> List[int]:
+        """
+        Top suggestions of the keys in [low, high), which all start with prefix.
+
+        A range too large to scan is split by the character after the prefix
+        and ranked from the top suggestions of its parts, so every key is
+        only looked at once. With reuse, parts already ranked aren't ranked again.
+        """
+        if high - low <= SCAN_LIMIT:
+            return self.top({entry_id for _, entry_id in self.keys[low:high]})
+        # Keys that are the prefix itself sort first
+        end = bisect_left(self.keys, (prefix + '\0',), low, high)
+        candidates = {entry_id for _, entry_id in self.keys[low:end]}
+        low = end
+        while low < high:
+            longer = self.keys[low][0][:len(prefix) + 1]
+            end = bisect_left(self.keys, (longer[:-1] + chr(ord(longer[-1]) + 1),), low, high)
+            if reuse and longer in self.ranked:
+                candidates.update(self.ranked[longer])
+            else:
+                candidates.update(self.rank_range(low, end, longer))
+            low = end
+        ranked = self.top(candidates)
+        if prefix:
+            self.ranked[prefix] = ranked
+        return ranked
+
+    def rerank(self, prefix: str) -> None:
+        low = bisect_left(self.keys, (prefix,))
+        high = bisect_left(self.keys, (prefix[:-1] + chr(ord(prefix[-1]) + 1),), low)
+        self.ranked[prefix] = self.rank_range(low, high, prefix, reuse=True)
+
+    def set_label(self, entry_id: int, label: str, weight: int) -> None:
+        self.labels[entry_id] = label
+        # Most used first, then shortest, so an exact name comes before longer ones it starts
+        self.ranks[entry_id] = (-weight, len(label), fold(label), entry_id)
+
+    def top(self, ids: Iterable[int], limit: int = AUTOCOMPLETE_MAX_LIMIT) -> List[int]:
+        return heapq.nsmallest(limit, ids, key=self.ranks.__getitem__)
+
+    def matching(self, prefix: str) -> set:
+        ids = set()
+        for position in range(bisect_left(self.keys, (prefix,)), len(self.keys)):
+            key, entry_id = self.keys[position]
+            if not key.startswith(prefix):
+                break
+            ids.add(entry_id)
+        return ids
+
+    def search(self, prefix: str, limit: int) -> List[Tuple[int, str]]:
+        if prefix in self.ranked:
+            ids = self.ranked[prefix][:limit]
+        else:
+            ids = self.top(self.matching(prefix), limit)
+        return [(entry_id, self.labels[entry_id]) for entry_id in ids]
+
+    def add(self, entry_id: int, label: str, weight: int) -> None:
+        self.remove([entry_id])
+        self.set_label(entry_id, label, weight)
+        for key in word_keys(self.ranks[entry_id][2]):
+            insort(self.keys, (key, entry_id))
+            for length in range(1, len(key) + 1):
+                ranked = self.ranked.get(key[:length])
+                if ranked is not None and entry_id not in ranked:
+                    self.ranked[key[:length]] = self.top([*ranked, entry_id])
+
+    def remove(self, entry_ids: Iterable[int]) -> None:
+        refill = set()
+        for entry_id in entry_ids:
+            if entry_id not in self.labels:
+                continue
+            for key in word_keys(self.ranks[entry_id][2]):
+                position = bisect_left(self.keys, (key, entry_id))
+                if position < len(self.keys) and self.keys[position] == (key, entry_id):
+                    del self.keys[position]
+                for length in range(1, len(key) + 1):
+                    if entry_id in self.ranked.get(key[:length], []):
+                        self.ranked[key[:length]].remove(entry_id)
+                        refill.add(key[:length])
+            del self.labels[entry_id], self.ranks[entry_id]
+        # Longer prefixes first, shorter ones are ranked from them
+        for prefix in sorted(refill, key=len, reverse=True):
+            self.rerank(prefix)
+
+
+class AutocompleteIndex:
+    """
+    Prefix indexes of recipe names, tag names and usernames.
+
+    Each worker holds its own copy and answers from memory. Like the pantry
+    index, writes bump a shared generation counter in the cache; a worker
+    that sees a generation it didn't produce rebuilds from the database.
+    Tags and users are ranked by their recipe counts as of the last
+    rebuild, recipes by name length.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = None
+        self.indexes: Dict[str, PrefixIndex] = {kind: PrefixIndex() for kind in AUTOCOMPLETE_KINDS}
+
+    def rebuild(self, generation: int) -> None:
+        self.indexes = {
+            'recipes': PrefixIndex(
+                (recipe_id, name, 0)
+                for recipe_id, name in db.session.query(Recipe.id, Recipe.name).filter(Recipe.name.isnot(None))
+            ),
+            'tags': PrefixIndex(db.session.query(Tag.id, Tag.name, Tag.recipe_count).filter(Tag.recipe_count > 0)),
+            'users': PrefixIndex(
+                (user_id, username, recipe_count or 0)
+                for user_id, username, recipe_count in db.session.query(User.id, User.username, User.recipe_count)
+                if username
+            ),
+        }
+        self.generation = generation
+        logger.info(
+            'Built autocomplete index of %s',
+            ', '.join(f'{len(index.labels)} {kind}' for kind, index in self.indexes.items())
+        )
+
+    def refresh(self) -> None:
+        """Rebuild when another worker changed the index since it was built here."""
+        generation = cache.get(AUTOCOMPLETE_GENERATION_KEY) or 0
+        if generation != self.generation:
+            with self.lock:
+                if generation != self.generation:
+                    self.rebuild(generation)
+
+    def apply(self, update) -> None:
+        """Apply an incremental update locally and publish a new generation, see PantryIndex.apply()."""
+        generation = cache.cache.inc(AUTOCOMPLETE_GENERATION_KEY) or 0
+        with self.lock:
+            if self.generation is not None and generation == self.generation + 1:
+                update()
+                self.generation = generation
+            else:
+                self.generation = None
+
+    def add(self, kind: str, entries: Iterable[Tuple[int, str, int]]) -> None:
+        entries = [(entry_id, label, weight) for entry_id, label, weight in entries if label]
+
+        def update():
+            for entry_id, label, weight in entries:
+                self.indexes[kind].add(entry_id, label, weight)
+
+        if entries:
+            self.apply(update)
+
+    def remove(self, kind: str, entry_ids: Iterable[int]) -> None:
+        entry_ids = list(entry_ids)
+        if entry_ids:
+            self.apply(lambda: self.indexes[kind].remove(entry_ids))
+
+    def search(self, query: str, kinds: Iterable[str], limit: int) -> Dict[str, List[Dict]]:
+        self.refresh()
+        prefix = fold(query)
+        with self.lock:
+            return {
+                kind: [{'id': entry_id, 'name': label} for entry_id, label in self.indexes[kind].search(prefix, limit)]
+                if prefix else []
+                for kind in kinds
+            }
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+def add_recipe_to_autocomplete(recipe: Recipe) -> None:
+    """Index a recipe's name and tags once it is committed."""
+    autocomplete_index.add('recipes', [(recipe.id, recipe.name, 0)])
+    autocomplete_index.add('tags', [(tag.id, tag.name, tag.recipe_count) for tag in recipe.tags])
+
+
+def remove_recipes_from_autocomplete(recipe_ids: Iterable[int]) -> None:
+    autocomplete_index.remove('recipes', recipe_ids)
+
+
+def add_user_to_autocomplete(user: User) -> None:
+    autocomplete_index.add('users', [(user.id, user.username, user.recipe_count or 0)])
+
+
+def invalidate_autocomplete() -> None:
+    """Make every worker rebuild its index, e.g. after bulk changes to names or counts."""
+    cache.cache.inc(AUTOCOMPLETE_GENERATION_KEY)
+
+
+def autocomplete(query: str, kinds: Optional[Iterable[str]] = None, limit: int = 10) -> Dict[str, List[Dict]]:
+    """
+    Names starting with the query, or with a word starting it.
+
+    Args:
+        query: What was typed so far, matched ignoring case and accents
+        kinds: Any of AUTOCOMPLETE_KINDS, all by default
+        limit: Suggestions per kind, at most AUTOCOMPLETE_MAX_LIMIT
+
+    Returns:
+        dict: Lists of {'id', 'name'} by kind, best first
+    """
+    kinds = list(kinds) if kinds is not None else list(AUTOCOMPLETE_KINDS)
+    return autocomplete_index.search(query, kinds, min(limit, AUTOCOMPLETE_MAX_LIMIT))
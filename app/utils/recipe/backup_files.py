@@ -0,0 +1,105 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from app.extensions import db
+from app.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Files younger than this are left alone, their recipe may not be committed yet
+BACKUP_GRACE_SECONDS = 60 * 60
+
+
+def scan_directory(directory: str) -> Tuple[Dict[str, float], List[str]]:
+    """Files directly in a directory with their modification times, and its subdirectories."""
+    files, subdirectories = {}, []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                files[os.path.normpath(entry.path)] = entry.stat().st_mtime
+    return files, subdirectories
+
+
+def scan_backup_files(recipes_dir: Path, workers: int = 8) -> Dict[str, float]:
+    """
+    Every file under the backup directory with its modification time.
+
+    Directories are listed breadth first, one level at a time fanned out
+    over a thread pool, since the scan is bound by filesystem latency.
+    """
+    files: Dict[str, float] = {}
+    level = [str(recipes_dir)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while level:
+            next_level = []
+            for directory_files, subdirectories in executor.map(scan_directory, level):
+                files.update(directory_files)
+                next_level += subdirectories
+            level = next_level
+    return files
+
+
+def referenced_backup_files(paths: Iterable[str] = None) -> set:
+    """Normalized backup file paths recipes still point at, optionally only among the given paths."""
+    query = db.session.query(Recipe.backup_file).filter(Recipe.backup_file.isnot(None))
+    if paths is not None:
+        query = query.filter(Recipe.backup_file.in_(list(paths)))
+    return {os.path.normpath(backup_file) for backup_file, in query}
+
+
+def delete_backup_files(paths: Iterable[str], recipes_dir: Path, grace_seconds: int = BACKUP_GRACE_SECONDS) -> int:
+    """
+    Remove backup files of deleted recipes.
+
+    References are checked when this runs, not when the files were
+    queued. Paths outside the backup directory, paths a recipe points at
+    and files written or reused within the grace period, whose recipe may
+    not be committed yet, are skipped, so a stale or repeated request
+    can't remove live data. The reconcile sweep collects skipped orphans.
+
+    Returns:
+        int: Number of files removed
+    """
+    root = os.path.normpath(recipes_dir) + os.sep
+    paths = [os.path.normpath(path) for path in paths if path]
+    paths = [path for path in paths if path.startswith(root)]
+    referenced = referenced_backup_files(paths) if paths else set()
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for path in paths:
+        if path in referenced:
+            continue
+        try:
+            if os.stat(path).st_mtime >= cutoff:
+                continue
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def reconcile_backup_files(recipes_dir: Path, grace_seconds: int = BACKUP_GRACE_SECONDS, workers: int = 8) -> Tuple[int, int]:
+    """
+    Remove backup files no recipe points at and count recipes whose file is gone.
+
+    Returns:
+        tuple: Number of orphaned files removed and number of missing files
+    """
+    files = scan_backup_files(recipes_dir, workers)
+    referenced = referenced_backup_files()
+    cutoff = time.time() - grace_seconds
+
+    orphaned = [path for path, modified in files.items() if path not in referenced and modified < cutoff]
+    for path in orphaned:
+        Path(path).unlink(missing_ok=True)
+
+    missing = len(referenced - files.keys())
+    logger.info('Removed %s orphaned backup files, %s recipes are missing theirs', len(orphaned), missing)
+    return len(orphaned), missing
@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import IO, Dict, Iterator, List
+
+from app.extensions import db
+from app.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+BACKUP_SUFFIX = '.json.gz'
+
+# Backups before this were the normalized recipe fields instead of the raw payload
+BACKUP_FORMAT = 2
+
+
+def backup_path(recipes_dir: Path, digest: str) -> Path:
+    """Where a backup with this SHA-256 lives, sharded two levels deep by hash prefix."""
+    return Path(recipes_dir) / digest[:2] / digest[2:4] / f'{digest}{BACKUP_SUFFIX}'
+
+
+def recipe_backup(source_data: Dict, recipe_url: str, tags: List[str], user_ids: List[int], extraction_source: str) -> Dict:
+    """
+    Backup payload of a recipe: the raw import data with what add() was told around it.
+
+    Keeping the raw data means a restore runs it through the same
+    normalization as an import and picks up fixes made since.
+    """
+    return {
+        'format': BACKUP_FORMAT,
+        'url': recipe_url,
+        'extraction_source': extraction_source,
+        'source_data': source_data,
+        'tags': tags,
+        'users': user_ids,
+    }
+
+
+def write_backup(recipes_dir: Path, data: Dict) -> Path:
+    """
+    Store a recipe backup, compressed and named after the hash of its content.
+
+    Identical payloads map to the same file, which is then only written
+    once and gets its modification time refreshed when it's reused. New files are written to a temporary file in the same directory
+    and renamed into place, so readers never see a partial backup.
+
+    Returns:
+        Path: Location of the backup
+    """
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    path = backup_path(recipes_dir, hashlib.sha256(payload).hexdigest())
+    if path.exists():
+        # Touched so the sweeps' grace period covers the row about to point at it
+        os.utime(path)
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(descriptor, 'wb') as temp_file:
+            temp_file.write(gzip.compress(payload, mtime=0))
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def open_backup(path) -> IO[str]:
+    """Open a backup for streaming text reads, whether compressed or an old plain JSON file."""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def read_backup(path) -> Dict:
+    with open_backup(path) as backup:
+        return json.load(backup)
+
+
+def iter_backup(path, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Decompressed bytes of a backup in chunks, e.g. for a streamed response."""
+    opener = gzip.open if str(path).endswith('.gz') else io.open
+    with opener(path, 'rb') as backup:
+        while chunk := backup.read(chunk_size):
+            yield chunk
+
+
+def migrate_backup_files(recipes_dir: Path, batch_size: int = 500) -> int:
+    """
+    Move backups written as plain JSON with random names into the content addressed store.
+
+    Each batch is committed before its old files are removed, so an
+    interrupted run leaves at worst an orphan for the reconcile sweep.
+    New files keep the old modification time, which backfilled dates
+    added are read from.
+
+    Returns:
+        int: Number of recipes whose backup was migrated
+    """
+    legacy = (
+        db.session.query(Recipe)
+        .filter(Recipe.backup_file.isnot(None), Recipe.backup_file.notlike(f'%{BACKUP_SUFFIX}'))
+        .order_by(Recipe.id)
+    )
+
+    migrated = 0
+    last_id = 0
+    while True:
+        recipes = legacy.filter(Recipe.id > last_id).limit(batch_size).all()
+        if not recipes:
+            break
+        old_files = []
+        for recipe in recipes:
+            old_file = Path(recipe.backup_file)
+            try:
+                data = read_backup(old_file)
+                modified = old_file.stat().st_mtime
+            except (OSError, ValueError) as e:
+                logger.warning('Skipped backup of recipe %s: %s', recipe.id, e)
+                continue
+            new_file = write_backup(recipes_dir, data)
+            if new_file.stat().st_mtime > modified:
+                os.utime(new_file, (modified, modified))
+            recipe.backup_file = str(new_file)
+            old_files.append(old_file)
+        db.session.commit()
+        for old_file in old_files:
+            old_file.unlink(missing_ok=True)
+        last_id = recipes[-1].id
+        migrated += len(old_files)
+        logger.info('Migrated %s recipe backups', migrated)
+    return migrated
@@ -0,0 +1,79 @@
+import logging
+import re
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from app.extensions import db
+from app.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track where a visit came from
+TRACKING_PARAMS = {'fbclid', 'gclid', 'igshid', 'mc_cid', 'mc_eid', 'yclid', '_ga'}
+
+
+def canonical_url(recipe_url: Optional[str]) -> Optional[str]:
+    """
+    Key identifying a recipe page however its URL was written.
+
+    Scheme, 'www.', default ports, fragment, trailing slashes, tracking
+    parameters and the order of the remaining parameters are dropped, so
+    'https://www.ex.com/chili/?utm_source=x' and 'http://ex.com/chili'
+    both become 'ex.com/chili'. Manual recipes have none.
+    """
+    if not recipe_url or recipe_url == 'self':
+        return None
+    recipe_url = recipe_url.strip()
+    parts = urlsplit(recipe_url if '://' in recipe_url else f'//{recipe_url}')
+    host = (parts.hostname or '').lower().removeprefix('www.')
+    if parts.port and parts.port not in (80, 443):
+        host = f'{host}:{parts.port}'
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/')
+    query = urlencode(sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith('utm_')
+    ))
+    return f'{host}{path}?{query}' if query else f'{host}{path}'
+
+
+def backfill_canonical_urls(batch_size: int = 500) -> Tuple[int, int]:
+    """
+    Fill the canonical URL of recipes stored before it existed.
+
+    When several recipes share a canonical URL, the oldest keeps it and the
+    others are left without one, so the unique index holds. Those are
+    duplicates from before imports were deduplicated and are logged.
+
+    Returns:
+        tuple: Number of recipes backfilled and of duplicates left without a canonical URL
+    """
+    missing = (
+        db.session.query(Recipe)
+        .filter(Recipe.canonical_url.is_(None), Recipe.url.isnot(None), Recipe.url != 'self')
+        .order_by(Recipe.id)
+    )
+
+    backfilled = duplicates = 0
+    last_id = 0
+    while True:
+        recipes = missing.filter(Recipe.id > last_id).limit(batch_size).all()
+        if not recipes:
+            break
+        keys = {recipe.id: canonical_url(recipe.url) for recipe in recipes}
+        taken = {
+            key for key, in
+            db.session.query(Recipe.canonical_url).filter(Recipe.canonical_url.in_(set(keys.values())))
+        }
+        for recipe in recipes:
+            if keys[recipe.id] in taken:
+                duplicates += 1
+                logger.warning('Recipe %s duplicates the canonical URL %s', recipe.id, keys[recipe.id])
+                continue
+            recipe.canonical_url = keys[recipe.id]
+            taken.add(keys[recipe.id])
+            backfilled += 1
+        db.session.commit()
+        last_id = recipes[-1].id
+        logger.info('Backfilled canonical URLs for %s recipes', backfilled)
+    return backfilled, duplicates
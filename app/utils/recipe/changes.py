@@ -0,0 +1,94 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import selectinload
+
+from app.extensions import db
+from app.models import Recipe, RecipeChange
+from app.utils.recipe.export import export_record
+
+RECIPE_UPSERTED = 'upsert'
+RECIPE_DELETED = 'delete'
+
+# Advisory lock serializing change feed writers until they commit
+CHANGE_FEED_LOCK_ID = 7_044_001
+
+
+def record_recipe_changes(recipe_ids: Iterable[int], action: str) -> None:
+    """
+    Append recipes to the change feed as part of the caller's transaction.
+
+    Writers hold a transaction level advisory lock until they commit, so
+    change ids become visible strictly in order and a reader paging by
+    id can never skip one that commits late.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    db.session.execute(select(func.pg_advisory_xact_lock(CHANGE_FEED_LOCK_ID)))
+    db.session.execute(insert(RecipeChange), [
+        {'recipe_id': recipe_id, 'action': action} for recipe_id in recipe_ids
+    ])
+
+
+def get_recipe_changes(since: int = 0, limit: int = 500) -> Dict:
+    """
+    Changes after a cursor, compacted to the latest state of each recipe.
+
+    Upserted recipes come with their full record, deleted ones as
+    tombstones, so a mirror can apply a batch without further requests.
+
+    Returns:
+        dict: 'changes', the 'next_cursor' to pass as since and whether more follow
+    """
+    rows = (
+        db.session.query(RecipeChange.id, RecipeChange.recipe_id, RecipeChange.action)
+        .filter(RecipeChange.id > since)
+        .order_by(RecipeChange.id)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Only the last change of a recipe in the batch matters
+    latest = {recipe_id: (change_id, action) for change_id, recipe_id, action in rows}
+    upserted = [recipe_id for recipe_id, (_, action) in latest.items() if action == RECIPE_UPSERTED]
+    recipes = {
+        recipe.id: recipe
+        for recipe in db.session.query(Recipe).options(selectinload(Recipe.tags)).filter(Recipe.id.in_(upserted))
+    } if upserted else {}
+
+    changes = []
+    for recipe_id, (change_id, action) in sorted(latest.items(), key=lambda item: item[1][0]):
+        if action == RECIPE_UPSERTED and recipe_id in recipes:
+            changes.append({'cursor': change_id, 'id': recipe_id, 'recipe': export_record(recipes[recipe_id])})
+        else:
+            # Deleted, or upserted and deleted since, which a later change records too
+            changes.append({'cursor': change_id, 'id': recipe_id, 'deleted': True})
+
+    return {
+        'changes': changes,
+        'next_cursor': rows[-1].id if rows else since,
+        'has_more': has_more,
+    }
+
+
+def seed_recipe_changes() -> int:
+    """
+    Add an upsert for every recipe without any change yet, e.g. those stored before the feed existed.
+
+    Returns:
+        int: Number of recipes added to the feed
+    """
+    db.session.execute(select(func.pg_advisory_xact_lock(CHANGE_FEED_LOCK_ID)))
+    seeded = db.session.execute(
+        insert(RecipeChange).from_select(
+            ['recipe_id', 'action', 'changed_at'],
+            select(Recipe.id, db.literal(RECIPE_UPSERTED), func.coalesce(Recipe.updated_at, Recipe.created_at, func.now()))
+            .where(~select(RecipeChange.id).where(RecipeChange.recipe_id == Recipe.id).exists())
+            .order_by(Recipe.id)
+        )
+    ).rowcount
+    db.session.commit()
+    return seeded
@@ -14,4 +14,5 @@ def check_url(recipe_url):
     if 'cf-mitigated' in article_headers:
         # Currently no way around cloudflare
         return {'status': False, 'reason': [f'Cloudflare protection detected on recipe URL {recipe_url}']}
-    return {'status': True}
+    # Keep the page so recipes can be extracted from it without fetching it again
+    return {'status': True, 'html': article_response.text if 'html' in article_headers.get('Content-Type', '') else None}
@@ -0,0 +1,144 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Spellings seen in Spoonacular extracts and manual input -> canonical unit
+UNIT_ALIASES = {
+    'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tsp': 'tsp', 'tsps': 'tsp', 'tsp.': 'tsp', 't': 'tsp',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbsp': 'tbsp', 'tbsps': 'tbsp', 'tbsp.': 'tbsp', 'tbs': 'tbsp', 'tbl': 'tbsp', 'T': 'tbsp',
+    'cup': 'cup', 'cups': 'cup', 'c': 'cup', 'c.': 'cup',
+    'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz', 'fl oz': 'fl oz', 'fl. oz.': 'fl oz', 'fl. oz': 'fl oz',
+    'pint': 'pint', 'pints': 'pint', 'pt': 'pint',
+    'quart': 'quart', 'quarts': 'quart', 'qt': 'quart',
+    'gallon': 'gallon', 'gallons': 'gallon', 'gal': 'gallon',
+    'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml', 'ml': 'ml', 'mls': 'ml',
+    'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l', 'l': 'l',
+    'gram': 'g', 'grams': 'g', 'g': 'g', 'gr': 'g',
+    'kilogram': 'kg', 'kilograms': 'kg', 'kg': 'kg', 'kgs': 'kg',
+    'ounce': 'oz', 'ounces': 'oz', 'oz': 'oz', 'oz.': 'oz',
+    'pound': 'lb', 'pounds': 'lb', 'lb': 'lb', 'lbs': 'lb', 'lb.': 'lb', 'lbs.': 'lb',
+    'pinch': 'pinch', 'pinches': 'pinch',
+    'dash': 'dash', 'dashes': 'dash',
+    'clove': 'clove', 'cloves': 'clove',
+    'can': 'can', 'cans': 'can',
+    'package': 'package', 'packages': 'package', 'pkg': 'package',
+    'slice': 'slice', 'slices': 'slice',
+    'stick': 'stick', 'sticks': 'stick',
+    'serving': 'serving', 'servings': 'serving',
+}
+
+VOLUME = 1
+WEIGHT = 2
+
+# Canonical unit -> (dimension, factor to the base unit of the dimension: ml or g)
+UNIT_CONVERSIONS = {
+    'tsp': (VOLUME, 4.92892),
+    'tbsp': (VOLUME, 14.7868),
+    'fl oz': (VOLUME, 29.5735),
+    'cup': (VOLUME, 236.588),
+    'pint': (VOLUME, 473.176),
+    'quart': (VOLUME, 946.353),
+    'gallon': (VOLUME, 3785.41),
+    'ml': (VOLUME, 1.0),
+    'l': (VOLUME, 1000.0),
+    'g': (WEIGHT, 1.0),
+    'kg': (WEIGHT, 1000.0),
+    'oz': (WEIGHT, 28.3495),
+    'lb': (WEIGHT, 453.592),
+}
+
+# Precomputed lookup arrays indexed by unit code. Code 0 is every unit
+# (or missing unit) that can't be converted.
+UNIT_CODES = {unit: code for code, unit in enumerate(UNIT_CONVERSIONS, start=1)}
+UNIT_NAMES = np.array([''] + list(UNIT_CONVERSIONS), dtype=object)
+UNIT_DIMENSIONS = np.array([0] + [dimension for dimension, _ in UNIT_CONVERSIONS.values()])
+UNIT_FACTORS = np.array([1.0] + [factor for _, factor in UNIT_CONVERSIONS.values()])
+
+# Target units per measurement system and dimension, as (minimum base amount, unit)
+# from largest to smallest; the first unit the amount reaches is used.
+TARGET_UNITS = {
+    'metric': {
+        VOLUME: ((1000.0, 'l'), (0.0, 'ml')),
+        WEIGHT: ((1000.0, 'kg'), (0.0, 'g')),
+    },
+    'us': {
+        VOLUME: ((236.588 / 4, 'cup'), (14.7868, 'tbsp'), (0.0, 'tsp')),
+        WEIGHT: ((453.592, 'lb'), (0.0, 'oz')),
+    },
+}
+
+
+def canonical_unit(unit: Optional[str]) -> Optional[str]:
+    """Map a unit spelling to its canonical form, keeping unknown units as given."""
+    if not unit:
+        return None
+    unit = unit.strip()
+    return UNIT_ALIASES.get(unit, UNIT_ALIASES.get(unit.lower(), unit.lower()))
+
+
+def format_amount(amount: Optional[float]) -> str:
+    if amount is None:
+        return ''
+    return f'{amount:.2f}'.rstrip('0').rstrip('.')
+
+
+def choose_target_units(base_amounts: np.ndarray, dimensions: np.ndarray, system: str) -> np.ndarray:
+    """Pick the unit code each base amount converts to for a measurement system."""
+    targets = np.zeros(len(base_amounts), dtype=np.int64)
+    for dimension, choices in TARGET_UNITS[system].items():
+        conditions = [(dimensions == dimension) & (base_amounts >= minimum) for minimum, _ in choices]
+        codes = [UNIT_CODES[unit] for _, unit in choices]
+        targets = np.select(conditions, codes, default=targets)
+    return targets
+
+
+def scale_ingredients(recipes: List[Dict], system: Optional[str] = None) -> List[List[Dict]]:
+    """
+    Scale and optionally convert the ingredients of many recipes in one pass.
+
+    Every ingredient of every recipe is flattened into amount and unit code
+    arrays, so scaling, conversion to base units and choosing the target
+    unit are each a single vectorized operation over the whole batch.
+
+    Args:
+        recipes: Dicts with 'ingredients' (amount, unit, name dicts) and a 'factor'
+        system: 'metric', 'us' or None to keep the original units
+
+    Returns:
+        list: Per recipe, the scaled ingredient dicts with display 'text'
+    """
+    if system is not None and system not in TARGET_UNITS:
+        raise ValueError(f'Unknown unit system {system}')
+
+    items = [ingredient for recipe in recipes for ingredient in recipe['ingredients']]
+    counts = [len(recipe['ingredients']) for recipe in recipes]
+    factors = np.repeat(np.array([float(recipe['factor']) for recipe in recipes]), counts)
+
+    has_amount = np.array([item.get('amount') is not None for item in items], dtype=bool)
+    amounts = np.array([item['amount'] if item.get('amount') is not None else 0.0 for item in items], dtype=float)
+    codes = np.array([UNIT_CODES.get(canonical_unit(item.get('unit')), 0) for item in items], dtype=np.int64)
+
+    amounts = amounts * factors
+    converted = np.zeros(len(items), dtype=bool)
+    if system is not None and items:
+        base_amounts = amounts * UNIT_FACTORS[codes]
+        targets = choose_target_units(base_amounts, UNIT_DIMENSIONS[codes], system)
+        converted = (codes > 0) & has_amount
+        amounts = np.where(converted, base_amounts / UNIT_FACTORS[targets], amounts)
+        codes = np.where(converted, targets, codes)
+
+    scaled = []
+    for index, item in enumerate(items):
+        unit = UNIT_NAMES[codes[index]] if converted[index] else item.get('unit')
+        amount = float(amounts[index]) if has_amount[index] else None
+        text = item.get('original') if amount is None else ' '.join(
+            part for part in (format_amount(amount), unit, item['name']) if part
+        )
+        scaled.append({'amount': amount, 'unit': unit, 'name': item['name'], 'text': text})
+
+    results = []
+    start = 0
+    for count in counts:
+        results.append(scaled[start:start + count])
+        start += count
+    return results
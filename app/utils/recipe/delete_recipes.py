@@ -0,0 +1,76 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models import Recipe, recipe_tag, user_recipe
+from app.utils.recipe.autocomplete import remove_recipes_from_autocomplete
+from app.utils.recipe.changes import RECIPE_DELETED, record_recipe_changes
+from app.utils.recipe.nutrient_vectors import invalidate_nutrient_vectors
+from app.utils.recipe.pantry_index import remove_from_pantry_index
+from app.utils.recipe.shopping_list import invalidate_shopping_lists
+from app.utils.recipe.similar_recipes import mark_similar_recipes_stale
+from app.utils.recipe.tags import update_tag_counts
+from app.utils.recipe.user_counts import update_user_recipe_counts
+
+DELETE_BATCH_SIZE = 500
+
+
+def decrement_link_counts(table_column, recipe_ids: List[int], update_counts) -> None:
+    """Take the links deleted recipes had off cached counts, with one UPDATE per distinct number of links."""
+    ids_by_links: Dict[int, List[int]] = defaultdict(list)
+    links = (
+        db.session.query(table_column, func.count())  # pylint: disable=not-callable
+        .filter(table_column.table.c.recipe_id.in_(recipe_ids))
+        .group_by(table_column)
+    )
+    for linked_id, count in links:
+        ids_by_links[count].append(linked_id)
+    for count, linked_ids in ids_by_links.items():
+        update_counts(linked_ids, -count)
+
+
+def delete_recipes(recipe_ids: Iterable[int]) -> List[str]:
+    """
+    Delete recipes and their links with a few set based statements per batch.
+
+    Nutrient, ingredient, similarity and progress rows go with them through
+    their ON DELETE CASCADE keys, and each deleted recipe is recorded in the
+    change feed as a tombstone. Nothing is committed, so the caller can
+    make the delete part of a larger transaction, and nothing outside the
+    database is touched: remove the returned backup files and call
+    invalidate_deleted_recipes() once the transaction has committed.
+
+    Returns:
+        list: Backup file paths of the deleted recipes
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    backup_files = []
+    for start in range(0, len(recipe_ids), DELETE_BATCH_SIZE):
+        batch = recipe_ids[start:start + DELETE_BATCH_SIZE]
+        backup_files += [
+            backup_file for backup_file, in
+            db.session.query(Recipe.backup_file).filter(Recipe.id.in_(batch), Recipe.backup_file.isnot(None))
+        ]
+        decrement_link_counts(recipe_tag.c.tag_id, batch, update_tag_counts)
+        decrement_link_counts(user_recipe.c.user_id, batch, update_user_recipe_counts)
+        mark_similar_recipes_stale(batch)
+        db.session.execute(recipe_tag.delete().where(recipe_tag.c.recipe_id.in_(batch)))
+        db.session.execute(user_recipe.delete().where(user_recipe.c.recipe_id.in_(batch)))
+        deleted = db.session.execute(
+            Recipe.__table__.delete().where(Recipe.id.in_(batch)).returning(Recipe.id)
+        ).scalars().all()
+        record_recipe_changes(deleted, RECIPE_DELETED)
+    return backup_files
+
+
+def invalidate_deleted_recipes(recipe_ids: Iterable[int]) -> None:
+    """Drop deleted recipes from the caches and the in-memory indexes after their delete committed."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    invalidate_nutrient_vectors(recipe_ids)
+    invalidate_shopping_lists()
+    remove_from_pantry_index(recipe_ids)
+    remove_recipes_from_autocomplete(recipe_ids)
@@ -0,0 +1,66 @@
+import json
+import zlib
+from typing import Dict, Iterable, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.extensions import db
+from app.models import Recipe
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_record(recipe: Recipe) -> Dict:
+    return {
+        'id': recipe.id,
+        'url': recipe.url,
+        'name': recipe.name,
+        'source': recipe.source,
+        'extraction_source': recipe.extraction_source,
+        'servings': recipe.servings,
+        'prep_minutes': recipe.prep_minutes,
+        'cook_minutes': recipe.cook_minutes,
+        'total_minutes': recipe.total_minutes,
+        'date_added': recipe.created_at.isoformat() if recipe.created_at else None,
+        'date_updated': recipe.updated_at.isoformat() if recipe.updated_at else None,
+        'calories': recipe.calories,
+        'calories_unit': recipe.calories_unit,
+        'calories_total': recipe.calories_total,
+        'calories_serving': recipe.calories_serving,
+        'nutrients': recipe.nutrients,
+        'ingredients': recipe.ingredients,
+        'instructions': recipe.instructions,
+        'equipment': recipe.equipment,
+        'tags': [tag.name for tag in recipe.tags],
+    }
+
+
+def iter_export(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Every recipe as NDJSON, one chunk of lines per batch.
+
+    Rows come from a server side cursor batch_size at a time, tags are
+    loaded with one IN query per batch, and each batch is expunged once
+    written, so memory stays flat however large the archive is.
+    """
+    statement = (
+        select(Recipe)
+        .options(selectinload(Recipe.tags))
+        .order_by(Recipe.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for recipes in db.session.execute(statement).scalars().partitions():
+        yield ''.join(json.dumps(export_record(recipe)) + '\n' for recipe in recipes).encode('utf-8')
+        for recipe in recipes:
+            db.session.expunge(recipe)
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of chunks into one gzip stream, flushing after each chunk."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,308 @@
+import html
+import json
+import re
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from app.utils.recipe.parse_ingredient import (TO_TASTE_PATTERN,
+                                               parse_ingredient)
+
+# Recipe.extraction_source values
+EXTRACTED_SCHEMA_ORG = 'schema.org'
+EXTRACTED_SPOONACULAR = 'spoonacular'
+EXTRACTED_MANUAL = 'manual'
+
+# Elements that separate words in collected text
+BREAKING_ELEMENTS = {'br', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'ol', 'p', 'td', 'tr', 'ul'}
+
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# Attributes holding a microdata property value instead of the element text
+VALUE_ATTRIBUTES = ('content', 'datetime', 'href', 'src', 'value')
+
+ISO_DURATION = re.compile(
+    r'^P(?:(?P<days>\d+(?:\.\d+)?)D)?'
+    r'(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?(?:(?P<minutes>\d+(?:\.\d+)?)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$',
+    re.IGNORECASE
+)
+QUANTITY = re.compile(r'(?P<amount>\d+(?:[.,]\d+)?)\s*(?P<unit>[a-zA-Zµ]*)')
+
+# schema.org NutritionInformation property -> (nutrient name, unit, FDA daily value)
+NUTRITION_PROPERTIES = {
+    'calories': ('Calories', 'kcal', 2000),
+    'fatContent': ('Fat', 'g', 78),
+    'saturatedFatContent': ('Saturated Fat', 'g', 20),
+    'transFatContent': ('Trans Fat', 'g', None),
+    'carbohydrateContent': ('Carbohydrates', 'g', 275),
+    'sugarContent': ('Sugar', 'g', 50),
+    'fiberContent': ('Fiber', 'g', 28),
+    'proteinContent': ('Protein', 'g', 50),
+    'cholesterolContent': ('Cholesterol', 'mg', 300),
+    'sodiumContent': ('Sodium', 'mg', 2300),
+}
+
+MASS_UNITS = {'mg': 0.001, 'g': 1.0, 'kg': 1000.0}
+
+
+class SchemaParser(HTMLParser):
+    """Collects JSON-LD blocks and top level microdata items from a page in one pass."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.json_ld: List[str] = []
+        self.items: List[Dict] = []
+        self.script: Optional[List[str]] = None
+        # Open elements as (tag, item it opened, (item, property, text) it collects)
+        self.stack: List[tuple] = []
+        self.collecting: List[tuple] = []
+
+    def current_item(self) -> Optional[Dict]:
+        for _, item, _ in reversed(self.stack):
+            if item is not None:
+                return item
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in BREAKING_ELEMENTS:
+            self.handle_data(' ')
+        if tag == 'script' and (attrs.get('type') or '').lower() == 'application/ld+json':
+            self.script = []
+            return
+
+        parent = self.current_item()
+        properties = (attrs.get('itemprop') or '').split()
+        item = None
+        collector = None
+        if 'itemscope' in attrs:
+            item = {'@type': [kind.rstrip('/').rsplit('/', 1)[-1] for kind in (attrs.get('itemtype') or '').split()]}
+            if properties and parent is not None:
+                for name in properties:
+                    parent.setdefault(name, []).append(item)
+            else:
+                self.items.append(item)
+        elif properties and parent is not None:
+            value = next((attrs[name] for name in VALUE_ATTRIBUTES if attrs.get(name) is not None), None)
+            if value is not None or tag in VOID_ELEMENTS:
+                for name in properties:
+                    parent.setdefault(name, []).append(value or '')
+            else:
+                collector = (parent, properties, [])
+                self.collecting.append(collector)
+
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, item, collector))
+
+    def handle_endtag(self, tag):
+        if tag == 'script' and self.script is not None:
+            self.json_ld.append(''.join(self.script))
+            self.script = None
+            return
+        if not any(open_tag == tag for open_tag, _, _ in self.stack):
+            return
+        while self.stack:
+            open_tag, _, collector = self.stack.pop()
+            if collector is not None:
+                self.collecting.remove(collector)
+                parent, properties, text = collector
+                for name in properties:
+                    parent.setdefault(name, []).append(' '.join(''.join(text).split()))
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.script is not None:
+            self.script.append(data)
+            return
+        for _, _, text in self.collecting:
+            text.append(data)
+
+
+def iter_nodes(value) -> Iterator[Dict]:
+    """Every object in a JSON-LD document, including those inside @graph and nested properties."""
+    if isinstance(value, list):
+        for item in value:
+            yield from iter_nodes(item)
+    elif isinstance(value, dict):
+        yield value
+        for item in value.values():
+            if isinstance(item, (list, dict)):
+                yield from iter_nodes(item)
+
+
+def is_recipe(node: Dict) -> bool:
+    kinds = node.get('@type')
+    return 'Recipe' in (kinds if isinstance(kinds, list) else [kinds])
+
+
+def as_list(value) -> List:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def first(value):
+    values = as_list(value)
+    return values[0] if values else None
+
+
+def text_of(value) -> str:
+    """Plain text of a property that may be a string, a Thing with a name or text, or a list of those."""
+    value = first(value)
+    if isinstance(value, dict):
+        value = value.get('name') or value.get('text') or value.get('url') or ''
+    text = ' '.join(html.unescape(re.sub(r'<[^>]+>', ' ', str(value or ''))).split())
+    return re.sub(r'\s+([.,;:!?)])', r'\1', text)
+
+
+def parse_duration(value) -> Optional[int]:
+    """Minutes from an ISO 8601 duration such as 'PT1H30M'."""
+    match = ISO_DURATION.match(text_of(value))
+    if not match or not any(match.groupdict().values()):
+        return None
+    parts = {name: float(amount or 0) for name, amount in match.groupdict().items()}
+    return round(parts['days'] * 1440 + parts['hours'] * 60 + parts['minutes'] + parts['seconds'] / 60)
+
+
+def parse_servings(value) -> Optional[int]:
+    for candidate in as_list(value):
+        match = QUANTITY.search(text_of(candidate))
+        if match:
+            return max(int(float(match['amount'].replace(',', '.'))), 1)
+    return None
+
+
+def parse_nutrients(nutrition) -> List[Dict]:
+    """schema.org NutritionInformation as the nutrient list get_nutrients() reads."""
+    nutrition = first(nutrition)
+    if not isinstance(nutrition, dict):
+        return []
+    nutrients = []
+    for prop, (name, unit, daily_value) in NUTRITION_PROPERTIES.items():
+        match = QUANTITY.search(text_of(nutrition.get(prop)))
+        if not match:
+            continue
+        amount = float(match['amount'].replace(',', '.'))
+        found_unit = match['unit'].lower()
+        if found_unit in MASS_UNITS and unit in MASS_UNITS:
+            amount = amount * MASS_UNITS[found_unit] / MASS_UNITS[unit]
+        nutrients.append({
+            'name': name,
+            'amount': amount,
+            'unit': unit,
+            'percentOfDailyNeeds': amount / daily_value * 100 if daily_value else 0.0
+        })
+    return nutrients
+
+
+def parse_steps(instructions) -> List[str]:
+    """Step texts from a string, list of strings, HowToStep or HowToSection instructions."""
+    steps = []
+    for instruction in as_list(instructions):
+        if isinstance(instruction, dict):
+            if instruction.get('itemListElement'):
+                steps += parse_steps(instruction['itemListElement'])
+            else:
+                steps.append(text_of(instruction.get('text') or instruction.get('name')))
+        else:
+            lines = str(instruction).split('\n')
+            steps += [text_of(line) for line in lines]
+    return [step for step in steps if step]
+
+
+def schema_to_recipe_data(node: Dict, recipe_url: str) -> Dict:
+    """Map a schema.org Recipe onto the Spoonacular payload shape create_recipe_data() reads."""
+    ingredients = [text_of(line) for line in as_list(node.get('recipeIngredient') or node.get('ingredients'))]
+    tools = [text_of(tool) for tool in as_list(node.get('tool'))]
+    steps = parse_steps(node.get('recipeInstructions'))
+
+    ingredient_items = []
+    for line in filter(None, ingredients):
+        parsed = parse_ingredient(line)
+        if TO_TASTE_PATTERN.match(line):
+            # Spoonacular's shape for seasoning, which get_ingredients() turns back into 'Salt to taste'
+            ingredient_items.append({'amount': 1, 'unit': 'serving', 'name': parsed.name})
+            continue
+        ingredient_items.append({
+            # As written, so a range like '1-2' stays in the display string
+            'amount': parsed.quantity if parsed.amount is not None else '',
+            'unit': parsed.unit or '',
+            'name': parsed.name,
+        })
+
+    return {
+        'title': text_of(node.get('name')),
+        'sourceName': text_of(node.get('publisher') or node.get('author')) or urlparse(recipe_url).netloc,
+        'sourceUrl': recipe_url,
+        # A URL, ImageObject or list of those, image_source() picks the URL
+        'image': node.get('image'),
+        'servings': parse_servings(node.get('recipeYield')),
+        'preparationMinutes': parse_duration(node.get('prepTime')),
+        'cookingMinutes': parse_duration(node.get('cookTime')),
+        'readyInMinutes': parse_duration(node.get('totalTime')),
+        'nutrition': {'nutrients': parse_nutrients(node.get('nutrition'))},
+        'extendedIngredients': ingredient_items,
+        'analyzedInstructions': [{'steps': [
+            {'number': number, 'step': step, 'equipment': [{'name': tool} for tool in tools if tool] if number == 1 else []}
+            for number, step in enumerate(steps, 1)
+        ]}] if steps else [],
+    }
+
+
+def is_complete(recipe_data: Dict) -> bool:
+    """Whether local extraction found everything an import needs, so Spoonacular isn't worth calling."""
+    return bool(
+        recipe_data['title']
+        and recipe_data['servings']
+        and recipe_data['extendedIngredients']
+        and recipe_data['analyzedInstructions']
+        and any(nutrient['name'] == 'Calories' for nutrient in recipe_data['nutrition']['nutrients'])
+    )
+
+
+def find_recipe_nodes(page: str) -> Iterator[Dict]:
+    parser = SchemaParser()
+    parser.feed(page)
+    parser.close()
+    for block in parser.json_ld:
+        try:
+            document = json.loads(block.strip().removeprefix('<!--').removesuffix('-->'))
+        except ValueError:
+            continue
+        yield from (node for node in iter_nodes(document) if is_recipe(node))
+    for item in parser.items:
+        yield from (
+            {name: value[0] if len(value) == 1 and name != 'recipeIngredient' else value for name, value in node.items()}
+            for node in iter_items(item) if is_recipe(node)
+        )
+
+
+def iter_items(item: Dict) -> Iterator[Dict]:
+    """A microdata item and the items nested in its properties."""
+    yield item
+    for name, values in item.items():
+        if name != '@type':
+            for value in values:
+                if isinstance(value, dict):
+                    yield from iter_items(value)
+
+
+def extract_recipe(page: Optional[str], recipe_url: str) -> Optional[Dict]:
+    """
+    Extract a recipe from the schema.org JSON-LD or microdata of an already fetched page.
+
+    Returns:
+        dict: Payload for create_recipe_data(), or None when the page has no
+            complete recipe and Spoonacular has to extract it
+    """
+    if not page:
+        return None
+    try:
+        for node in find_recipe_nodes(page):
+            recipe_data = schema_to_recipe_data(node, recipe_url)
+            if is_complete(recipe_data):
+                return recipe_data
+    except (AssertionError, ValueError, TypeError, AttributeError):
+        return None
+    return None
@@ -1,7 +1,17 @@
-import bleach
+from app.utils.recipe.parse_ingredient import (normalize_ingredient_name,
+                                               parse_amount)
+from app.utils.sanitize import clean_text
 
 
 def get_ingredients(recipe_ingredients_list):
+    """
+    Structure ingredients from a raw payload.
+
+    Each item keeps the numeric amount, unit and name alongside the display
+    string stored in Recipe.ingredients as 'original'. The seasoning checks
+    read the raw name; every string that is stored, and so can end up in a
+    response, is sanitized.
+    """
     recipe_ingredients = []
     salt_pepper = False
     only_pepper = False
@@ -19,12 +29,29 @@ def get_ingredients(recipe_ingredients_list):
         if ingredient_name.lower() == 'pepper' and ingredient_unit == 'serving':
             only_pepper = True
             continue
-        recipe_ingredients.append(bleach.clean(f'{ingredient_amount} {ingredient_unit} {ingredient_name}'))
+        try:
+            amount = parse_amount(ingredient_amount)
+        except (ValueError, ZeroDivisionError):
+            amount = None
+        recipe_ingredients.append({
+            'amount': amount,
+            'unit': clean_text(ingredient_unit) if ingredient_unit else None,
+            'name': clean_text(ingredient_name),
+            'original': clean_text(' '.join(
+                str(part) for part in (ingredient_amount, ingredient_unit, ingredient_name) if part not in (None, '')
+            ))
+        })
     if salt_pepper:
-        recipe_ingredients.append('Salt and pepper to taste')
+        recipe_ingredients.append({'amount': None, 'unit': None, 'name': 'salt and pepper', 'original': 'Salt and pepper to taste'})
     elif only_pepper or only_salt:
         if only_pepper:
-            recipe_ingredients.append('Pepper to taste')
+            recipe_ingredients.append({'amount': None, 'unit': None, 'name': 'pepper', 'original': 'Pepper to taste'})
         if only_salt:
-            recipe_ingredients.append('Salt to taste')
+            recipe_ingredients.append({'amount': None, 'unit': None, 'name': 'salt', 'original': 'Salt to taste'})
     return recipe_ingredients
+
+
+def get_ingredient_names(ingredient_items):
+    """Distinct normalized ingredient names, stored in Recipe.ingredient_names for containment queries."""
+    names = (normalize_ingredient_name(item['name']) for item in ingredient_items)
+    return list(dict.fromkeys(name for name in names if name))
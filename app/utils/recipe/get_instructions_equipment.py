@@ -1,19 +1,25 @@
 import operator
 
-import bleach
+from app.utils.sanitize import clean_text
 
 
 def get_instructions_equipment(recipe_instructions_list):
+    """Flatten analyzed instructions from a raw payload, sanitizing the texts."""
     recipe_instructions = []
     recipe_equipment = []
     for recipe_instruction_item in recipe_instructions_list:
         for recipe_instruction_step in recipe_instruction_item['steps']:
             recipe_instruction_text = recipe_instruction_step['step']
             recipe_instruction_step_num = recipe_instruction_step['number']
-            recipe_instructions.append({'step_text': bleach.clean(str(recipe_instruction_text)), 'step_num': bleach.clean(str(recipe_instruction_step_num))})
+            recipe_instructions.append({'step_text': clean_text(recipe_instruction_text), 'step_num': clean_text(recipe_instruction_step_num)})
             for recipe_equipment_item in recipe_instruction_step['equipment']:
                 if recipe_equipment_item['name'] not in recipe_equipment:
-                    recipe_equipment.append(bleach.clean(str(recipe_equipment_item['name'])))
+                    recipe_equipment.append(clean_text(recipe_equipment_item['name']))
     # Make sure instructions are sorted properly
     recipe_instructions = sorted(recipe_instructions, key=operator.itemgetter('step_num'))
     return recipe_instructions, recipe_equipment
+
+
+def normalize_equipment(equipment):
+    """Lowercase and deduplicate equipment names so array containment queries match exactly."""
+    return list(dict.fromkeys(str(name).strip().lower() for name in equipment if str(name).strip()))
@@ -1,9 +1,10 @@
 import math
 
-import bleach
+from app.utils.sanitize import clean_text
 
 
 def get_nutrients(recipe_nutrients):
+    """Format nutrients from a raw payload, sanitizing the texts."""
     calories = 0
     nutrients = []
     for recipe_nutrient in recipe_nutrients:
@@ -11,10 +12,10 @@ def get_nutrients(recipe_nutrients):
             calories = math.ceil(recipe_nutrient['amount'])
             continue
         nutrient_info = {
-            'name': bleach.clean(recipe_nutrient['name']),
-            'unit': bleach.clean(str(recipe_nutrient['unit'].encode('utf-8').decode('utf-8'))),
-            'percent': bleach.clean(format(recipe_nutrient['percentOfDailyNeeds'], '.2f')),
-            'amount': bleach.clean(format(recipe_nutrient['amount'], '.2f'))
+            'name': clean_text(recipe_nutrient['name']),
+            'unit': clean_text(recipe_nutrient['unit']),
+            'percent': clean_text(format(recipe_nutrient['percentOfDailyNeeds'], '.2f')),
+            'amount': clean_text(format(recipe_nutrient['amount'], '.2f'))
         }
         nutrients.append(nutrient_info)
     return calories, nutrients
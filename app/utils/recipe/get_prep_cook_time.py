@@ -1,3 +1,7 @@
+import re
+from typing import Optional
+
+
 def get_prep_cook_time(time_minutes):
     time_hours = time_minutes // 60
     if time_hours == 1:
@@ -18,3 +22,24 @@ def get_prep_cook_time(time_minutes):
     else:
         return time_minutes
     return time_str
+
+
+TIME_PART = re.compile(r'(?P<value>\d+)\s*(?P<unit>hour|minute)s?', re.IGNORECASE)
+
+
+def parse_minutes(minutes) -> Optional[int]:
+    """Whole minutes from Spoonacular or form input, None when missing or unknown (-1)."""
+    if minutes is None or minutes == '':
+        return None
+    minutes = int(float(minutes))
+    return minutes if minutes >= 0 else None
+
+
+def parse_prep_cook_time(time_str: Optional[str]) -> Optional[int]:
+    """Minutes from a display string made by get_prep_cook_time(), e.g. '1 hour 5 minutes'."""
+    if not time_str:
+        return None
+    parts = TIME_PART.findall(time_str)
+    if not parts:
+        return 0 if time_str == 'None' else None
+    return sum(int(value) * (60 if unit.lower() == 'hour' else 1) for value, unit in parts)
@@ -1,11 +1,32 @@
+from typing import Dict, Tuple
+
 import requests
 
-from modules.exceptions import (SpoonacularQuotaError,
-                                SpoonacularRateLimitError,
-                                SpoonacularUnauthorizedError)
+from app.utils.exceptions import (SpoonacularQuotaError,
+                                  SpoonacularRateLimitError,
+                                  SpoonacularUnauthorizedError)
 
+# Points of the daily quota as reported on every Spoonacular response
+QUOTA_HEADERS = {
+    'request': 'X-API-Quota-Request',
+    'used': 'X-API-Quota-Used',
+    'left': 'X-API-Quota-Left',
+}
 
-def get_recipe_data(recipe_url, spoonacular_api_key):
+
+def parse_quota(headers) -> Dict[str, float]:
+    """Quota points from response headers, leaving out any the response didn't have."""
+    quota = {}
+    for name, header in QUOTA_HEADERS.items():
+        try:
+            quota[name] = float(headers[header])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return quota
+
+
+def request_recipe_data(recipe_url, spoonacular_api_key) -> Tuple[Dict, Dict[str, float]]:
+    """Call the extract endpoint, returning the payload as is and the quota of the key after the call."""
     recipe_request_headers = {
         'x-api-key': spoonacular_api_key,
         'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:10.0) Gecko/20100101 Firefox/10.0'
@@ -23,8 +44,10 @@ def get_recipe_data(recipe_url, spoonacular_api_key):
         params=recipe_request_params,
         timeout=60
     )
+    return recipe_request.json(), parse_quota(recipe_request.headers)
 
-    recipe_data = recipe_request.json()
+
+def raise_for_code(recipe_data) -> None:
     try:
         if recipe_data['code'] == 401:
             raise SpoonacularUnauthorizedError
@@ -34,4 +57,9 @@ def get_recipe_data(recipe_url, spoonacular_api_key):
             raise SpoonacularRateLimitError
     except KeyError:
         pass
+
+
+def get_recipe_data(recipe_url, spoonacular_api_key):
+    recipe_data, _ = request_recipe_data(recipe_url, spoonacular_api_key)
+    raise_for_code(recipe_data)
     return recipe_data
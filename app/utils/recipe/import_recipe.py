@@ -0,0 +1,191 @@
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.extensions import db
+from app.models import Recipe, Tag, User
+from app.utils.recipe.backup_store import (BACKUP_FORMAT, read_backup,
+                                           recipe_backup, write_backup)
+from app.utils.recipe.canonical_url import canonical_url
+from app.utils.recipe.changes import RECIPE_UPSERTED, record_recipe_changes
+from app.utils.recipe.ingredient_items import build_recipe_ingredients
+from app.utils.recipe.nutrient_values import build_nutrient_values
+from app.utils.recipe.similar_recipes import mark_similar_recipes_stale
+from app.utils.recipe.tags import update_tag_counts
+from app.utils.recipe.user_counts import update_user_recipe_counts
+
+logger = logging.getLogger(__name__)
+
+# Columns Recipe() sets from build_recipe_fields(), compared field by field on overwrite
+RECIPE_COLUMNS = (
+    'url', 'canonical_url', 'name', 'source', 'backup_file', 'extraction_source', 'image_url', 'servings',
+    'prep_minutes', 'cook_minutes', 'total_minutes', 'calories', 'calories_total', 'calories_serving',
+    'calories_unit', 'nutrients', 'ingredients', 'ingredient_names', 'instructions', 'equipment',
+)
+
+# Changes that make the stored similar recipes of and to a recipe outdated
+SIMILARITY_FIELDS = {'source', 'equipment', 'ingredients', 'ingredient_names', 'tags'}
+
+
+def find_recipe_by_url(recipe_url: str) -> Optional[Recipe]:
+    return db.session.query(Recipe).filter(Recipe.canonical_url == canonical_url(recipe_url)).first()
+
+
+def save_recipe(
+    fields: Dict,
+    source_data: Dict,
+    recipes_dir: Path,
+    existing: Optional[Recipe] = None
+) -> Tuple[Recipe, Optional[Set[str]], List[str]]:
+    """
+    Back up and store a recipe, inserting it or overwriting an existing one in place, and commit.
+
+    Shared by add() and the replay of deferred imports. Pass the result
+    to after_recipe_saved() once this has returned.
+
+    Args:
+        fields: Output of build_recipe_fields() with 'tags', 'users' and 'extraction_source' set
+        source_data: Raw payload the fields were built from, kept as the backup
+        recipes_dir: Backup directory
+        existing: Recipe to overwrite, which keeps its id, owners and progress
+
+    Returns:
+        tuple: The recipe, the fields that changed or None if it was inserted,
+            and backup files it no longer points at
+    """
+    # Backup the raw payload before the row referencing it is committed, with every owner it will have
+    owners = [*existing.users, *fields['users']] if existing else fields['users']
+    backup_data = recipe_backup(
+        source_data,
+        fields['url'],
+        [t.name for t in fields['tags']],
+        list(dict.fromkeys(u.id for u in owners)),
+        fields['extraction_source']
+    )
+    fields['backup_file'] = str(write_backup(recipes_dir, backup_data))
+
+    if existing:
+        previous_backup = existing.backup_file
+        changed = update_recipe(existing, fields)
+        if changed:
+            record_recipe_changes([existing.id], RECIPE_UPSERTED)
+        db.session.commit()
+        return existing, changed, [previous_backup] if 'backup_file' in changed and previous_backup else []
+
+    recipe = Recipe(fields)
+    recipe.nutrient_values = build_nutrient_values(fields['nutrients'])
+    recipe.ingredient_items = build_recipe_ingredients(fields['ingredient_items'])
+    db.session.add(recipe)
+    update_tag_counts([t.id for t in fields['tags']], 1)
+    update_user_recipe_counts([u.id for u in fields['users']], 1)
+    db.session.flush()
+    record_recipe_changes([recipe.id], RECIPE_UPSERTED)
+    db.session.commit()
+    return recipe, None, []
+
+
+def update_recipe(recipe: Recipe, fields: Dict) -> Set[str]:
+    """
+    Overwrite a recipe with a new extraction, writing only what differs.
+
+    Columns are compared one by one, nutrient and ingredient rows are only
+    rebuilt when their source column changed, and tag and owner links are
+    diffed, with cached counts moved by the difference. Owners are only
+    ever added, so an overwrite never takes a recipe out of a library.
+    Nothing is committed.
+
+    Returns:
+        set: Names of the changed fields, with 'tags' and 'users' for links
+    """
+    changed = {column for column in RECIPE_COLUMNS if getattr(recipe, column) != fields.get(column)}
+    for column in changed:
+        setattr(recipe, column, fields.get(column))
+    if 'nutrients' in changed:
+        recipe.nutrient_values = build_nutrient_values(fields['nutrients'])
+    if 'ingredients' in changed or 'ingredient_names' in changed:
+        recipe.ingredient_items = build_recipe_ingredients(fields['ingredient_items'])
+    if 'image_url' in changed:
+        # Rendered again from the new image by after_recipe_saved()
+        recipe.image_hash, recipe.image_widths = None, None
+
+    changed |= link_recipe(recipe, fields['tags'], fields['users'])
+    mark_recipe_changed(recipe, changed)
+    return changed
+
+
+def link_recipe(recipe: Recipe, tags: List[Tag], users: List[User], replace_tags: bool = True) -> Set[str]:
+    """
+    Diff the tag and owner links of a recipe, moving cached counts by the difference.
+
+    Owners are only ever added. Tags not in tags are removed unless
+    replace_tags is False. Nothing is committed.
+
+    Returns:
+        set: 'tags' and 'users' for the links that changed
+    """
+    changed = set()
+    tags = {tag.id: tag for tag in tags}
+    removed_tags = [tag for tag in recipe.tags if tag.id not in tags] if replace_tags else []
+    added_tags = [tag for tag_id, tag in tags.items() if tag_id not in {tag.id for tag in recipe.tags}]
+    for tag in removed_tags:
+        recipe.tags.remove(tag)
+    recipe.tags.extend(added_tags)
+    update_tag_counts([tag.id for tag in added_tags], 1)
+    update_tag_counts([tag.id for tag in removed_tags], -1)
+    if removed_tags or added_tags:
+        changed.add('tags')
+
+    owners = {user.id for user in recipe.users}
+    added_users = [user for user in users if user.id not in owners]
+    recipe.users.extend(added_users)
+    update_user_recipe_counts([user.id for user in added_users], 1)
+    if added_users:
+        changed.add('users')
+    return changed
+
+
+def mark_recipe_changed(recipe: Recipe, changed: Set[str]) -> None:
+    """Flag the similar recipes of a changed recipe for a refresh and bump its timestamp."""
+    if changed & SIMILARITY_FIELDS:
+        recipe.similarity_stale = True
+        mark_similar_recipes_stale([recipe.id])
+    if changed:
+        recipe.updated_at = datetime.now(timezone.utc)
+
+
+def share_recipe(recipe: Recipe, tags: List[Tag], users: List[User], recipes_dir: Path) -> Tuple[Set[str], List[str]]:
+    """
+    Add owners and tags to a recipe another import of the same page stored, and commit.
+
+    For submissions that waited on that import instead of extracting the
+    page again. Links are only added, and the backup is rewritten with
+    them so a restore keeps them. Pass the result to after_recipe_saved().
+
+    Returns:
+        tuple: The fields that changed and backup files the recipe no longer points at
+    """
+    changed = link_recipe(recipe, tags, users, replace_tags=False)
+    if not changed:
+        return changed, []
+
+    stale_files = []
+    previous_backup = recipe.backup_file
+    backup = None
+    if previous_backup:
+        try:
+            backup = read_backup(previous_backup)
+        except (OSError, ValueError) as e:
+            logger.warning('Kept backup of recipe %s without its new links: %s', recipe.id, e)
+    if backup and backup.get('format') == BACKUP_FORMAT:
+        backup['tags'] = list(dict.fromkeys([*backup['tags'], *(tag.name for tag in tags)]))
+        backup['users'] = list(dict.fromkeys([*backup['users'], *(user.id for user in users)]))
+        recipe.backup_file = str(write_backup(recipes_dir, backup))
+        if recipe.backup_file != previous_backup:
+            changed.add('backup_file')
+            stale_files.append(previous_backup)
+
+    mark_recipe_changed(recipe, changed)
+    record_recipe_changes([recipe.id], RECIPE_UPSERTED)
+    db.session.commit()
+    return changed, stale_files
@@ -0,0 +1,105 @@
+import logging
+from typing import Dict, List, Optional
+
+from app.extensions import db
+from app.models import Recipe, RecipeIngredient
+from app.utils.recipe.convert_units import canonical_unit, scale_ingredients
+from app.utils.recipe.pantry_index import invalidate_pantry_index
+from app.utils.recipe.parse_ingredient import parse_ingredient
+
+logger = logging.getLogger(__name__)
+
+
+def build_recipe_ingredients(ingredient_items: List[Dict]) -> List[RecipeIngredient]:
+    """Convert get_ingredients() items to RecipeIngredient rows with canonical units."""
+    return [
+        RecipeIngredient(
+            position=position,
+            amount=item['amount'],
+            unit=canonical_unit(item['unit']),
+            name=item['name'],
+            original=item['original']
+        )
+        for position, item in enumerate(ingredient_items)
+    ]
+
+
+def backfill_ingredient_items(batch_size: int = 500) -> int:
+    """
+    Parse the display strings of recipes stored before structured ingredients existed.
+
+    Returns:
+        int: Number of recipes backfilled
+    """
+    missing = (
+        db.session.query(Recipe.id, Recipe.ingredients)
+        .filter(~Recipe.ingredient_items.any())
+        .filter(Recipe.ingredients.isnot(None))
+        .order_by(Recipe.id)
+    )
+
+    backfilled = 0
+    last_id = 0
+    while True:
+        rows = missing.filter(Recipe.id > last_id).limit(batch_size).all()
+        if not rows:
+            break
+        for recipe_id, ingredients in rows:
+            for position, text in enumerate(ingredients):
+                parsed = parse_ingredient(text)
+                db.session.add(RecipeIngredient(
+                    recipe_id=recipe_id,
+                    position=position,
+                    amount=parsed.amount,
+                    unit=parsed.unit,
+                    name=parsed.name,
+                    original=parsed.original
+                ))
+        db.session.commit()
+        last_id = rows[-1][0]
+        backfilled += len(rows)
+        logger.info('Backfilled ingredients for %s recipes', backfilled)
+
+    if backfilled:
+        invalidate_pantry_index()
+    return backfilled
+
+
+def get_scaled_ingredients(servings_by_recipe: Dict[int, Optional[float]], system: Optional[str] = None) -> Dict[int, Dict]:
+    """
+    Scale the stored ingredients of a batch of recipes to the requested servings.
+
+    Args:
+        servings_by_recipe: Recipe id -> target servings, None keeps the recipe's own
+        system: 'metric', 'us' or None to keep the original units
+
+    Returns:
+        dict: Recipe id -> servings and scaled ingredients, for recipes that exist
+    """
+    recipe_servings = dict(
+        db.session.query(Recipe.id, Recipe.servings).filter(Recipe.id.in_(list(servings_by_recipe)))
+    )
+    ingredients = {recipe_id: [] for recipe_id in recipe_servings}
+    rows = (
+        db.session.query(RecipeIngredient)
+        .filter(RecipeIngredient.recipe_id.in_(list(recipe_servings)))
+        .order_by(RecipeIngredient.recipe_id, RecipeIngredient.position)
+    )
+    for row in rows:
+        ingredients[row.recipe_id].append(row.to_dict())
+
+    batch = []
+    for recipe_id, servings in recipe_servings.items():
+        target_servings = servings_by_recipe[recipe_id] or servings
+        batch.append({
+            'recipe_id': recipe_id,
+            'servings': target_servings,
+            'factor': target_servings / servings if servings else 1,
+            'ingredients': ingredients[recipe_id]
+        })
+
+    scaled = scale_ingredients(batch, system)
+    return {
+        recipe['recipe_id']: {'servings': recipe['servings'], 'ingredients': recipe_ingredients}
+        for recipe, recipe_ingredients in zip(batch, scaled)
+    }
@@ -0,0 +1,76 @@
+import logging
+import re
+from typing import Dict, List
+
+from app.extensions import db
+from app.models import Recipe, RecipeNutrient
+
+logger = logging.getLogger(__name__)
+
+
+def nutrient_key(name: str) -> str:
+    """Normalize a nutrient name to its filter key, e.g. 'Saturated Fat' -> 'saturated_fat'."""
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+def build_nutrient_values(nutrients: List[Dict]) -> List[RecipeNutrient]:
+    """
+    Convert the display nutrients stored in Recipe.nutrients to numeric rows.
+
+    Args:
+        nutrients: Nutrient dicts with string 'name', 'unit', 'amount' and 'percent'
+
+    Returns:
+        list: RecipeNutrient rows, skipping entries without a numeric amount
+    """
+    nutrient_values = {}
+    for nutrient in nutrients or []:
+        try:
+            amount = float(nutrient['amount'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        try:
+            percent_daily = float(nutrient.get('percent'))
+        except (TypeError, ValueError):
+            percent_daily = None
+        key = nutrient_key(str(nutrient.get('name', '')))
+        if key:
+            nutrient_values[key] = RecipeNutrient(
+                key=key,
+                name=nutrient['name'],
+                amount=amount,
+                unit=nutrient.get('unit'),
+                percent_daily=percent_daily
+            )
+    return list(nutrient_values.values())
+
+
+def backfill_nutrient_values(batch_size: int = 500) -> int:
+    """
+    Create numeric nutrient rows for recipes stored before they existed.
+
+    Returns:
+        int: Number of recipes backfilled
+    """
+    missing = (
+        db.session.query(Recipe.id, Recipe.nutrients)
+        .filter(~Recipe.nutrient_values.any())
+        .filter(Recipe.nutrients.isnot(None))
+        .order_by(Recipe.id)
+    )
+
+    backfilled = 0
+    last_id = 0
+    while True:
+        rows = missing.filter(Recipe.id > last_id).limit(batch_size).all()
+        if not rows:
+            break
+        for recipe_id, nutrients in rows:
+            for nutrient_value in build_nutrient_values(nutrients):
+                nutrient_value.recipe_id = recipe_id
+                db.session.add(nutrient_value)
+        db.session.commit()
+        last_id = rows[-1][0]
+        backfilled += len(rows)
+        logger.info('Backfilled nutrient values for %s recipes', backfilled)
+    return backfilled
@@ -0,0 +1,158 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from app.extensions import cache, db
+from app.models import Recipe, RecipeNutrient
+
+# Fixed nutrient vocabulary every per-recipe vector is aligned to: (key, name, unit)
+NUTRIENT_VOCABULARY = (
+    ('calories', 'Calories', 'kcal'),
+    ('fat', 'Fat', 'g'),
+    ('saturated_fat', 'Saturated Fat', 'g'),
+    ('trans_fat', 'Trans Fat', 'g'),
+    ('mono_unsaturated_fat', 'Mono Unsaturated Fat', 'g'),
+    ('poly_unsaturated_fat', 'Poly Unsaturated Fat', 'g'),
+    ('carbohydrates', 'Carbohydrates', 'g'),
+    ('net_carbohydrates', 'Net Carbohydrates', 'g'),
+    ('sugar', 'Sugar', 'g'),
+    ('fiber', 'Fiber', 'g'),
+    ('protein', 'Protein', 'g'),
+    ('cholesterol', 'Cholesterol', 'mg'),
+    ('sodium', 'Sodium', 'mg'),
+    ('potassium', 'Potassium', 'mg'),
+    ('calcium', 'Calcium', 'mg'),
+    ('iron', 'Iron', 'mg'),
+    ('magnesium', 'Magnesium', 'mg'),
+    ('phosphorus', 'Phosphorus', 'mg'),
+    ('zinc', 'Zinc', 'mg'),
+    ('copper', 'Copper', 'mg'),
+    ('manganese', 'Manganese', 'mg'),
+    ('selenium', 'Selenium', 'µg'),
+    ('vitamin_a', 'Vitamin A', 'IU'),
+    ('vitamin_b1', 'Vitamin B1', 'mg'),
+    ('vitamin_b2', 'Vitamin B2', 'mg'),
+    ('vitamin_b3', 'Vitamin B3', 'mg'),
+    ('vitamin_b5', 'Vitamin B5', 'mg'),
+    ('vitamin_b6', 'Vitamin B6', 'mg'),
+    ('vitamin_b12', 'Vitamin B12', 'µg'),
+    ('vitamin_c', 'Vitamin C', 'mg'),
+    ('vitamin_d', 'Vitamin D', 'µg'),
+    ('vitamin_e', 'Vitamin E', 'mg'),
+    ('vitamin_k', 'Vitamin K', 'µg'),
+    ('folate', 'Folate', 'µg'),
+    ('choline', 'Choline', 'mg'),
+    ('alcohol', 'Alcohol', 'g'),
+    ('caffeine', 'Caffeine', 'mg'),
+)
+
+NUTRIENT_INDEX = {key: index for index, (key, _, _) in enumerate(NUTRIENT_VOCABULARY)}
+
+NUTRIENT_VECTOR_TIMEOUT = 24 * 60 * 60
+
+
+def nutrient_vector_cache_key(recipe_id: int) -> str:
+    return f'nutrient_vector:{recipe_id}'
+
+
+def get_nutrient_vectors(recipe_ids: Iterable[int]) -> Dict[int, np.ndarray]:
+    """
+    Per-serving nutrient vectors aligned to NUTRIENT_VOCABULARY.
+
+    Vectors come from the cache where possible; the misses are loaded with
+    one query each against Recipe and RecipeNutrient and cached for reuse.
+    Ids that don't exist are left out of the result.
+    """
+    recipe_ids = list(dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids))
+    cached = cache.get_many(*[nutrient_vector_cache_key(recipe_id) for recipe_id in recipe_ids])
+    vectors = {
+        recipe_id: vector
+        for recipe_id, vector in zip(recipe_ids, cached)
+        if vector is not None
+    }
+
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in vectors]
+    if not missing:
+        return vectors
+
+    loaded = {}
+    calories_index = NUTRIENT_INDEX['calories']
+    for recipe_id, calories_serving in db.session.query(Recipe.id, Recipe.calories_serving).filter(Recipe.id.in_(missing)):
+        loaded[recipe_id] = np.zeros(len(NUTRIENT_VOCABULARY))
+        loaded[recipe_id][calories_index] = calories_serving or 0
+
+    nutrient_rows = db.session.query(
+        RecipeNutrient.recipe_id, RecipeNutrient.key, RecipeNutrient.amount
+    ).filter(
+        RecipeNutrient.recipe_id.in_(list(loaded)),
+        RecipeNutrient.key.in_(list(NUTRIENT_INDEX))
+    )
+    for recipe_id, key, amount in nutrient_rows:
+        loaded[recipe_id][NUTRIENT_INDEX[key]] = amount
+
+    if loaded:
+        cache.set_many(
+            {nutrient_vector_cache_key(recipe_id): vector for recipe_id, vector in loaded.items()},
+            timeout=NUTRIENT_VECTOR_TIMEOUT
+        )
+    vectors.update(loaded)
+    return vectors
+
+
+def invalidate_nutrient_vectors(recipe_ids: Iterable[int]) -> None:
+    """Drop cached nutrient vectors for recipes that were changed or removed."""
+    keys = [nutrient_vector_cache_key(recipe_id) for recipe_id in recipe_ids]
+    if keys:
+        cache.delete_many(*keys)
+
+
+def aggregate_meal_plan(items: List[Dict]) -> Dict:
+    """
+    Total nutrition for a meal plan of (recipe_id, servings, day) items.
+
+    The vectors of the distinct recipes are stacked once into a matrix, so
+    scaling by servings and summing per day are single array operations
+    regardless of how many meals the plan contains.
+
+    Args:
+        items: Dicts with 'recipe_id', 'servings' and an optional 'day' label
+
+    Returns:
+        dict: Plan totals, per-day totals and any recipe ids that don't exist
+    """
+    recipe_ids = np.array([int(item['recipe_id']) for item in items], dtype=np.int64)
+    servings = np.array([float(item.get('servings', 1)) for item in items])
+    days = np.array([str(item.get('day', '')) for item in items])
+
+    vectors = get_nutrient_vectors(recipe_ids.tolist())
+    found = np.isin(recipe_ids, list(vectors))
+    missing_recipe_ids = sorted(set(recipe_ids[~found].tolist()))
+    recipe_ids, servings, days = recipe_ids[found], servings[found], days[found]
+
+    unique_ids, recipe_index = np.unique(recipe_ids, return_inverse=True)
+    matrix = np.zeros((unique_ids.size, len(NUTRIENT_VOCABULARY)))
+    for row, recipe_id in enumerate(unique_ids.tolist()):
+        matrix[row] = vectors[recipe_id]
+    contributions = matrix[recipe_index] * servings[:, np.newaxis]
+
+    day_labels, day_index = np.unique(days, return_inverse=True)
+    day_totals = np.zeros((day_labels.size, len(NUTRIENT_VOCABULARY)))
+    np.add.at(day_totals, day_index, contributions)
+
+    totals = contributions.sum(axis=0)
+    daily_average = totals / day_labels.size if day_labels.size else totals
+
+    return {
+        'nutrients': [{'key': key, 'name': name, 'unit': unit} for key, name, unit in NUTRIENT_VOCABULARY],
+        'totals': nutrients_by_key(totals),
+        'daily_average': nutrients_by_key(daily_average),
+        'days': [
+            {'day': label, 'totals': nutrients_by_key(day_total)}
+            for label, day_total in zip(day_labels.tolist(), day_totals)
+        ],
+        'missing_recipe_ids': missing_recipe_ids,
+    }
+
+
+def nutrients_by_key(vector: np.ndarray) -> Dict[str, float]:
+    return dict(zip(NUTRIENT_INDEX, np.round(vector, 2).tolist()))
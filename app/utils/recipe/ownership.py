@@ -0,0 +1,48 @@
+import logging
+
+from sqlalchemy import text
+
+from app.extensions import db
+from app.models import user_recipe
+
+logger = logging.getLogger(__name__)
+
+
+def owns_recipe(user_id: int, recipe_id: int) -> bool:
+    """Whether a user has a recipe in their library, as one EXISTS probe of the user_recipe primary key."""
+    return db.session.query(
+        db.session.query(user_recipe)
+        .filter(user_recipe.c.user_id == user_id, user_recipe.c.recipe_id == recipe_id)
+        .exists()
+    ).scalar()
+
+
+def add_user_recipe_keys() -> int:
+    """
+    Drop duplicate user_recipe links and add the composite keys to a table created without them.
+
+    The primary key (user_id, recipe_id) serves ownership checks and a
+    user's library, the (recipe_id, user_id) index finds a recipe's owners.
+
+    Returns:
+        int: Number of duplicate links removed
+    """
+    removed = db.session.execute(text(
+        'DELETE FROM user_recipe a USING user_recipe b '
+        'WHERE a.ctid > b.ctid AND a.user_id = b.user_id AND a.recipe_id = b.recipe_id'
+    )).rowcount
+    removed += db.session.execute(text(
+        'DELETE FROM user_recipe WHERE user_id IS NULL OR recipe_id IS NULL'
+    )).rowcount
+
+    has_key = db.session.execute(text(
+        "SELECT 1 FROM pg_constraint WHERE conrelid = 'user_recipe'::regclass AND contype = 'p'"
+    )).scalar()
+    if not has_key:
+        db.session.execute(text('ALTER TABLE user_recipe ADD PRIMARY KEY (user_id, recipe_id)'))
+    db.session.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_user_recipe_recipe_id_user_id ON user_recipe (recipe_id, user_id)'
+    ))
+    db.session.commit()
+    logger.info('Removed %s duplicate user recipe links', removed)
+    return removed
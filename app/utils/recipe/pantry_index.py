@@ -0,0 +1,195 @@
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.extensions import cache, db
+from app.models import Recipe, RecipeIngredient
+from app.utils.recipe.parse_ingredient import normalize_ingredient_name
+
+logger = logging.getLogger(__name__)
+
+PANTRY_INDEX_GENERATION_KEY = 'pantry_index_generation'
+
+EMPTY_POSTINGS = np.zeros(0, dtype=np.int32)
+
+
+class PantryIndex:
+    """
+    Inverted index from normalized ingredient name to recipe ids.
+
+    Each worker holds its own copy. Postings are sorted int32 arrays and
+    the number of distinct ingredients per recipe is kept in two aligned
+    arrays, so ranking a pantry is a handful of array operations. Writes
+    bump a shared generation counter in the cache; a worker that sees a
+    generation it didn't produce rebuilds from the database.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = None
+        self.postings: Dict[str, np.ndarray] = {}
+        self.recipe_ids = EMPTY_POSTINGS
+        self.sizes = EMPTY_POSTINGS
+
+    def rebuild(self, generation: int) -> None:
+        names_by_recipe: Dict[int, set] = {}
+        for recipe_id, name in db.session.query(RecipeIngredient.recipe_id, RecipeIngredient.name):
+            name = normalize_ingredient_name(name)
+            if name:
+                names_by_recipe.setdefault(recipe_id, set()).add(name)
+
+        postings: Dict[str, List[int]] = {}
+        for recipe_id, names in names_by_recipe.items():
+            for name in names:
+                postings.setdefault(name, []).append(recipe_id)
+
+        self.postings = {name: np.sort(np.array(ids, dtype=np.int32)) for name, ids in postings.items()}
+        self.recipe_ids = np.array(sorted(names_by_recipe), dtype=np.int32)
+        self.sizes = np.array([len(names_by_recipe[recipe_id]) for recipe_id in self.recipe_ids.tolist()], dtype=np.int32)
+        self.generation = generation
+        logger.info('Built pantry index of %s recipes and %s ingredients', len(self.recipe_ids), len(self.postings))
+
+    def refresh(self) -> None:
+        """Rebuild when another worker changed the index since it was built here."""
+        generation = cache.get(PANTRY_INDEX_GENERATION_KEY) or 0
+        if generation != self.generation:
+            with self.lock:
+                if generation != self.generation:
+                    self.rebuild(generation)
+
+    def apply(self, update) -> None:
+        """
+        Apply an incremental update locally and publish a new generation.
+
+        If some other worker published in between, the local copy is missing
+        their change, so it is marked stale and rebuilt on the next query.
+        """
+        generation = cache.cache.inc(PANTRY_INDEX_GENERATION_KEY) or 0
+        with self.lock:
+            if self.generation is not None and generation == self.generation + 1:
+                update()
+                self.generation = generation
+            else:
+                self.generation = None
+
+    def add_recipe(self, recipe_id: int, names: Iterable[str]) -> None:
+        names = {name for name in map(normalize_ingredient_name, names) if name}
+
+        def update():
+            self.remove_local([recipe_id])
+            for name in names:
+                ids = self.postings.get(name, EMPTY_POSTINGS)
+                self.postings[name] = np.insert(ids, np.searchsorted(ids, recipe_id), recipe_id)
+            position = np.searchsorted(self.recipe_ids, recipe_id)
+            self.recipe_ids = np.insert(self.recipe_ids, position, recipe_id)
+            self.sizes = np.insert(self.sizes, position, len(names))
+
+        self.apply(update)
+
+    def remove_recipes(self, recipe_ids: Iterable[int]) -> None:
+        recipe_ids = list(recipe_ids)
+        self.apply(lambda: self.remove_local(recipe_ids))
+
+    def remove_local(self, recipe_ids: List[int]) -> None:
+        removed = np.array(recipe_ids, dtype=np.int32)
+        keep = ~np.isin(self.recipe_ids, removed)
+        if keep.all():
+            return
+        self.recipe_ids, self.sizes = self.recipe_ids[keep], self.sizes[keep]
+        for name, ids in list(self.postings.items()):
+            ids = ids[~np.isin(ids, removed)]
+            if ids.size:
+                self.postings[name] = ids
+            else:
+                del self.postings[name]
+
+    def rank(self, pantry: Iterable[str], limit: int, max_missing: Optional[int] = None) -> List[Dict]:
+        """
+        Rank recipes by how much of their ingredient list the pantry covers.
+
+        Returns:
+            list: Dicts of recipe_id, matched and total ingredient counts and coverage,
+                best coverage first, then fewest missing ingredients
+        """
+        self.refresh()
+        postings = self.postings
+        pantry = {name for name in map(normalize_ingredient_name, pantry) if name}
+        matches = [postings[name] for name in pantry if name in postings]
+        if not matches:
+            return []
+
+        candidates, matched = np.unique(np.concatenate(matches), return_counts=True)
+        recipe_ids, sizes = self.recipe_ids, self.sizes
+        totals = sizes[np.searchsorted(recipe_ids, candidates)]
+        missing = totals - matched
+        if max_missing is not None:
+            keep = missing <= max_missing
+            candidates, matched, totals, missing = candidates[keep], matched[keep], totals[keep], missing[keep]
+
+        coverage = matched / totals
+        order = np.lexsort((candidates, missing, -coverage))[:limit]
+        return [
+            {
+                'recipe_id': int(candidates[index]),
+                'matched': int(matched[index]),
+                'total': int(totals[index]),
+                'coverage': round(float(coverage[index]), 3)
+            }
+            for index in order
+        ]
+
+
+pantry_index = PantryIndex()
+
+
+def add_to_pantry_index(recipe_id: int, names: Iterable[str]) -> None:
+    pantry_index.add_recipe(recipe_id, names)
+
+
+def remove_from_pantry_index(recipe_ids: Iterable[int]) -> None:
+    pantry_index.remove_recipes(recipe_ids)
+
+
+def invalidate_pantry_index() -> None:
+    """Make every worker rebuild its index, e.g. after bulk changes to ingredients."""
+    cache.cache.inc(PANTRY_INDEX_GENERATION_KEY)
+
+
+def find_recipes_by_pantry(pantry: Iterable[str], limit: int = 20, max_missing: Optional[int] = None) -> List[Dict]:
+    """
+    Recipes that can be cooked, or nearly, from the ingredients on hand.
+
+    Args:
+        pantry: Ingredient names the user has
+        limit: Maximum number of recipes to return
+        max_missing: Leave out recipes missing more ingredients than this
+
+    Returns:
+        list: Ranked recipes with their name and the ingredients still missing
+    """
+    pantry = list(pantry)
+    ranked = pantry_index.rank(pantry, limit, max_missing)
+    if not ranked:
+        return []
+
+    recipe_ids = [recipe['recipe_id'] for recipe in ranked]
+    names = dict(db.session.query(Recipe.id, Recipe.name).filter(Recipe.id.in_(recipe_ids)))
+    have = {normalize_ingredient_name(name) for name in pantry}
+    missing: Dict[int, List[str]] = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = (
+        db.session.query(RecipeIngredient.recipe_id, RecipeIngredient.name)
+        .filter(RecipeIngredient.recipe_id.in_(recipe_ids))
+        .order_by(RecipeIngredient.recipe_id, RecipeIngredient.position)
+    )
+    for recipe_id, name in rows:
+        name = normalize_ingredient_name(name)
+        if name and name not in have and name not in missing[recipe_id]:
+            missing[recipe_id].append(name)
+
+    return [
+        {**recipe, 'name': names[recipe['recipe_id']], 'missing': missing[recipe['recipe_id']]}
+        for recipe in ranked
+        if recipe['recipe_id'] in names
+    ]
@@ -0,0 +1,125 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+from app.utils.recipe.convert_units import UNIT_ALIASES, canonical_unit
+
+UNICODE_FRACTIONS = {
+    char: unicodedata.numeric(char)
+    for char in '½⅓⅔¼¾⅕⅖⅗⅘⅙⅚⅛⅜⅝⅞'
+}
+
+_FRACTION_CHARS = ''.join(UNICODE_FRACTIONS)
+_UNITS = '|'.join(re.escape(unit) for unit in sorted(UNIT_ALIASES, key=len, reverse=True))
+
+_NUMBER = rf'''(?:
+        \d+\s*[-–]\s*\d+/\d+      # hyphenated mixed number
+        |\d+\s+\d+/\d+           # mixed number
+        |\d+/\d+                # fraction
+        |\d*\s*[{_FRACTION_CHARS}]  # unicode fraction, optionally after a whole number
+        |\d+(?:\.\d+)?          # integer or decimal
+    )'''
+
+# "1-2", "1 – 2", "2 to 3"
+_RANGE = r'(?:\s*[-–]|\s+to\s)\s*'
+
+NUMBER_PATTERN = re.compile(rf'^\s*{_NUMBER}\s*$', re.VERBOSE)
+RANGE_PATTERN = re.compile(rf'^\s*(?P<low>{_NUMBER}){_RANGE}(?P<high>{_NUMBER})\s*$', re.VERBOSE)
+
+# "1 1/2 cups flour", "1-1/2 cups flour", "2.0 tbsp sugar", "½ tsp salt", "3 eggs",
+# and ranges "1-2 cloves garlic", "2 to 3 tbsp olive oil"
+INGREDIENT_PATTERN = re.compile(
+    rf'''^\s*
+    (?P<amount>{_NUMBER}(?:{_RANGE}{_NUMBER})?)?
+    \s*
+    (?:(?P<unit>(?i:{_UNITS}))(?=\s|$))?
+    \s*
+    (?P<name>.*?)\s*$''',
+    re.VERBOSE
+)
+
+TO_TASTE_PATTERN = re.compile(r'^(?P<name>.+?)\s+to taste$', re.IGNORECASE)
+
+
+@dataclass
+class ParsedIngredient:
+    amount: Optional[float]
+    unit: Optional[str]
+    name: str
+    original: str
+    # Amount as written, e.g. '1-2' for a range
+    quantity: Optional[str] = None
+
+
+def parse_amount(amount) -> Optional[float]:
+    """
+    Parse a numeric, decimal, fraction, mixed number or unicode fraction amount.
+
+    A range like '1-2' or '2 to 3' is read as its upper bound, so scaled
+    amounts and shopping lists err towards enough.
+    """
+    if amount is None or amount == '':
+        return None
+    if isinstance(amount, (int, float)):
+        return float(amount)
+    # '1-1/2' is a mixed number, not the range 1 to 1/2
+    amount_range = None if NUMBER_PATTERN.match(str(amount)) else RANGE_PATTERN.match(str(amount))
+    if amount_range:
+        amount = amount_range['high']
+    total = 0.0
+    for part in re.sub('[-–]', ' ', str(amount)).split():
+        if part[-1] in UNICODE_FRACTIONS:
+            total += float(part[:-1] or 0) + UNICODE_FRACTIONS[part[-1]]
+        elif '/' in part:
+            numerator, denominator = part.split('/', 1)
+            total += float(numerator) / float(denominator)
+        else:
+            total += float(part)
+    return total
+
+
+def parse_ingredient(text: str) -> ParsedIngredient:
+    """
+    Split a free text ingredient line into amount, canonical unit and name.
+
+    A range like '1-2 cloves garlic' gets its upper bound as the amount,
+    see parse_amount(), and stays as written in quantity and original.
+    Lines the pattern can't split (e.g. 'Salt and pepper to taste') keep
+    the whole text as the name with no amount or unit.
+    """
+    to_taste = TO_TASTE_PATTERN.match(text)
+    if to_taste:
+        return ParsedIngredient(None, None, to_taste['name'].lower(), text)
+
+    match = INGREDIENT_PATTERN.match(text)
+    if not match or not match['name']:
+        return ParsedIngredient(None, None, text.strip(), text)
+
+    try:
+        amount = parse_amount(match['amount'])
+    except (ValueError, ZeroDivisionError):
+        return ParsedIngredient(None, None, text.strip(), text)
+
+    unit = canonical_unit(match['unit']) if match['unit'] else None
+    return ParsedIngredient(amount, unit, match['name'], text, match['amount'])
+
+
+def normalize_ingredient_name(name: str) -> str:
+    """
+    Normalize an ingredient name for matching across recipes.
+
+    Lowercases, collapses whitespace and strips simple English plurals so
+    'Eggs', 'egg' and 'EGG ' compare equal.
+    """
+    words = name.lower().split()
+    if not words:
+        return ''
+    last = words[-1]
+    if last.endswith('ies') and len(last) > 4:
+        last = last[:-3] + 'y'
+    elif last.endswith('oes') and len(last) > 4:
+        last = last[:-2]
+    elif last.endswith('s') and not last.endswith(('ss', 'us', 'is')) and len(last) > 3:
+        last = last[:-1]
+    return ' '.join(words[:-1] + [last])
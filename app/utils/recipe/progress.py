@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from typing import Dict
+
+from sqlalchemy import cast
+from sqlalchemy.dialects.postgresql import JSON, JSONB, insert
+
+from app.extensions import db
+from app.models import UserRecipeProgress
+
+PROGRESS_KEY_MAX_LENGTH = 64
+
+
+def validate_progress_changes(changes) -> Dict[str, bool]:
+    """
+    Check a progress patch such as {'ingredient-3': True}.
+
+    Raises:
+        ValueError: If it isn't a non-empty map of short string keys to booleans
+    """
+    if not isinstance(changes, dict) or not changes:
+        raise ValueError('changes must be a non-empty object')
+    for key, value in changes.items():
+        if not isinstance(key, str) or not key or len(key) > PROGRESS_KEY_MAX_LENGTH:
+            raise ValueError(f'Invalid progress key {key!r}')
+        if not isinstance(value, bool):
+            raise ValueError(f'Progress value for {key} must be true or false')
+    return changes
+
+
+def upsert_recipe_progress(user_id: int, recipe_id: int, checked_ingredients: Dict[str, bool], replace: bool = False) -> None:
+    """
+    Persist checked ingredients with a single INSERT ... ON CONFLICT DO UPDATE.
+
+    Patches are merged into the stored map with the jsonb || operator, so
+    concurrent writers can't lose each other's keys or race on the unique
+    constraint the way select-then-insert did.
+
+    Args:
+        user_id: Owner of the progress
+        recipe_id: Recipe the progress belongs to
+        checked_ingredients: Keys to set, or the whole map when replacing
+        replace: Overwrite the stored map instead of merging into it
+    """
+    now = datetime.now(timezone.utc)
+    statement = insert(UserRecipeProgress).values(
+        user_id=user_id,
+        recipe_id=recipe_id,
+        checked_ingredients=checked_ingredients,
+        last_updated=now
+    )
+    merged = statement.excluded.checked_ingredients if replace else cast(
+        cast(UserRecipeProgress.checked_ingredients, JSONB).op('||')(
+            cast(statement.excluded.checked_ingredients, JSONB)
+        ),
+        JSON
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        constraint='unique_user_recipe_progress',
+        set_={'checked_ingredients': merged, 'last_updated': now}
+    ))
+    db.session.commit()
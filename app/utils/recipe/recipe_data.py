@@ -0,0 +1,124 @@
+from typing import Dict
+
+from app.utils.recipe.canonical_url import canonical_url
+from app.utils.recipe.get_ingredients import (get_ingredient_names,
+                                              get_ingredients)
+from app.utils.recipe.get_instructions_equipment import (
+    get_instructions_equipment, normalize_equipment)
+from app.utils.recipe.get_nutrients import get_nutrients
+from app.utils.recipe.get_prep_cook_time import parse_minutes
+from app.utils.recipe.recipe_images import image_source
+from app.utils.sanitize import clean_text
+
+# Fields kept as structured values instead of sanitized strings
+STRUCTURED_FIELDS = ('ingredients', 'ingredient_items', 'instructions', 'equipment')
+
+
+def calculate_calories(calories: float, servings: float, per_serving: bool = True) -> tuple[int, int]:
+    """Calculate total and per-serving calories."""
+    if per_serving:
+        total = int(round(calories * servings))
+        per_serving = int(calories)
+    else:
+        total = int(calories)
+        per_serving = int(round(calories / servings))
+    return total, per_serving
+
+
+def create_recipe_data(data: Dict, recipe_url: str) -> tuple[Dict, str]:
+    """
+    Create standardized recipe data dictionary.
+
+    Args:
+        data: Raw recipe data dictionary
+        recipe_url: URL of the recipe or 'self' for manual recipes
+
+    Returns:
+        tuple: (recipe_data, recipe_nutrients)
+    """
+    if recipe_url != 'self':
+        calories, nutrients = get_nutrients(data['nutrition']['nutrients'])
+        instructions, equipment = get_instructions_equipment(data['analyzedInstructions'])
+        ingredient_items = get_ingredients(data['extendedIngredients'])
+
+        prep_minutes = parse_minutes(data.get('preparationMinutes'))
+        cook_minutes = parse_minutes(data.get('cookingMinutes'))
+
+        return {
+            'name': data['title'],
+            'source': data['sourceName'],
+            'servings': data['servings'],
+            'prep_minutes': prep_minutes,
+            'cook_minutes': cook_minutes,
+            'total_minutes': (
+                prep_minutes + cook_minutes
+                if prep_minutes is not None and cook_minutes is not None
+                else parse_minutes(data.get('readyInMinutes'))
+            ),
+            'calories': calories,
+            'calories_unit': 'serving',
+            'ingredients': [item['original'] for item in ingredient_items],
+            'ingredient_names': get_ingredient_names(ingredient_items),
+            'ingredient_items': ingredient_items,
+            'instructions': instructions,
+            'equipment': normalize_equipment(equipment),
+        }, nutrients
+
+    prep_minutes = (int(data.get('prep_time_hours', 0)) * 60 +
+                    int(data.get('prep_time_minutes', 0)))
+    cook_minutes = (int(data.get('cook_time_hours', 0)) * 60 +
+                    int(data.get('cook_time_minutes', 0)))
+    ingredient_items = get_ingredients(data.get('ingredients', []))
+
+    return {
+        'name': data.get('name', ''),
+        'source': 'self',
+        'servings': data.get('servings', 0),
+        'prep_minutes': prep_minutes,
+        'cook_minutes': cook_minutes,
+        'total_minutes': prep_minutes + cook_minutes,
+        'calories': data.get('calories', 0),
+        'calories_unit': data.get('calories_unit', 'serving'),
+        'ingredients': [item['original'] for item in ingredient_items],
+        'ingredient_names': get_ingredient_names(ingredient_items),
+        'ingredient_items': ingredient_items,
+        'instructions': data.get('instructions', []),
+        'equipment': normalize_equipment(data.get('equipment', [])),
+    }, []
+
+
+def build_recipe_fields(data: Dict, recipe_url: str) -> Dict:
+    """
+    Normalize a raw Spoonacular or manual recipe payload into Recipe constructor fields.
+
+    Shared by add() and restoring from backups, so both store exactly the
+    same values. Tags, users and the backup file are left to the caller.
+
+    Args:
+        data: Raw recipe data dictionary
+        recipe_url: URL of the recipe or 'self' for manual recipes
+    """
+    recipe_data, recipe_nutrients = create_recipe_data(data, recipe_url)
+
+    calories_total, calories_serving = calculate_calories(
+        float(recipe_data['calories']),
+        float(recipe_data['servings']),
+        recipe_data['calories_unit'] == 'serving'
+    )
+
+    fields = {
+        'url': clean_text(recipe_url),
+        'canonical_url': canonical_url(recipe_url),
+        'image_url': image_source(data.get('image')),
+        'calories_total': calories_total,
+        'calories_serving': calories_serving,
+        'nutrients': recipe_nutrients,
+    }
+
+    # Handle special fields separately, then add remaining fields
+    for k, v in recipe_data.items():
+        if k in STRUCTURED_FIELDS or not isinstance(v, str):
+            fields[k] = v
+        else:
+            fields[k] = clean_text(v)
+    return fields
@@ -0,0 +1,206 @@
+import base64
+import json
+import operator
+import re
+from datetime import datetime
+from typing import Any, List, Tuple
+from urllib.parse import unquote_plus
+
+from sqlalchemy import and_, or_
+
+from app.extensions import db
+from app.models import Recipe, RecipeNutrient
+from app.utils.recipe.get_instructions_equipment import normalize_equipment
+from app.utils.recipe.parse_ingredient import normalize_ingredient_name
+
+RANGE_FILTER = re.compile(r'^(?P<field>[a-z_]+)(?P<op><=|>=|<|>)(?P<value>.*)$')
+
+RANGE_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# Range-filterable Recipe columns, anything else is looked up as a nutrient key
+RANGE_COLUMNS = {
+    'name': Recipe.name,
+    'calories': Recipe.calories_serving,
+    'calories_serving': Recipe.calories_serving,
+    'calories_total': Recipe.calories_total,
+    'prep_time': Recipe.prep_minutes,
+    'cook_time': Recipe.cook_minutes,
+    'total_time': Recipe.total_minutes,
+    'date_added': Recipe.created_at,
+}
+
+# Filter value parsers for non-numeric fields
+RANGE_PARSERS = {
+    'name': str,
+    'date_added': datetime.fromisoformat,
+}
+
+
+# GIN indexed array columns for containment filters and how filter values are normalized
+CONTAINMENT_COLUMNS = {
+    'equipment': (Recipe.equipment, normalize_equipment),
+    'ingredients': (
+        Recipe.ingredient_names,
+        lambda names: list(dict.fromkeys(filter(None, map(normalize_ingredient_name, names))))
+    ),
+}
+
+# Sortable fields, each backed by an index on its column
+SORT_COLUMNS = {
+    'name': Recipe.name,
+    'total_time': Recipe.total_minutes,
+    'calories': Recipe.calories_serving,
+    'date_added': Recipe.created_at,
+}
+
+
+def parse_range_filters(query_string: str) -> List[Tuple[str, str, Any]]:
+    """
+    Parse comparison filters such as 'calories_serving<=500&protein>=30'.
+
+    Plain 'key=value' parameters are left to request.args and ignored here.
+    Times are in minutes, date_added takes an ISO date and name compares
+    alphabetically.
+
+    Raises:
+        ValueError: If a comparison has a value of the wrong type
+    """
+    filters = []
+    for token in query_string.split('&'):
+        match = RANGE_FILTER.match(unquote_plus(token))
+        if not match:
+            continue
+        try:
+            value = RANGE_PARSERS.get(match['field'], float)(match['value'])
+        except ValueError as e:
+            raise ValueError(f'Invalid value for {match["field"]} filter') from e
+        filters.append((match['field'], match['op'], value))
+    return filters
+
+
+def apply_range_filters(query, filters: List[Tuple[str, str, Any]]):
+    """Apply parsed range filters to a Recipe query as indexed SQL predicates."""
+    for field, op, value in filters:
+        compare = RANGE_OPERATORS[op]
+        if field in RANGE_COLUMNS:
+            query = query.filter(compare(RANGE_COLUMNS[field], value))
+        else:
+            query = query.filter(Recipe.id.in_(
+                db.session.query(RecipeNutrient.recipe_id).filter(
+                    RecipeNutrient.key == field,
+                    compare(RecipeNutrient.amount, value)
+                )
+            ))
+    return query
+
+
+def apply_containment_filters(query, args):
+    """
+    Filter a Recipe query by what its equipment and ingredient arrays contain.
+
+    'equipment=slow cooker' keeps recipes using all the given items and
+    'exclude_equipment=oven' drops recipes using any of them. Values can be
+    repeated or comma separated, and ingredients work the same way.
+    Both compile to the GIN indexable @> and && array operators.
+    """
+    for field, (column, normalize) in CONTAINMENT_COLUMNS.items():
+        include = normalize(value for values in args.getlist(field) for value in values.split(','))
+        exclude = normalize(value for values in args.getlist(f'exclude_{field}') for value in values.split(','))
+        if include:
+            query = query.filter(column.contains(include))
+        if exclude:
+            query = query.filter(or_(column.is_(None), ~column.overlap(exclude)))
+    return query
+
+
+def parse_sort(sort: str) -> List[Tuple[str, bool]]:
+    """
+    Parse a sort parameter such as '-calories,+name' into (field, descending) pairs.
+
+    Raises:
+        ValueError: If a field isn't sortable
+    """
+    fields = []
+    for field in sort.split(','):
+        field = field.strip()
+        descending = field.startswith('-')
+        field = field.lstrip('+- ')
+        if not field:
+            continue
+        if field not in SORT_COLUMNS:
+            raise ValueError(f'Cannot sort by {field}')
+        fields.append((field, descending))
+    return fields
+
+
+def apply_sort(query, sort: str):
+    """
+    Order a Recipe query by a sort parameter such as '-calories,+name'.
+
+    A leading '-' sorts descending. Recipes without a value sort last
+    either way, and id breaks ties so pages are stable.
+
+    Raises:
+        ValueError: If a field isn't sortable
+    """
+    order = [
+        (SORT_COLUMNS[field].desc() if descending else SORT_COLUMNS[field].asc()).nulls_last()
+        for field, descending in parse_sort(sort)
+    ]
+    return query.order_by(*order, Recipe.id)
+
+
+def encode_cursor(recipe: Recipe, sort: str) -> str:
+    """Opaque keyset cursor holding the sort values and id of the last recipe on a page."""
+    values = [getattr(recipe, SORT_COLUMNS[field].key) for field, _ in parse_sort(sort)]
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps([*values, recipe.id]).encode()).decode()
+
+
+def apply_keyset(query, sort: str, cursor: str):
+    """
+    Continue a query sorted by apply_sort() after the recipe a cursor points at.
+
+    Compares the sort key lexicographically, with each nullable column
+    expanded to (IS NULL, value) so recipes without a value still come
+    last. Each page then starts where the last ended instead of skipping
+    OFFSET rows.
+
+    Raises:
+        ValueError: If the cursor is malformed or was made for another sort
+    """
+    fields = parse_sort(sort)
+    try:
+        *values, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        last_id = int(last_id)
+        if len(values) != len(fields):
+            raise ValueError
+        values = [
+            datetime.fromisoformat(value) if value is not None and field == 'date_added' else value
+            for (field, _), value in zip(fields, values)
+        ]
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+    # (equal, after) conditions for each part of the sort key, ending with the id tie breaker
+    parts = []
+    for (field, descending), value in zip(fields, values):
+        column = SORT_COLUMNS[field]
+        if value is None:
+            parts.append((column.is_(None), None))
+        else:
+            parts.append((column.isnot(None), column.is_(None)))
+            parts.append((column == value, column < value if descending else column > value))
+    parts.append((None, Recipe.id > last_id))
+
+    after = [
+        and_(*(equal for equal, _ in parts[:index]), condition)
+        for index, (_, condition) in enumerate(parts)
+        if condition is not None
+    ]
+    return query.filter(or_(*after))
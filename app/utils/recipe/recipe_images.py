@@ -0,0 +1,271 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+
+from app.extensions import db
+from app.models import Recipe
+
+# Larger downloads and decoded images are refused
+MAX_IMAGE_BYTES = 15 * 1024 * 1024
+MAX_IMAGE_PIXELS = 50_000_000
+
+# OpenCV reads its limit once, so it is set before cv2 is loaded. Decoders then
+# check the size from the header and refuse a decompression bomb before allocating it.
+os.environ['OPENCV_IO_MAX_IMAGE_PIXELS'] = str(MAX_IMAGE_PIXELS)
+import cv2  # pylint: disable=wrong-import-position,wrong-import-order
+
+logger = logging.getLogger(__name__)
+
+# Thumbnail widths in pixels, images narrower than one get a variant at their own width instead
+IMAGE_WIDTHS = (160, 320, 640, 1280)
+
+# Variant file suffix -> OpenCV encoder parameters
+IMAGE_ENCODINGS = {
+    'webp': [cv2.IMWRITE_WEBP_QUALITY, 80],
+    'jpg': [cv2.IMWRITE_JPEG_QUALITY, 82, cv2.IMWRITE_JPEG_PROGRESSIVE, 1],
+}
+
+IMAGE_DIGEST = re.compile(r'[0-9a-f]{64}')
+IMAGE_VARIANT = re.compile(r'\d+\.(?:webp|jpg)')
+
+
+def image_source(value) -> Optional[str]:
+    """
+    The http(s) URL of a payload's image, which may be a URL, an ImageObject or a list of those.
+
+    Read from the raw payload, as sanitizing would escape the URL.
+    """
+    while isinstance(value, (list, dict)):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        else:
+            value = value.get('url') or value.get('contentUrl')
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    return value if urlsplit(value).scheme in ('http', 'https') else None
+
+
+def image_dir(images_dir: Path, digest: str) -> Path:
+    """Where the variants of an image with this SHA-256 live, sharded two levels deep by hash prefix."""
+    return Path(images_dir) / digest[:2] / digest[2:4] / digest
+
+
+def fetch_image(image_url: str) -> bytes:
+    """
+    Download a source image.
+
+    Raises:
+        ValueError: If the response isn't an image or is larger than MAX_IMAGE_BYTES
+    """
+    response = requests.get(
+        image_url,
+        headers={'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:10.0) Gecko/20100101 Firefox/10.0'},
+        timeout=30,
+        stream=True
+    )
+    with response:
+        response.raise_for_status()
+        if not response.headers.get('Content-Type', '').startswith('image/'):
+            raise ValueError(f'{image_url} is not an image')
+        chunks, size = [], 0
+        for chunk in response.iter_content(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise ValueError(f'{image_url} is larger than {MAX_IMAGE_BYTES} bytes')
+    return b''.join(chunks)
+
+
+def render_thumbnails(data: bytes) -> Tuple[List[int], Dict[str, bytes]]:
+    """
+    Decode an image and encode it at every thumbnail width in every format.
+
+    Runs in a process pool. Transparency is flattened onto white and
+    images are only ever scaled down.
+
+    Returns:
+        tuple: The widths rendered and the encoded variants by file name, e.g. '320.webp'
+
+    Raises:
+        ValueError: If the data can't be decoded or has more than MAX_IMAGE_PIXELS
+    """
+    try:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    except cv2.error as e:
+        # Raised for images over OPENCV_IO_MAX_IMAGE_PIXELS, before they are decoded
+        raise ValueError(f'Image has more than {MAX_IMAGE_PIXELS} pixels') from e
+    if image is None:
+        raise ValueError('Unsupported image format')
+    if image.shape[0] * image.shape[1] > MAX_IMAGE_PIXELS:
+        raise ValueError(f'Image has more than {MAX_IMAGE_PIXELS} pixels')
+
+    if image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image, alpha=255 / np.iinfo(image.dtype).max)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        alpha = image[:, :, 3:].astype(np.float32) / 255
+        image = (image[:, :, :3] * alpha + 255 * (1 - alpha)).astype(np.uint8)
+
+    height, width = image.shape[:2]
+    widths = sorted({min(target, width) for target in IMAGE_WIDTHS})
+    variants = {}
+    for target in widths:
+        resized = image if target == width else cv2.resize(
+            image, (target, max(round(height * target / width), 1)), interpolation=cv2.INTER_AREA
+        )
+        for suffix, params in IMAGE_ENCODINGS.items():
+            ok, encoded = cv2.imencode(f'.{suffix}', resized, params)
+            if not ok:
+                raise ValueError(f'Could not encode {suffix}')
+            variants[f'{target}.{suffix}'] = encoded.tobytes()
+    return widths, variants
+
+
+def store_thumbnails(images_dir: Path, digest: str, variants: Dict[str, bytes]) -> None:
+    """Write the variants of an image next to each other, each renamed into place once complete."""
+    directory = image_dir(images_dir, digest)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, data in variants.items():
+        path = directory / name
+        if path.exists():
+            continue
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+
+def set_recipe_image(recipe_id: int, image_url: str, digest: str, widths: List[int]) -> bool:
+    """
+    Point a recipe at its thumbnails, unless its image changed while they were rendered. Nothing is committed.
+
+    Returns:
+        bool: Whether the recipe was updated
+    """
+    updated = db.session.query(Recipe).filter(Recipe.id == recipe_id, Recipe.image_url == image_url).update(
+        {Recipe.image_hash: digest, Recipe.image_widths: widths},
+        synchronize_session=False
+    )
+    return bool(updated)
+
+
+def process_recipe_image(recipe_id: int, images_dir: Path) -> bool:
+    """
+    Fetch the source image of a recipe and store its thumbnails.
+
+    Images already rendered for another recipe, or an earlier import of
+    this one, are found by content hash and not rendered again.
+
+    Returns:
+        bool: Whether the recipe got thumbnails
+    """
+    image_url = db.session.query(Recipe.image_url).filter(Recipe.id == recipe_id).scalar()
+    if not image_url:
+        return False
+    data = fetch_image(image_url)
+    digest = hashlib.sha256(data).hexdigest()
+    widths = existing_widths(images_dir, digest)
+    if not widths:
+        widths, variants = render_thumbnails(data)
+        store_thumbnails(images_dir, digest, variants)
+    updated = set_recipe_image(recipe_id, image_url, digest, widths)
+    db.session.commit()
+    return updated
+
+
+def existing_widths(images_dir: Path, digest: str) -> List[int]:
+    """Widths already rendered for an image, empty unless every format of each is there."""
+    directory = image_dir(images_dir, digest)
+    if not directory.is_dir():
+        return []
+    names = {path.name for path in directory.iterdir()}
+    widths = sorted({int(name.split('.')[0]) for name in names if IMAGE_VARIANT.fullmatch(name)})
+    if not widths or any(f'{width}.{suffix}' not in names for width in widths for suffix in IMAGE_ENCODINGS):
+        return []
+    return widths
+
+
+def download(image_url: str) -> Tuple[Optional[bytes], Optional[str]]:
+    try:
+        return fetch_image(image_url), None
+    except (requests.RequestException, ValueError) as e:
+        return None, f'{type(e).__name__}: {e}'
+
+
+def backfill_recipe_images(images_dir: Path, workers: Optional[int] = None, batch_size: int = 100) -> Tuple[int, int]:
+    """
+    Render thumbnails for recipes with a source image but none yet.
+
+    Each batch is downloaded by a thread pool while a process pool
+    decodes and resizes, so neither network nor CPU sits idle. Recipes
+    whose image can't be fetched or decoded are counted and skipped.
+
+    Args:
+        images_dir: Thumbnail directory
+        workers: Render processes, defaults to the CPU count
+        batch_size: Recipes per round
+
+    Returns:
+        tuple: Number of recipes given thumbnails and of images that failed
+    """
+    missing = (
+        db.session.query(Recipe.id, Recipe.image_url)
+        .filter(Recipe.image_url.isnot(None), Recipe.image_hash.is_(None))
+        .order_by(Recipe.id)
+    )
+
+    processed = failed = 0
+    last_id = 0
+    with ProcessPoolExecutor(max_workers=workers) as renderer, ThreadPoolExecutor(max_workers=16) as downloader:
+        while True:
+            batch = missing.filter(Recipe.id > last_id).limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            # Images shared by several recipes are rendered once
+            fetched, rendering = [], {}
+            for (recipe_id, image_url), (data, error) in zip(batch, downloader.map(download, [url for _, url in batch])):
+                if error:
+                    failed += 1
+                    logger.warning('Skipped image of recipe %s: %s', recipe_id, error)
+                    continue
+                digest = hashlib.sha256(data).hexdigest()
+                fetched.append((recipe_id, image_url, digest))
+                if digest not in rendering and not existing_widths(images_dir, digest):
+                    rendering[digest] = renderer.submit(render_thumbnails, data)
+
+            rendered = {}
+            for digest, future in rendering.items():
+                try:
+                    widths, variants = future.result()
+                except ValueError as e:
+                    logger.warning('Could not render image %s: %s', digest, e)
+                    continue
+                store_thumbnails(images_dir, digest, variants)
+                rendered[digest] = widths
+
+            for recipe_id, image_url, digest in fetched:
+                widths = rendered.get(digest) if digest in rendering else existing_widths(images_dir, digest)
+                if widths:
+                    processed += set_recipe_image(recipe_id, image_url, digest, widths)
+                else:
+                    failed += 1
+            db.session.commit()
+            logger.info('Rendered images for %s recipes, %s failed', processed, failed)
+    return processed, failed
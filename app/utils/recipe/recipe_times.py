@@ -0,0 +1,57 @@
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import or_
+
+from app.extensions import db
+from app.models import Recipe
+from app.utils.recipe.get_prep_cook_time import parse_prep_cook_time
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_recipe_times(batch_size: int = 500) -> int:
+    """
+    Fill the minute columns and date added of recipes stored before they existed.
+
+    Minutes are parsed back out of the stored display strings. The date
+    added is taken from the backup file's modification time, which is
+    written when the recipe is added, or the current time without one.
+
+    Returns:
+        int: Number of recipes backfilled
+    """
+    missing = (
+        db.session.query(Recipe)
+        .filter(or_(
+            Recipe.created_at.is_(None),
+            (Recipe.total_minutes.is_(None) & (Recipe.prep_time.isnot(None) | Recipe.cook_time.isnot(None)))
+        ))
+        .order_by(Recipe.id)
+    )
+
+    backfilled = 0
+    last_id = 0
+    while True:
+        recipes = missing.filter(Recipe.id > last_id).limit(batch_size).all()
+        if not recipes:
+            break
+        for recipe in recipes:
+            if recipe.total_minutes is None:
+                recipe.prep_minutes = parse_prep_cook_time(recipe.prep_time)
+                recipe.cook_minutes = parse_prep_cook_time(recipe.cook_time)
+                if recipe.prep_minutes is not None or recipe.cook_minutes is not None:
+                    recipe.total_minutes = (recipe.prep_minutes or 0) + (recipe.cook_minutes or 0)
+            if recipe.created_at is None:
+                backup_file = Path(recipe.backup_file) if recipe.backup_file else None
+                recipe.created_at = (
+                    datetime.fromtimestamp(backup_file.stat().st_mtime, timezone.utc)
+                    if backup_file and backup_file.is_file()
+                    else datetime.now(timezone.utc)
+                )
+        db.session.commit()
+        last_id = recipes[-1].id
+        backfilled += len(recipes)
+        logger.info('Backfilled times for %s recipes', backfilled)
+    return backfilled
@@ -0,0 +1,205 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.extensions import db
+from app.models import Recipe, Tag, User
+from app.utils.recipe.autocomplete import invalidate_autocomplete
+from app.utils.recipe.backup_files import (referenced_backup_files,
+                                           scan_backup_files)
+from app.utils.recipe.backup_store import BACKUP_FORMAT, read_backup
+from app.utils.recipe.canonical_url import canonical_url
+from app.utils.recipe.changes import RECIPE_UPSERTED, record_recipe_changes
+from app.utils.recipe.get_ingredients import get_ingredient_names
+from app.utils.recipe.get_instructions_equipment import normalize_equipment
+from app.utils.recipe.get_prep_cook_time import (parse_minutes,
+                                                 parse_prep_cook_time)
+from app.utils.recipe.ingredient_items import build_recipe_ingredients
+from app.utils.recipe.nutrient_values import build_nutrient_values
+from app.utils.recipe.pantry_index import invalidate_pantry_index
+from app.utils.recipe.parse_ingredient import parse_ingredient
+from app.utils.recipe.recipe_data import (build_recipe_fields,
+                                          calculate_calories)
+from app.utils.recipe.shopping_list import invalidate_shopping_lists
+from app.utils.recipe.tags import (get_or_create_tags, normalize_tag_name,
+                                   recount_tags)
+from app.utils.recipe.user_counts import recount_user_recipes
+
+logger = logging.getLogger(__name__)
+
+
+def legacy_recipe_fields(backup: Dict) -> Dict:
+    """Recipe fields from a backup written before BACKUP_FORMAT, which held normalized fields instead of the raw payload."""
+    ingredient_items = backup.get('ingredient_items') or [
+        asdict(parse_ingredient(line)) for line in backup.get('ingredients') or []
+    ]
+
+    minutes = {}
+    for field in ('prep', 'cook'):
+        minutes[field] = (
+            parse_minutes(backup[f'{field}_minutes'])
+            if f'{field}_minutes' in backup
+            else parse_prep_cook_time(backup.get(f'{field}_time'))
+        )
+    total_minutes = backup.get('total_minutes')
+    if total_minutes is None and (minutes['prep'] is not None or minutes['cook'] is not None):
+        total_minutes = (minutes['prep'] or 0) + (minutes['cook'] or 0)
+
+    calories_unit = backup.get('calories_unit') or 'serving'
+    if backup.get('calories_total') is not None and backup.get('calories_serving') is not None:
+        calories_total, calories_serving = int(backup['calories_total']), int(backup['calories_serving'])
+    else:
+        calories_total, calories_serving = calculate_calories(
+            float(backup.get('calories') or 0),
+            float(backup.get('servings') or 1),
+            calories_unit == 'serving'
+        )
+
+    return {
+        'url': backup.get('url'),
+        'canonical_url': canonical_url(backup.get('url')),
+        'name': backup.get('name') or backup.get('title', ''),
+        'source': backup.get('source') or backup.get('sourceName'),
+        'servings': int(float(backup.get('servings') or 0)),
+        'prep_minutes': minutes['prep'],
+        'cook_minutes': minutes['cook'],
+        'total_minutes': total_minutes,
+        'calories': int(float(backup.get('calories') or 0)),
+        'calories_unit': calories_unit,
+        'calories_total': calories_total,
+        'calories_serving': calories_serving,
+        'nutrients': backup.get('nutrients') or [],
+        'ingredients': [item['original'] for item in ingredient_items],
+        'ingredient_names': get_ingredient_names(ingredient_items),
+        'ingredient_items': ingredient_items,
+        'instructions': backup.get('instructions') or [],
+        'equipment': normalize_equipment(backup.get('equipment') or []),
+    }
+
+
+def parse_backup(path: str) -> Tuple[str, Optional[Dict], Optional[str]]:
+    """
+    Read and normalize one backup file. Runs in the restore process pool.
+
+    Returns:
+        tuple: The path, then the recipe fields with 'tags' and 'users' as
+            stored in the backup, or None and why the file was skipped
+    """
+    try:
+        backup = read_backup(path)
+        if backup.get('format') == BACKUP_FORMAT:
+            fields = build_recipe_fields(backup['source_data'], backup['url'])
+            fields['extraction_source'] = backup.get('extraction_source')
+        else:
+            fields = legacy_recipe_fields(backup)
+        fields['tags'] = backup.get('tags') or []
+        fields['users'] = backup.get('users') or []
+        return path, fields, None
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return path, None, f'{type(e).__name__}: {e}'
+
+
+def insert_restored_recipes(parsed: List[Tuple[str, Dict, float]]) -> None:
+    """
+    Insert a batch of restored recipes with their tags, owners, nutrients and ingredients.
+
+    Tags are resolved with one upsert and owners with one query for the
+    whole batch, then the rows go out as multi row INSERTs per table.
+    """
+    tag_names = {tag for _, fields, _ in parsed for tag in fields['tags'] if isinstance(tag, str)}
+    tag_ids = {tag for _, fields, _ in parsed for tag in fields['tags'] if isinstance(tag, int)}
+    user_ids = {user for _, fields, _ in parsed for user in fields['users'] if isinstance(user, int)}
+
+    tags_by_name = {tag.name: tag for tag in get_or_create_tags(tag_names)}
+    tags_by_id = {tag.id: tag for tag in Tag.query.filter(Tag.id.in_(tag_ids))} if tag_ids else {}
+    users_by_id = {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
+
+    # Duplicates from before imports were deduplicated are restored without the canonical URL
+    canonical_urls = {fields['canonical_url'] for _, fields, _ in parsed if fields['canonical_url']}
+    taken = {
+        key for key, in
+        db.session.query(Recipe.canonical_url).filter(Recipe.canonical_url.in_(canonical_urls))
+    } if canonical_urls else set()
+
+    recipes = []
+    for path, fields, modified in parsed:
+        if fields['canonical_url'] in taken:
+            fields['canonical_url'] = None
+        elif fields['canonical_url']:
+            taken.add(fields['canonical_url'])
+        tags = [
+            tags_by_name.get(normalize_tag_name(tag)) if isinstance(tag, str) else tags_by_id.get(tag)
+            for tag in fields['tags']
+        ]
+        recipe = Recipe({
+            **fields,
+            'backup_file': path,
+            'tags': list({tag.id: tag for tag in tags if tag}.values()),
+            'users': [users_by_id[user] for user in dict.fromkeys(fields['users']) if user in users_by_id],
+        })
+        recipe.created_at = datetime.fromtimestamp(modified, timezone.utc)
+        recipe.nutrient_values = build_nutrient_values(fields['nutrients'])
+        recipe.ingredient_items = build_recipe_ingredients(fields['ingredient_items'])
+        recipes.append(recipe)
+    db.session.add_all(recipes)
+    db.session.flush()
+    record_recipe_changes([recipe.id for recipe in recipes], RECIPE_UPSERTED)
+    db.session.commit()
+
+
+def restore_recipes(recipes_dir: Path, workers: Optional[int] = None, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    Rebuild recipes from the backup directory.
+
+    Files are parsed and normalized in a process pool while the main
+    process inserts committed batches. Backups a recipe already points at
+    are skipped, so an interrupted restore picks up where it stopped.
+    Cached counts and indexes are rebuilt once at the end.
+
+    Args:
+        recipes_dir: Backup directory to scan
+        workers: Parser processes, defaults to the CPU count
+        batch_size: Recipes per commit
+
+    Returns:
+        tuple: Number of recipes restored and of backups that couldn't be read
+    """
+    started = time.monotonic()
+    files = scan_backup_files(recipes_dir)
+    restored_files = referenced_backup_files()
+    pending = sorted(
+        path for path in files
+        if path not in restored_files and not Path(path).name.startswith('.tmp-')
+    )
+    logger.info('Found %s backups, %s left to restore', len(files), len(pending))
+
+    restored = failed = 0
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, fields, error in executor.map(parse_backup, pending, chunksize=64):
+            if error:
+                failed += 1
+                logger.warning('Skipped backup %s: %s', path, error)
+                continue
+            batch.append((path, fields, files[path]))
+            if len(batch) >= batch_size:
+                insert_restored_recipes(batch)
+                restored += len(batch)
+                batch = []
+                elapsed = time.monotonic() - started
+                logger.info('Restored %s of %s recipes (%.0f/s)', restored, len(pending), restored / elapsed)
+        if batch:
+            insert_restored_recipes(batch)
+            restored += len(batch)
+
+    if restored:
+        recount_tags()
+        recount_user_recipes()
+        invalidate_pantry_index()
+        invalidate_autocomplete()
+        invalidate_shopping_lists()
+    return restored, failed
@@ -0,0 +1,134 @@
+import logging
+
+from sqlalchemy import text
+
+from app.extensions import db
+from app.models import Recipe, RecipeIngredient
+from app.utils.recipe.get_ingredients import get_ingredient_names
+from app.utils.recipe.get_instructions_equipment import normalize_equipment
+from app.utils.recipe.parse_ingredient import parse_ingredient
+
+logger = logging.getLogger(__name__)
+
+# Columns moved to JSONB and the expression converting their old value
+JSONB_COLUMNS = {
+    'instructions': 'instructions::jsonb',
+    'nutrients': 'to_jsonb(nutrients)',
+}
+
+GIN_INDEXES = {
+    'ix_recipe_equipment': 'equipment',
+    'ix_recipe_ingredient_names': 'ingredient_names',
+}
+
+
+def column_type(column: str) -> str:
+    return db.session.execute(text(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = 'recipe' AND column_name = :column"
+    ), {'column': column}).scalar()
+
+
+def migrate_jsonb_columns(batch_size: int = 1000) -> int:
+    """
+    Convert the JSON instruction and nutrient columns to JSONB without a long lock.
+
+    A plain ALTER COLUMN TYPE rewrites the table under an exclusive lock.
+    Instead the values are copied into shadow JSONB columns in small
+    committed batches while the app keeps running. Rows inserted or updated
+    in the meantime, e.g. by overwrites, are found by comparing each value
+    with its shadow and copied again, once while the app keeps running and
+    once more in the short transaction that swaps the columns and only
+    blocks writes.
+
+    Returns:
+        int: Number of recipes converted, 0 if the columns already are JSONB
+    """
+    columns = [column for column in JSONB_COLUMNS if column_type(column) != 'jsonb']
+    if not columns:
+        return 0
+
+    db.session.execute(text('ALTER TABLE recipe ' + ', '.join(
+        f'ADD COLUMN IF NOT EXISTS {column}_jsonb jsonb' for column in columns
+    )))
+    db.session.commit()
+
+    assignments = ', '.join(f'{column}_jsonb = {JSONB_COLUMNS[column]}' for column in columns)
+    copy_batch = text(f'''
+        WITH batch AS (SELECT id FROM recipe WHERE id > :last_id ORDER BY id LIMIT :batch_size)
+        UPDATE recipe SET {assignments} WHERE id IN (SELECT id FROM batch) RETURNING id
+    ''')
+
+    converted = 0
+    last_id = 0
+    while True:
+        ids = db.session.execute(copy_batch, {'last_id': last_id, 'batch_size': batch_size}).scalars().all()
+        db.session.commit()
+        if not ids:
+            break
+        last_id = max(ids)
+        converted += len(ids)
+        logger.info('Copied %s recipes to JSONB', converted)
+
+    stale = ' OR '.join(f'{column}_jsonb IS DISTINCT FROM {JSONB_COLUMNS[column]}' for column in columns)
+    catch_up = text(f'UPDATE recipe SET {assignments} WHERE {stale}')
+    caught_up = db.session.execute(catch_up).rowcount
+    db.session.commit()
+    logger.info('Copied %s recipes changed during the copy', caught_up)
+
+    db.session.execute(text('LOCK TABLE recipe IN SHARE ROW EXCLUSIVE MODE'))
+    db.session.execute(catch_up)
+    new_rows = db.session.execute(
+        text('SELECT count(*) FROM recipe WHERE id > :last_id'), {'last_id': last_id}
+    ).scalar()
+    for column in columns:
+        db.session.execute(text(f'ALTER TABLE recipe DROP COLUMN {column}'))
+        db.session.execute(text(f'ALTER TABLE recipe RENAME COLUMN {column}_jsonb TO {column}'))
+    db.session.commit()
+    return converted + new_rows
+
+
+def backfill_search_arrays(batch_size: int = 500) -> int:
+    """
+    Fill Recipe.ingredient_names and normalize equipment of recipes stored before them.
+
+    Returns:
+        int: Number of recipes backfilled
+    """
+    missing = (
+        db.session.query(Recipe)
+        .filter(Recipe.ingredient_names.is_(None))
+        .order_by(Recipe.id)
+    )
+
+    backfilled = 0
+    last_id = 0
+    while True:
+        recipes = missing.filter(Recipe.id > last_id).limit(batch_size).all()
+        if not recipes:
+            break
+        names = {recipe.id: [] for recipe in recipes}
+        rows = db.session.query(RecipeIngredient.recipe_id, RecipeIngredient.name).filter(
+            RecipeIngredient.recipe_id.in_(list(names))
+        ).order_by(RecipeIngredient.recipe_id, RecipeIngredient.position)
+        for recipe_id, name in rows:
+            names[recipe_id].append({'name': name})
+
+        for recipe in recipes:
+            items = names[recipe.id] or [
+                {'name': parse_ingredient(line).name} for line in recipe.ingredients or []
+            ]
+            recipe.ingredient_names = get_ingredient_names(items)
+            recipe.equipment = normalize_equipment(recipe.equipment or [])
+        db.session.commit()
+        last_id = recipes[-1].id
+        backfilled += len(recipes)
+        logger.info('Backfilled search arrays for %s recipes', backfilled)
+    return backfilled
+
+
+def create_gin_indexes() -> None:
+    """Build the GIN indexes concurrently, so the table stays writable during the build."""
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for name, column in GIN_INDEXES.items():
+            logger.info('Creating index %s', name)
+            connection.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON recipe USING gin ({column})'))
@@ -0,0 +1,138 @@
+import hashlib
+import json
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.extensions import cache, db
+from app.models import Recipe, RecipeIngredient, UserRecipeProgress
+from app.utils.recipe.convert_units import (TARGET_UNITS, UNIT_CODES,
+                                            UNIT_DIMENSIONS, UNIT_FACTORS,
+                                            UNIT_NAMES, canonical_unit,
+                                            choose_target_units,
+                                            format_amount)
+from app.utils.recipe.parse_ingredient import normalize_ingredient_name
+
+SHOPPING_LIST_TIMEOUT = 24 * 60 * 60
+
+
+def shopping_list_version(scope) -> int:
+    return cache.get(f'shopping_list_version:{scope}') or 0
+
+
+def invalidate_shopping_lists(user_id: Optional[int] = None) -> None:
+    """
+    Invalidate cached shopping lists of one user, or of everyone when a recipe changes.
+
+    Lists are cached under the current version numbers, so bumping a
+    version makes every older entry unreachable until it expires.
+    """
+    scope = user_id if user_id is not None else 'recipes'
+    cache.cache.inc(f'shopping_list_version:{scope}')
+
+
+def build_shopping_list(user_id: int, servings_by_recipe: Dict[int, Optional[float]], system: str = 'us') -> Dict:
+    """
+    Build one consolidated shopping list for a set of recipes.
+
+    Results are cached per user and input set, so reopening the same list
+    is a single cache read until the user's progress or a recipe changes.
+
+    Args:
+        user_id: User whose checked ingredients are left off the list
+        servings_by_recipe: Recipe id -> servings to shop for, None keeps the recipe's own
+        system: 'metric' or 'us' units for merged amounts
+    """
+    if system not in TARGET_UNITS:
+        raise ValueError(f'Unknown unit system {system}')
+
+    request_key = hashlib.sha1(json.dumps(
+        [sorted(servings_by_recipe.items()), system]
+    ).encode()).hexdigest()
+    cache_key = (
+        f'shopping_list:{user_id}:{shopping_list_version(user_id)}:'
+        f'{shopping_list_version("recipes")}:{request_key}'
+    )
+    shopping_list = cache.get(cache_key)
+    if shopping_list is None:
+        shopping_list = consolidate_ingredients(user_id, servings_by_recipe, system)
+        cache.set(cache_key, shopping_list, timeout=SHOPPING_LIST_TIMEOUT)
+    return shopping_list
+
+
+def consolidate_ingredients(user_id: int, servings_by_recipe: Dict[int, Optional[float]], system: str) -> Dict:
+    """
+    Merge the ingredients of several recipes into one list.
+
+    Identical ingredients are grouped by normalized name. Amounts with
+    convertible units are summed in base units (ml or g) per dimension and
+    other units are summed as they are, using one grouped bincount per
+    pass rather than per-item arithmetic.
+    """
+    recipe_ids = list(servings_by_recipe)
+    factors = {}
+    for recipe_id, servings in db.session.query(Recipe.id, Recipe.servings).filter(Recipe.id.in_(recipe_ids)):
+        target_servings = servings_by_recipe[recipe_id]
+        factors[recipe_id] = target_servings / servings if target_servings and servings else 1.0
+
+    checked = {
+        progress.recipe_id: {key for key, value in (progress.checked_ingredients or {}).items() if value}
+        for progress in UserRecipeProgress.query.filter(
+            UserRecipeProgress.user_id == user_id,
+            UserRecipeProgress.recipe_id.in_(list(factors))
+        )
+    }
+
+    rows = [
+        row for row in RecipeIngredient.query.filter(RecipeIngredient.recipe_id.in_(list(factors)))
+        if f'ingredient-{row.position}' not in checked.get(row.recipe_id, set())
+    ]
+    if not rows:
+        return {'items': [], 'recipe_ids': sorted(factors), 'missing_recipe_ids': sorted(set(recipe_ids) - set(factors))}
+
+    codes = np.array([UNIT_CODES.get(canonical_unit(row.unit), 0) for row in rows], dtype=np.int64)
+    has_amount = np.array([row.amount is not None for row in rows], dtype=bool)
+    amounts = np.array([row.amount or 0.0 for row in rows]) * np.array([factors[row.recipe_id] for row in rows])
+    base_amounts = amounts * UNIT_FACTORS[codes]
+    dimensions = UNIT_DIMENSIONS[codes]
+
+    # Convertible amounts merge per dimension, everything else per literal unit
+    group_keys = np.array([
+        f'{normalize_ingredient_name(row.name)}\x00{dimensions[index] if codes[index] else row.unit or ""}'
+        for index, row in enumerate(rows)
+    ])
+    groups, group_index = np.unique(group_keys, return_inverse=True)
+    totals = np.bincount(group_index, weights=np.where(has_amount, base_amounts, 0.0), minlength=groups.size)
+    group_has_amount = np.bincount(group_index, weights=has_amount, minlength=groups.size) > 0
+
+    first_row = np.full(groups.size, -1)
+    first_row[group_index[::-1]] = np.arange(len(rows))[::-1]
+    group_codes = codes[first_row]
+    targets = choose_target_units(totals, UNIT_DIMENSIONS[group_codes], system)
+    convertible = group_codes > 0
+    display_amounts = np.where(convertible, totals / UNIT_FACTORS[targets], totals)
+
+    recipe_sets = [set() for _ in range(groups.size)]
+    for index, row in enumerate(rows):
+        recipe_sets[group_index[index]].add(row.recipe_id)
+
+    items = []
+    for group, row_index in enumerate(first_row):
+        row = rows[row_index]
+        name = normalize_ingredient_name(row.name)
+        if group_has_amount[group]:
+            unit = UNIT_NAMES[targets[group]] if convertible[group] else row.unit
+            amount = round(float(display_amounts[group]), 2)
+            text = ' '.join(part for part in (format_amount(amount), unit, name) if part)
+        else:
+            unit, amount, text = None, None, row.original
+        items.append({
+            'name': name,
+            'amount': amount,
+            'unit': unit,
+            'text': text,
+            'recipe_ids': sorted(recipe_sets[group])
+        })
+
+    items.sort(key=lambda item: item['name'])
+    return {'items': items, 'recipe_ids': sorted(factors), 'missing_recipe_ids': sorted(set(recipe_ids) - set(factors))}
@@ -0,0 +1,234 @@
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+
+from app.extensions import cache, db
+from app.models import Recipe, RecipeIngredient, RecipeSimilarity, recipe_tag
+from app.utils.recipe.parse_ingredient import normalize_ingredient_name
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_RECIPES_K = 10
+
+# Recipe x token incidence matrix of the last run, so the next one only reads changed recipes
+SIMILARITY_FEATURES_KEY = 'similarity_features'
+
+# Relative weight of each feature group in the recipe vectors
+FEATURE_WEIGHTS = {
+    'ingredient': 1.0,
+    'tag': 0.6,
+    'equipment': 0.3,
+    'source': 0.3,
+}
+
+
+def recipe_features(recipe_ids: Optional[List[int]] = None) -> Dict[int, List[str]]:
+    """Feature tokens of the given recipes, or of every recipe, prefixed with their group."""
+    recipes = db.session.query(Recipe.id, Recipe.source, Recipe.equipment)
+    ingredients = db.session.query(RecipeIngredient.recipe_id, RecipeIngredient.name)
+    tags = db.session.query(recipe_tag.c.recipe_id, recipe_tag.c.tag_id)
+    if recipe_ids is not None:
+        recipes = recipes.filter(Recipe.id.in_(recipe_ids))
+        ingredients = ingredients.filter(RecipeIngredient.recipe_id.in_(recipe_ids))
+        tags = tags.filter(recipe_tag.c.recipe_id.in_(recipe_ids))
+
+    features: Dict[int, List[str]] = {}
+    for recipe_id, source, equipment in recipes:
+        tokens = [f'equipment:{item.lower()}' for item in equipment or []]
+        if source:
+            tokens.append(f'source:{source.lower()}')
+        features[recipe_id] = tokens
+
+    for recipe_id, name in ingredients:
+        name = normalize_ingredient_name(name)
+        if name and recipe_id in features:
+            features[recipe_id].append(f'ingredient:{name}')
+
+    for recipe_id, tag_id in tags:
+        if recipe_id in features:
+            features[recipe_id].append(f'tag:{tag_id}')
+    return features
+
+
+def incidence_matrix(features: Dict[int, List[str]], vocabulary: List[str]) -> tuple[np.ndarray, sparse.csr_matrix]:
+    """
+    Binary recipe x token matrix with one row per recipe, in id order.
+
+    Tokens not in the vocabulary yet are appended to it, so the columns of
+    matrices built earlier against it stay valid.
+    """
+    recipe_ids = np.array(sorted(features), dtype=np.int64)
+    columns_by_token = {token: column for column, token in enumerate(vocabulary)}
+    rows, columns = [], []
+    for row, recipe_id in enumerate(recipe_ids.tolist()):
+        for token in set(features[recipe_id]):
+            if token not in columns_by_token:
+                columns_by_token[token] = len(vocabulary)
+                vocabulary.append(token)
+            rows.append(row)
+            columns.append(columns_by_token[token])
+
+    shape = (len(recipe_ids), len(vocabulary))
+    return recipe_ids, sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, columns)), shape=shape)
+
+
+def update_feature_incidence(stale_ids: np.ndarray, full: bool = False) -> tuple[np.ndarray, List[str], sparse.csr_matrix]:
+    """
+    Incidence matrix of every recipe, with only the changed rows read from the database.
+
+    The matrix and its vocabulary are kept in the cache between runs.
+    Rows of stale recipes, and of recipes the cached matrix doesn't have,
+    are reloaded; rows of deleted recipes are dropped. Without a cached
+    matrix, or with full, every recipe is read.
+
+    Returns:
+        tuple: Sorted recipe ids, the vocabulary and the CSR matrix whose rows follow the ids
+    """
+    current_ids = np.array(sorted(recipe_id for recipe_id, in db.session.query(Recipe.id)), dtype=np.int64)
+    cached = None if full else cache.get(SIMILARITY_FEATURES_KEY)
+    if cached is None:
+        vocabulary: List[str] = []
+        recipe_ids, incidence = incidence_matrix(recipe_features(), vocabulary)
+    else:
+        recipe_ids, vocabulary, incidence = cached
+        keep = np.isin(recipe_ids, current_ids) & ~np.isin(recipe_ids, stale_ids)
+        reloaded_ids = np.setdiff1d(current_ids, recipe_ids[keep])
+        loaded_ids, loaded = incidence_matrix(recipe_features(reloaded_ids.tolist()), vocabulary)
+        kept = incidence[keep]
+        kept.resize((kept.shape[0], len(vocabulary)))
+        recipe_ids = np.concatenate([recipe_ids[keep], loaded_ids])
+        order = np.argsort(recipe_ids)
+        recipe_ids, incidence = recipe_ids[order], sparse.vstack([kept, loaded], format='csr')[order]
+
+    cache.set(SIMILARITY_FEATURES_KEY, (recipe_ids, vocabulary, incidence), timeout=0)
+    return recipe_ids, vocabulary, incidence
+
+
+def build_feature_matrix(vocabulary: List[str], incidence: sparse.csr_matrix) -> sparse.csr_matrix:
+    """Sparse, L2 normalized TF-IDF vectors from an incidence matrix, rows stay in its order."""
+    document_frequency = np.bincount(incidence.indices, minlength=len(vocabulary))
+    group_weights = np.array([FEATURE_WEIGHTS[token.split(':', 1)[0]] for token in vocabulary])
+    idf = np.log((1 + incidence.shape[0]) / (1 + document_frequency)) + 1
+    matrix = incidence @ sparse.diags(idf * group_weights)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def top_k(similarities: sparse.csr_matrix, row: int, exclude: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column indices and scores of the k largest entries of a CSR row, best first."""
+    start, end = similarities.indptr[row], similarities.indptr[row + 1]
+    columns, scores = similarities.indices[start:end], similarities.data[start:end]
+    keep = (columns != exclude) & (scores > 0)
+    columns, scores = columns[keep], scores[keep]
+    if columns.size > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        columns, scores = columns[best], scores[best]
+    order = np.lexsort((columns, -scores))
+    return columns[order], scores[order]
+
+
+def kth_scores(recipe_ids: np.ndarray, k: int) -> np.ndarray:
+    """Score of the k-th stored neighbour per recipe, 0 where fewer are stored."""
+    thresholds = np.zeros(len(recipe_ids))
+    full = (
+        db.session.query(RecipeSimilarity.recipe_id, func.min(RecipeSimilarity.score))  # pylint: disable=not-callable
+        .group_by(RecipeSimilarity.recipe_id)
+        .having(func.count() >= k)  # pylint: disable=not-callable
+    )
+    for recipe_id, score in full:
+        position = np.searchsorted(recipe_ids, recipe_id)
+        if position < len(recipe_ids) and recipe_ids[position] == recipe_id:
+            thresholds[position] = score
+    return thresholds
+
+
+def mark_similar_recipes_stale(recipe_ids: Iterable[int]) -> None:
+    """Flag recipes listing any of these as similar, so removing them leaves no gaps."""
+    recipe_ids = list(recipe_ids)
+    referencing = db.session.query(RecipeSimilarity.recipe_id).filter(
+        RecipeSimilarity.similar_recipe_id.in_(recipe_ids)
+    )
+    Recipe.query.filter(Recipe.id.in_(referencing)).update({'similarity_stale': True}, synchronize_session=False)
+
+
+def refresh_similar_recipes(k: int = SIMILAR_RECIPES_K, batch_size: int = 256, full: bool = False) -> int:
+    """
+    Recompute the stored neighbours of recipes added or changed since the last run.
+
+    Only the feature tokens of stale recipes are read from the database,
+    see update_feature_incidence(); reweighting the whole matrix is a few
+    array operations. Stale rows are then compared against every recipe
+    with one sparse product per batch. Recipes that aren't stale themselves but now have a stale
+    recipe closer than their current k-th neighbour are refreshed too, so
+    new recipes show up in existing lists.
+
+    Args:
+        k: Neighbours stored per recipe
+        batch_size: Stale recipes per sparse product
+        full: Recompute every recipe
+
+    Returns:
+        int: Number of recipes whose neighbours were recomputed
+    """
+    stale_query = db.session.query(Recipe.id)
+    if not full:
+        stale_query = stale_query.filter(Recipe.similarity_stale.is_(True))
+    stale_ids = np.array(sorted(recipe_id for recipe_id, in stale_query), dtype=np.int64)
+    if not stale_ids.size:
+        return 0
+
+    recipe_ids, vocabulary, incidence = update_feature_incidence(stale_ids, full)
+    matrix = build_feature_matrix(vocabulary, incidence)
+    stale = np.flatnonzero(np.isin(recipe_ids, stale_ids))
+
+    if not full:
+        thresholds = kth_scores(recipe_ids, k)
+        closest = np.zeros(len(recipe_ids))
+        for start in range(0, len(stale), batch_size):
+            batch = stale[start:start + batch_size]
+            similarities = matrix[batch] @ matrix.T
+            closest = np.maximum(closest, similarities.max(axis=0).toarray().ravel())
+        affected = np.flatnonzero(closest > thresholds)
+        stale = np.union1d(stale, affected)
+
+    refreshed = 0
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        similarities = (matrix[batch] @ matrix.T).tocsr()
+        batch_ids = recipe_ids[batch].tolist()
+        RecipeSimilarity.query.filter(RecipeSimilarity.recipe_id.in_(batch_ids)).delete(synchronize_session=False)
+        for row, position in enumerate(batch.tolist()):
+            columns, scores = top_k(similarities, row, position, k)
+            db.session.add_all(
+                RecipeSimilarity(
+                    recipe_id=batch_ids[row],
+                    similar_recipe_id=int(recipe_ids[column]),
+                    rank=rank,
+                    score=float(score)
+                )
+                for rank, (column, score) in enumerate(zip(columns.tolist(), scores.tolist()))
+            )
+        Recipe.query.filter(Recipe.id.in_(batch_ids)).update({'similarity_stale': False}, synchronize_session=False)
+        db.session.commit()
+        refreshed += len(batch)
+        logger.info('Refreshed similar recipes for %s of %s recipes', refreshed, len(stale))
+    return refreshed
+
+
+def get_similar_recipes(recipe_id: int) -> List[Dict]:
+    """Stored neighbours of a recipe, most similar first."""
+    rows = (
+        db.session.query(RecipeSimilarity.similar_recipe_id, RecipeSimilarity.score, Recipe.name)
+        .join(Recipe, Recipe.id == RecipeSimilarity.similar_recipe_id)
+        .filter(RecipeSimilarity.recipe_id == recipe_id)
+        .order_by(RecipeSimilarity.rank)
+    )
+    return [
+        {'id': similar_id, 'name': name, 'score': round(score, 3)}
+        for similar_id, score, name in rows
+    ]
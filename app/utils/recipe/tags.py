@@ -0,0 +1,103 @@
+import logging
+from typing import Iterable, List
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.extensions import db
+from app.models import Tag, recipe_tag
+from app.utils.recipe.autocomplete import invalidate_autocomplete
+from app.utils.sanitize import clean_text
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_tag_name(tag: str) -> str:
+    """Normalize a tag name to its dictionary form (lowercase, dot separated)."""
+    return clean_text('.'.join(str(tag).lower().split()))
+
+
+def get_or_create_tags(names: Iterable[str]) -> List[Tag]:
+    """
+    Resolve tag names to Tag rows, creating any missing ones with a single upsert.
+
+    Names are inserted in sorted order so concurrent imports lock the unique
+    index in the same order and cannot deadlock each other.
+    """
+    normalized = sorted({normalize_tag_name(name) for name in names} - {''})
+    if not normalized:
+        return []
+
+    db.session.execute(
+        insert(Tag)
+        .values([{'name': name, 'recipe_count': 0} for name in normalized])
+        .on_conflict_do_nothing(index_elements=['name'])
+    )
+    return db.session.query(Tag).filter(Tag.name.in_(normalized)).all()
+
+
+def update_tag_counts(tag_ids: Iterable[int], delta: int) -> None:
+    """Incrementally adjust the cached recipe count of the given tags."""
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    db.session.query(Tag).filter(Tag.id.in_(tag_ids)).update(
+        {Tag.recipe_count: Tag.recipe_count + delta},
+        synchronize_session=False
+    )
+
+
+def merge_duplicate_tags() -> int:
+    """
+    Merge tags whose names normalize to the same value into the lowest id.
+
+    Only touches tag.id, tag.name and recipe_tag so it can run against a
+    database that predates the unique tag name index.
+
+    Returns:
+        int: Number of duplicate tags removed
+    """
+    keep_ids = {}
+    merges = []
+    renames = []
+    for tag_id, name in db.session.query(Tag.id, Tag.name).order_by(Tag.id):
+        normalized = normalize_tag_name(name or '')
+        if normalized in keep_ids:
+            merges.append({'old_id': tag_id, 'new_id': keep_ids[normalized]})
+            continue
+        keep_ids[normalized] = tag_id
+        if normalized != name:
+            renames.append({'tag_id': tag_id, 'name': normalized})
+
+    if merges:
+        db.session.execute(db.text('CREATE TEMP TABLE tag_merge (old_id integer PRIMARY KEY, new_id integer) ON COMMIT DROP'))
+        db.session.execute(db.text('INSERT INTO tag_merge (old_id, new_id) VALUES (:old_id, :new_id)'), merges)
+        db.session.execute(db.text(
+            'CREATE TEMP TABLE recipe_tag_merged ON COMMIT DROP AS '
+            'SELECT DISTINCT rt.recipe_id, COALESCE(m.new_id, rt.tag_id) AS tag_id '
+            'FROM recipe_tag rt LEFT JOIN tag_merge m ON m.old_id = rt.tag_id '
+            'WHERE rt.recipe_id IS NOT NULL AND rt.tag_id IS NOT NULL'
+        ))
+        db.session.execute(db.text('DELETE FROM recipe_tag'))
+        db.session.execute(db.text('INSERT INTO recipe_tag (recipe_id, tag_id) SELECT recipe_id, tag_id FROM recipe_tag_merged'))
+        db.session.execute(db.text('DELETE FROM tag WHERE id IN (SELECT old_id FROM tag_merge)'))
+
+    if renames:
+        db.session.execute(db.text('UPDATE tag SET name = :name WHERE id = :tag_id'), renames)
+
+    db.session.commit()
+    invalidate_autocomplete()
+    logger.info('Merged %s duplicate tags, renamed %s tags', len(merges), len(renames))
+    return len(merges)
+
+
+def recount_tags() -> None:
+    """Recompute every cached tag recipe count from recipe_tag."""
+    counts = (
+        db.session.query(func.count(recipe_tag.c.recipe_id))  # pylint: disable=not-callable
+        .filter(recipe_tag.c.tag_id == Tag.id)
+        .scalar_subquery()
+    )
+    db.session.query(Tag).update({Tag.recipe_count: counts}, synchronize_session=False)
+    db.session.commit()
+    invalidate_autocomplete()
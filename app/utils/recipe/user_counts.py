@@ -0,0 +1,30 @@
+from typing import Iterable
+
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models import User, user_recipe
+from app.utils.recipe.autocomplete import invalidate_autocomplete
+
+
+def update_user_recipe_counts(user_ids: Iterable[int], delta: int) -> None:
+    """Incrementally adjust the cached recipe count of users gaining or losing user_recipe links."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    db.session.query(User).filter(User.id.in_(user_ids)).update(
+        {User.recipe_count: User.recipe_count + delta},
+        synchronize_session=False
+    )
+
+
+def recount_user_recipes() -> None:
+    """Recompute every cached user recipe count from user_recipe."""
+    counts = (
+        db.session.query(func.count(user_recipe.c.recipe_id))  # pylint: disable=not-callable
+        .filter(user_recipe.c.user_id == User.id)
+        .scalar_subquery()
+    )
+    db.session.query(User).update({User.recipe_count: counts}, synchronize_session=False)
+    db.session.commit()
+    invalidate_autocomplete()
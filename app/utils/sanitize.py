@@ -0,0 +1,33 @@
+import re
+import threading
+from typing import Any
+
+from bleach.sanitizer import Cleaner
+
+# Characters that can make bleach change its input: markup delimiters,
+# entity starts and the control characters html5lib rewrites (\r included).
+MARKUP_CHARACTERS = re.compile(r'[<>&\x00-\x08\x0b-\x1f\x7f]')
+
+_local = threading.local()
+
+
+def get_cleaner() -> Cleaner:
+    """
+    Return this thread's Cleaner, configured the same as bleach.clean().
+
+    Cleaner instances are not thread safe, so one is cached per thread
+    instead of building a new one on every call like bleach.clean() does.
+    """
+    cleaner = getattr(_local, 'cleaner', None)
+    if cleaner is None:
+        cleaner = _local.cleaner = Cleaner()
+    return cleaner
+
+
+def clean_text(value: Any) -> str:
+    """Sanitize a value like bleach.clean(str(value)), skipping the parse for plain text."""
+    text = str(value)
+    if not MARKUP_CHARACTERS.search(text):
+        return text
+    return get_cleaner().clean(text)
+
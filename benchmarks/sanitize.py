@@ -0,0 +1,81 @@
+"""
+Compare the per-field bleach.clean() sanitization create_recipe_data() used
+to do against clean_text() on the same fields of a synthetic Spoonacular
+extract payload.
+
+Run from the repository root:
+
+    python -m benchmarks.sanitize --nutrients 40 --ingredients 15 --steps 12
+"""
+import argparse
+import timeit
+
+import bleach
+
+from app.utils.sanitize import clean_text
+
+
+def build_payload(nutrients: int, ingredients: int, steps: int) -> dict:
+    return {
+        'title': 'Slow Cooker Chili',
+        'sourceName': 'Example Kitchen',
+        'servings': 6,
+        'preparationMinutes': 15,
+        'cookingMinutes': 480,
+        'nutrition': {'nutrients': [
+            {'name': f'Nutrient {i}', 'unit': 'mg', 'amount': i * 1.5, 'percentOfDailyNeeds': i * 0.75}
+            for i in range(nutrients)
+        ]},
+        'extendedIngredients': [
+            {'amount': 1.5, 'unit': 'cups', 'name': f'ingredient {i}'}
+            for i in range(ingredients)
+        ],
+        'analyzedInstructions': [{'steps': [
+            {
+                'number': i + 1,
+                'step': f'Stir everything together & simmer for {i + 1} minutes until thick.',
+                'equipment': [{'name': 'slow cooker'}, {'name': 'wooden spoon'}]
+            }
+            for i in range(steps)
+        ]}],
+    }
+
+
+def sanitize_fields(data: dict, clean) -> None:
+    """The sanitizing calls the field helpers and add() make per recipe."""
+    for nutrient in data['nutrition']['nutrients']:
+        clean(nutrient['name'])
+        clean(str(nutrient['unit']))
+        clean(format(nutrient['percentOfDailyNeeds'], '.2f'))
+        clean(format(nutrient['amount'], '.2f'))
+    for ingredient in data['extendedIngredients']:
+        clean(f'{ingredient["amount"]} {ingredient["unit"]} {ingredient["name"]}')
+    for step in data['analyzedInstructions'][0]['steps']:
+        clean(str(step['step']))
+        clean(str(step['number']))
+        for equipment in step['equipment']:
+            clean(str(equipment['name']))
+    for key in ('title', 'sourceName', 'servings', 'preparationMinutes', 'cookingMinutes'):
+        clean(str(data[key]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nutrients', type=int, default=40)
+    parser.add_argument('--ingredients', type=int, default=15)
+    parser.add_argument('--steps', type=int, default=12)
+    parser.add_argument('--number', type=int, default=200, help='Recipes sanitized per timing run')
+    args = parser.parse_args()
+
+    payload = build_payload(args.nutrients, args.ingredients, args.steps)
+
+    legacy = min(timeit.repeat(lambda: sanitize_fields(payload, bleach.clean), number=args.number, repeat=5))
+    fast = min(timeit.repeat(lambda: sanitize_fields(payload, clean_text), number=args.number, repeat=5))
+
+    print(f'per-field bleach.clean: {legacy / args.number * 1000:.3f} ms/recipe')
+    print(f'per-field clean_text:   {fast / args.number * 1000:.3f} ms/recipe')
+    print(f'speedup:                {legacy / fast:.1f}x')
+
+
+if __name__ == '__main__':
+    main()